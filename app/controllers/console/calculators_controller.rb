@@ -2,8 +2,10 @@
 # the legacy admin tool; the monte-carlo-calculator Stimulus controller posts
 # the form here and renders charts/tables client-side.
 class Console::CalculatorsController < Console::BaseController
+  JOB_KINDS = %w[optimise relations].freeze
+
   before_action -> { require_capability(:manage_product) }
-  skip_before_action :verify_authenticity_token, only: [ :calculate ]
+  skip_before_action :verify_authenticity_token, only: [ :calculate, :submit_job, :cancel_job ]
 
   def index
   end
@@ -29,8 +31,66 @@ class Console::CalculatorsController < Console::BaseController
     render json: { error: e.message }, status: :unprocessable_entity
   end
 
+  # One path of a retained Monte Carlo run (the result's run_id), built when the
+  # user opens it: ?run_id=...&percentile=0.25&table=accounts, or path= / rank=,
+  # with optional field, period, from and to.
+  def path_ledger
+    render json: PythonWorker.ledger(params.require(:run_id), **ledger_params)
+  rescue PythonWorker::Error => e
+    render json: { error: e.message }, status: :not_found
+  end
+
+  # Optimisations and relations grids run minutes, so they are queued on
+  # python/job_server.py (PythonJobs) rather than run inline: the page submits
+  # {job: {kind: "optimise" | "relations", input: {...}, priority}}, then follows
+  # job_events (one JSON event per line) or polls job, and may cancel_job.
+  def submit_job
+    job = params.require(:job).permit(:kind, :priority, input: {})
+    unless JOB_KINDS.include?(job[:kind])
+      return render json: { error: "unknown job kind #{job[:kind].inspect}" }, status: :unprocessable_entity
+    end
+
+    render json: PythonJobs.submit(job[:kind], job[:input].to_h, priority: job[:priority].presence || "batch")
+  rescue PythonJobs::Error => e
+    render json: { error: e.message }, status: :service_unavailable
+  end
+
+  def job
+    render json: PythonJobs.status(params.require(:job_id))
+  rescue PythonJobs::Error => e
+    render json: { error: e.message }, status: :not_found
+  end
+
+  def cancel_job
+    render json: PythonJobs.cancel(params.require(:job_id))
+  rescue PythonJobs::Error => e
+    render json: { error: e.message }, status: :not_found
+  end
+
+  # The job's progress events as they arrive, ending with its "done" event.
+  def job_events
+    job_id = params.require(:job_id)
+    headers["Content-Type"] = "application/x-ndjson"
+    headers["Cache-Control"] = "no-cache"
+    headers["X-Accel-Buffering"] = "no"
+    self.response_body = Enumerator.new do |lines|
+      done = PythonJobs.watch(job_id) { |event| lines << "#{event.to_json}\n" }
+      lines << "#{done.to_json}\n"
+    rescue PythonJobs::Error => e
+      failed = { job: job_id, event: "done", state: "failed", error: e.message }
+      lines << "#{failed.to_json}\n"
+    end
+  end
+
   private
 
+  def ledger_params
+    selection = params.permit(:path, :rank, :percentile, :field, :period, :from, :to, :table).to_h.symbolize_keys
+    selection.to_h do |key, value|
+      [ key, %i[field table].include?(key) ? value : (key == :percentile ? value.to_f : value.to_i) ]
+    end
+  end
+
   def calculator_params
     params.require(:calculator).permit(
       :house_value, :loan_duration, :annuity_duration, :loan_type, :principal_repayment,
@@ -40,7 +100,7 @@ class Console::CalculatorsController < Console::BaseController
       :additional_loan_margins, :holiday_enter_fraction, :holiday_exit_fraction,
       :subperform_loan_threshold_quarters, :max_superpay_factor, :superpay_start_factor,
       :enable_pool, :path_table_type, :calculation_engine, :start_year, :insurance_cost_pa,
-      :annual_house_price_appreciation, :at_risk_capital_fraction
+      :annual_house_price_appreciation, :at_risk_capital_fraction, :lazy_tables
     )
   end
 
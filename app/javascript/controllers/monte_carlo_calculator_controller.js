@@ -377,9 +377,12 @@ export default class extends Controller {
     
     console.log('Chart group created:', g.node())
     
-    // Prepare data - each path is an array of [period, value] pairs
+    // Prepare data - each path is an array of values per period, or a downsampled
+    // representative path { x: periods, y: values } from the server-side aggregates
     const pathsData = allPaths.map((path, pathIndex) => 
-      path.map((value, period) => ({ period, value, pathIndex }))
+      Array.isArray(path)
+        ? path.map((value, period) => ({ period, value, pathIndex }))
+        : path.x.map((period, i) => ({ period, value: path.y[i], pathIndex }))
     )
     
     console.log('Processed paths data (first 3 paths):', pathsData.slice(0, 3))
@@ -733,6 +736,20 @@ export default class extends Controller {
   generateDistributionData(data) {
     console.log('Generating distribution data from:', data)
     
+    // Server-side return histogram (same buckets, counted over every path)
+    if (data.chart_data && data.chart_data.return_histogram) {
+      const labels = [
+        'Loss > 20%',
+        'Loss 10-20%',
+        'Loss 0-10%',
+        'Gain 0-10%',
+        'Gain 10-20%',
+        'Gain 20-30%',
+        'Gain > 30%'
+      ]
+      return { labels, values: data.chart_data.return_histogram.counts }
+    }
+
     // Try to use actual simulation results if available
     if (data.chart_data && data.chart_data.all_paths) {
       const allPaths = data.chart_data.all_paths
@@ -839,7 +856,11 @@ export default class extends Controller {
     }
     
     // Calculate derived metrics from available data
-    if (data.chart_data && data.chart_data.all_paths) {
+    if (data.chart_data && data.chart_data.risk_metrics) {
+      // Computed server-side over every path
+      lossProb = `${(data.chart_data.risk_metrics.loss_probability * 100).toFixed(1)}%`
+      var5 = this.formatCurrency(data.chart_data.risk_metrics.var_5)
+    } else if (data.chart_data && data.chart_data.all_paths) {
       // Calculate probability of loss and VaR from paths
       const paths = data.chart_data.all_paths
       let lossCount = 0
@@ -967,8 +988,11 @@ export default class extends Controller {
       .append("g")
       .attr("transform", `translate(${margin.left},${margin.top})`)
 
-    const allPaths = data.chart_data.all_sp500_paths || []
-    const meanPath = data.chart_data.mean_sp500_path || []
+    // [period, price] points: raw paths index by period, representative paths carry x
+    const allPaths = (data.chart_data.all_sp500_paths || []).map(path =>
+      Array.isArray(path) ? path.map((value, period) => [period, value]) : path.x.map((period, i) => [period, path.y[i]])
+    )
+    const meanPath = (data.chart_data.mean_sp500_path || []).map((value, period) => [period, value])
 
     if (allPaths.length === 0 && meanPath.length === 0) {
       console.log('No S&P 500 path data available')
@@ -976,10 +1000,10 @@ export default class extends Controller {
     }
 
     // Create scales
-    const maxLength = Math.max(...allPaths.map(p => p.length), meanPath.length)
-    const xScale = d3.scaleLinear().domain([0, maxLength - 1]).range([0, width])
+    const maxPeriod = d3.max(allPaths.concat([meanPath]).flat(), d => d[0]) || 0
+    const xScale = d3.scaleLinear().domain([0, maxPeriod]).range([0, width])
     
-    const allValues = allPaths.flat().concat(meanPath)
+    const allValues = allPaths.flat().concat(meanPath).map(d => d[1])
     const yExtent = d3.extent(allValues)
     const yScale = d3.scaleLinear().domain(yExtent).range([height, 0])
 
@@ -993,8 +1017,8 @@ export default class extends Controller {
 
     // Draw sample paths (lightly)
     const line = d3.line()
-      .x((d, i) => xScale(i))
-      .y(d => yScale(d))
+      .x(d => xScale(d[0]))
+      .y(d => yScale(d[1]))
 
     // Draw a sample of paths to avoid overwhelming the chart
     const sampleSize = Math.min(100, allPaths.length)
@@ -0,0 +1,44 @@
+require "zlib"
+
+# Reads the typed columnar side channel of a Python calculator run
+# (python/columnar.py). The script's JSON output carries a small "columnar"
+# manifest; the path x period arrays themselves sit in a binary file of
+# deflated little-endian columns, which Zlib and String#unpack turn back into
+# the nested arrays the JSON output used to contain.
+#
+#   result = ColumnarResult.merge!(JSON.parse(json_line))
+class ColumnarResult
+  FORMAT = "columnar-v1".freeze
+  UNPACK = { "float32" => "e*", "float64" => "E*", "int32" => "l<*", "int64" => "q<*" }.freeze
+
+  # python_result with its manifest replaced by the columns it describes.
+  # The column file is deleted once read.
+  def self.merge!(python_result)
+    manifest = python_result.delete("columnar")
+    return python_result unless manifest
+
+    python_result.merge!(load(manifest))
+  ensure
+    File.delete(manifest["path"]) if manifest && File.exist?(manifest["path"])
+  end
+
+  # { name => nested Array } of the manifest's columns.
+  def self.load(manifest)
+    raise ArgumentError, "Unknown columnar format: #{manifest['format']}" unless manifest["format"] == FORMAT
+
+    data = File.binread(manifest["path"])
+    manifest["columns"].to_h do |column|
+      bytes = data.byteslice(column["offset"], column["nbytes"])
+      bytes = Zlib::Inflate.inflate(bytes) if column["codec"] == "zlib"
+      values = bytes.unpack(UNPACK.fetch(column["dtype"]))
+      [ column["name"], reshape(values, column["shape"]) ]
+    end
+  end
+
+  def self.reshape(values, shape)
+    return Array.new(shape.first) { [] } if shape.size > 1 && values.empty?
+
+    shape.drop(1).reverse_each { |n| values = values.each_slice(n).to_a }
+    values
+  end
+end
@@ -12,19 +12,12 @@ class PythonCalculatorService
     # Create Python script with Ruby parameters
     python_script = generate_python_script_with_params
 
-    # Write script to python directory so imports work
-    python_dir = Rails.root.join("python")
-    temp_filename = "ruby_calculator_#{Time.current.to_i}_#{rand(1000)}.py"
-    temp_path = python_dir.join(temp_filename)
-
-    File.write(temp_path, python_script)
-
     begin
-      # Execute Python script and capture output
+      # Execute Python script on a long-lived calc_worker (python3 fallback) and capture output
       Rails.logger.info "Executing Python calculation with Ruby parameters..."
 
       start_time = Time.current
-      output = `cd #{python_dir} && python3 #{temp_filename} 2>&1`
+      output = PythonWorker.run(python_script, name: "ruby_calculator")
       execution_time = Time.current - start_time
 
       Rails.logger.info "Python execution completed in #{execution_time.round(3)} seconds"
@@ -52,9 +45,6 @@ class PythonCalculatorService
     rescue => e
       Rails.logger.error "Python execution failed: #{e.message}"
       raise e
-    ensure
-      # Clean up temporary file
-      File.delete(temp_path) if File.exist?(temp_path)
     end
   end
 
@@ -93,15 +83,11 @@ class PythonCalculatorService
       import json
       import math
       import pandas as pd
-      import matplotlib
-      matplotlib.use('Agg')  # Use non-interactive backend
-      import matplotlib.pyplot as plt
       import numpy as np
-      import pprint
-      import math
-      import numpy_financial as npf
-      from core_model_advanced import single_mortgage, accounts_table
+      from core_model_advanced import accounts_table
+      from engine import single_mortgage  # fastest available backend for the path count and features
       from utils import mean_sd, dollar, pcntdf, pcnt, secant
+      import market_data
 
       # Parameters from Ruby form
       output = {}
@@ -140,8 +126,8 @@ class PythonCalculatorService
       hedging_cost_pa = #{@params[:hedging_cost_pa]}
 
       # Load historical data
-      sp500df = pd.read_csv('sp500tr.csv', thousands=',')
-      fedfunds = pd.read_csv('FEDFUNDS2.csv')
+      sp500df = market_data.sp500()  # read once per calc_worker process
+      fedfunds = market_data.fedfunds()
 
       all_interest_series = list(map(lambda x: x/100, fedfunds['FEDFUNDS'].values.tolist()))
 
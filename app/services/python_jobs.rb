@@ -0,0 +1,83 @@
+require "json"
+require "socket"
+
+# Client for python/job_server.py, which runs the long calculators (optimise.py,
+# relations.py) as queued jobs with progress instead of holding a web request
+# for minutes:
+#
+#   job = PythonJobs.submit("optimise", input)       # {"job" => "j3", "state" => "queued", "position" => 0, ...}
+#   PythonJobs.watch("j3") { |event| ... }           # progress events as they arrive; returns the "done" event
+#   PythonJobs.status("j3")                          # state, latest progress ("partial"), result when done
+#   PythonJobs.cancel("j3")
+#
+# The server runs alongside the app: python3 python/job_server.py --socket $PYTHON_JOB_SOCKET.
+# Raises Error when it is not running or rejects the request.
+class PythonJobs
+  SOCKET = ENV.fetch("PYTHON_JOB_SOCKET", "/tmp/calc-jobs.sock")
+  TIMEOUT = ENV.fetch("PYTHON_JOB_TIMEOUT", 10).to_i
+
+  class Error < StandardError; end
+
+  class << self
+    # kind is a calculator script's name (result_cache.SCRIPTS); priority "interactive" or "batch".
+    def submit(kind, input, priority: "batch")
+      request(op: "submit", kind: kind.to_s, input: input, priority: priority.to_s)
+    end
+
+    def status(job)
+      request(op: "status", job: job)
+    end
+
+    def cancel(job)
+      request(op: "cancel", job: job)
+    end
+
+    # Yields each event of the job (the latest progress first, then new ones) until it finishes;
+    # returns the final {"event" => "done", "state" => ..., "result" | "error"}. timeout: seconds to
+    # wait for any one event (nil: as long as the job runs).
+    def watch(job, timeout: nil)
+      connect do |socket|
+        send_line(socket, op: "watch", job: job)
+        loop do
+          event = read_line(socket, timeout)
+          return event if event["event"] == "done"
+
+          yield event if block_given?
+        end
+      end
+    end
+
+    private
+
+    def request(message)
+      connect do |socket|
+        send_line(socket, message)
+        read_line(socket, TIMEOUT)
+      end
+    end
+
+    def connect(&block)
+      UNIXSocket.open(SOCKET, &block)
+    rescue SystemCallError => e
+      raise Error, "job server unavailable at #{SOCKET} (#{e.message})"
+    end
+
+    def send_line(socket, message)
+      socket.puts(JSON.generate(message))
+    end
+
+    def read_line(socket, timeout)
+      raise Error, "no response within #{timeout}s" unless IO.select([ socket ], nil, nil, timeout)
+
+      line = socket.gets
+      raise Error, "job server closed the connection" if line.nil?
+
+      response = JSON.parse(line)
+      raise Error, response["error"] if response.key?("error") && !response.key?("job")
+
+      response
+    rescue JSON::ParserError => e
+      raise Error, "invalid response from the job server (#{e.message})"
+    end
+  end
+end
@@ -9,39 +9,29 @@ class PythonMonteCarloService
   end
 
   def calculate
-    # Create Python Monte Carlo script with Ruby parameters
-    python_script = generate_python_monte_carlo_script
-
-    # Write script to python directory so imports work
-    python_dir = Rails.root.join("python")
-    temp_filename = "ruby_monte_carlo_#{Time.current.to_i}_#{rand(1000)}.py"
-    temp_path = python_dir.join(temp_filename)
-
-    File.write(temp_path, python_script)
-
     begin
-      # Execute Python script and capture output
+      # Run python/monte_carlo.py on a long-lived calc_worker (python3 fallback) and capture output
       Rails.logger.info "Executing Python Monte Carlo calculation with #{@params[:total_paths] || 1000} paths..."
 
       start_time = Time.current
-      output = `cd #{python_dir} && python3 #{temp_filename} 2>&1`
+      output = PythonWorker.call("monte_carlo", python_params)
       execution_time = Time.current - start_time
 
       Rails.logger.info "Python Monte Carlo completed in #{execution_time.round(3)} seconds"
 
       # Parse JSON output
-      Rails.logger.info "Python script output (first 500 chars): #{output[0..500]}"
+      Rails.logger.info "Python output (first 500 chars): #{output[0..500]}"
 
       json_line = output.split("\n").find { |line| line.strip.start_with?("{") }
 
       if json_line
         Rails.logger.info "Found JSON line, parsing..."
-        result = JSON.parse(json_line)
+        result = ColumnarResult.merge!(JSON.parse(json_line))
 
         # Convert to Ruby-friendly format
         format_monte_carlo_result(result, execution_time)
       else
-        Rails.logger.error "Full Python script output: #{output}"
+        Rails.logger.error "Full Python output: #{output}"
         raise StandardError, "Failed to parse Python output: No JSON found"
       end
 
@@ -53,8 +43,7 @@ class PythonMonteCarloService
       Rails.logger.error "Python execution failed: #{e.message}"
       raise e
     ensure
-      # Clean up temporary file
-      File.delete(temp_path) if File.exist?(temp_path)
+      File.delete(@columnar_path) if @columnar_path && File.exist?(@columnar_path)
     end
   end
 
@@ -75,6 +64,8 @@ class PythonMonteCarloService
     @params[:equity_return] = @params[:equity_return].present? ? @params[:equity_return].to_f / 100.0 : ep[:equity_mean]
     @params[:volatility] = @params[:volatility].present? ? @params[:volatility].to_f / 100.0 : ep[:equity_vol]
     @params[:total_paths] = @params[:total_paths].present? ? @params[:total_paths].to_i : 1000
+    # Optional latency budget: when set, python/cost_model.py picks the largest affordable path count
+    @params[:time_budget_ms] = @params[:time_budget_ms].present? ? @params[:time_budget_ms].to_i : nil
     @params[:random_seed] = @params[:random_seed].present? ? @params[:random_seed].to_i : 0
     @params[:cash_rate] = @params[:cash_rate].present? ? @params[:cash_rate].to_f / 100.0 : ep[:cash_rate_initial]
     @params[:insurer_profit_margin] = @params[:insurer_profit_margin].present? ? @params[:insurer_profit_margin].to_f / 100.0 : 0.5
@@ -88,262 +79,35 @@ class PythonMonteCarloService
     @params[:hedging_max_loss] = @params[:hedging_max_loss].present? ? @params[:hedging_max_loss].to_f : (1.0 - ep[:buffer_floor])
     @params[:hedging_cap] = @params[:hedging_cap].present? ? @params[:hedging_cap].to_f : (ep[:buffer_cap] - 1.0)
     @params[:hedging_cost_pa] = @params[:hedging_cost_pa].present? ? @params[:hedging_cost_pa].to_f : ep[:hedging_fee]
+    # Charts get fan bands, representative paths and histograms (python/chart_data.py) of at most
+    # chart_max_points points per series; the full per-path series only when raw_paths is set
+    @params[:raw_paths] = @params[:raw_paths].present? ? ActiveModel::Type::Boolean.new.cast(@params[:raw_paths]) : false
+    # "columnar": the per-path series of a raw_paths run come back as a binary column file
+    # (ColumnarResult), "json": inline. Without raw_paths there are no series to detach, so the
+    # result is always inline
+    @params[:output_format] = @params[:output_format].present? ? @params[:output_format].to_s : (@params[:raw_paths] ? "columnar" : "json")
+    @params[:columnar_float32] = @params[:columnar_float32].present? ? ActiveModel::Type::Boolean.new.cast(@params[:columnar_float32]) : true
+    # lazy_tables: the run is retained server-side and path ledgers are fetched by run_id
+    # (PythonWorker.ledger) instead of sample paths coming back in full
+    @params[:lazy_tables] = @params[:lazy_tables].present? ? ActiveModel::Type::Boolean.new.cast(@params[:lazy_tables]) : false
+    @params[:chart_max_points] = @params[:chart_max_points].present? ? @params[:chart_max_points].to_i : 200
   end
 
-  def generate_python_monte_carlo_script
-    <<~PYTHON
-      import sys
-      import json
-      import math
-      import pandas as pd
-      import numpy as np
-      import time
-      from core_model_montecarlo import single_mortgage, gen_monte_carlo_paths
-
-      # Set seed for reproducible results
-      np.random.seed(#{@params[:random_seed]})
-
-      # Parameters from Ruby form
-      house_value = #{@params[:house_value]}
-      loan_duration = #{@params[:loan_duration]}
-      annuity_duration = #{@params[:annuity_duration]}
-      loan_to_value = #{@params[:loan_to_value]}
-      annual_income = #{@params[:annual_income]}
-      total_loan = house_value * loan_to_value
-      reinvest_fraction = 1-(annuity_duration*annual_income)/total_loan
-      insurer_profit_margin = #{@params[:insurer_profit_margin]}
-      insurance_profit_margin = 1.0 + insurer_profit_margin
-      wholesale_lending_margin = #{@params[:wholesale_lending_margin]}
-      additional_loan_margins = #{@params[:additional_loan_margins]}
-      holiday_enter_fraction = #{@params[:holiday_enter_fraction]}
-      holiday_exit_fraction = #{@params[:holiday_exit_fraction]}
-      subperform_loan_threshold_quarters = #{@params[:subperform_loan_threshold_quarters]}
-      superpay_start_factor = 1.0
-      max_superpay_factor = 1.0
-      insurance_cost_pa = #{@params[:insurance_cost_pa]}
-      year0 = 2000
-      hedged = #{@params[:hedged] ? 'True' : 'False'}
-      hedging_max_loss = #{@params[:hedging_max_loss]}
-      hedging_cap = #{@params[:hedging_cap]}
-      hedging_cost_pa = #{@params[:hedging_cost_pa]}
-
-      # Monte Carlo parameters
-      equity_return = #{@params[:equity_return]}
-      volatility = #{@params[:volatility]}
-      cash_rate = #{@params[:cash_rate]}
-      total_paths = #{@params[:total_paths]}
-
-      dt = 1.0/12
-      n_steps = loan_duration * 12
-      S0 = 100.0
-
-      # Generate Monte Carlo paths#{'  '}
-      start_time = time.time()
-      price_paths = gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths, S0)
-      path_generation_time = time.time() - start_time
-
-      print(f"Generated {total_paths} paths in {path_generation_time:.3f} seconds")
-
-      # Calculate insurance cost
-      insurance_cost = insurance_cost_pa * total_loan * loan_duration
-
-      # Run Monte Carlo simulation (batch processing)
-      print(f"Running Monte Carlo simulation with {total_paths} paths...")
-      start_time = time.time()
-
-      cash_rate_series = [cash_rate] * n_steps
-
-      df = single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
-                          insurance_profit_margin, insurance_cost,
-                          cash_rate_series, wholesale_lending_margin, additional_loan_margins,
-                          holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                          price_paths, S0, dt, year0-1, max_superpay_factor, superpay_start_factor, False,#{' '}
-                          0, None, #{@params[:loan_type] != "Interest only" ? 'True' : 'False'}, hedged, hedging_max_loss, hedging_cap, hedging_cost_pa)
-
-      simulation_time = time.time() - start_time
-      print(f"Simulation completed in {simulation_time:.3f} seconds")
-
-      # Extract results from batch processing
-      # The batch result contains data for all paths combined
-
-      # For batch processing, get the final period results for each path
-      max_period = loan_duration * 4 - 1  # Last period (0-indexed)#{' '}
-
-      # Get final reinvestment value for each path and collect all path data for charts
-      final_values = []
-      sample_paths = []
-      all_paths_chart_data = []  # Store reinvestment values for all paths
-      all_sp500_paths = []  # Store S&P 500 prices for all paths
-      all_loan_paths = []  # Store loan values for all paths
-      all_interest_deficit_paths = []  # Store interest deficit for all paths
-      all_capital_deficit_paths = []  # Store capital deficit for all paths
-      all_cumulative_annuity_paths = []  # Store cumulative annuity income
-      all_cumulative_interest_accrued_paths = []  # Store cumulative interest accrued
-      all_cumulative_interest_paid_paths = []  # Store cumulative interest paid
-      all_surplus_paths = []  # Store surplus for all paths
-      all_units_paths = []  # Store units for all paths
-      all_pooled_units_paths = []  # Store pooled units for all paths
-      all_insured_units_paths = []  # Store insured units (static)
-      all_hedged_units_paths = []  # Store hedged units delta
-
-      # Aggregate data for mean calculation
-      periods_data = {}
-
-      for path_id in range(total_paths):
-          path_data = df[df['Path'] == path_id]
-          if len(path_data) > 0:
-              # Get final reinvestment value for this path
-              final_row = path_data[path_data['Period'] == max_period]
-              if len(final_row) > 0:
-                  final_value = final_row['Reinvestment'].iloc[0]
-                  final_values.append(final_value)
-              else:
-                  # Fallback to last available period
-                  fallback_value = path_data['Reinvestment'].iloc[-1]
-                  final_values.append(fallback_value)
-      #{'        '}
-              # Collect data for all paths for charting
-              path_reinvestment = path_data['Reinvestment'].tolist()
-              path_sp500 = path_data['SP500'].tolist()
-              path_loan = path_data['Loan size'].tolist()
-              path_interest_deficit = path_data['InterestDeficit'].tolist()
-              path_capital_deficit = path_data['CapitalDeficit'].tolist()
-              path_surplus = path_data['Surplus'].tolist()
-              path_units = path_data['Units'].tolist()
-              path_cumulative_annuity = path_data['AnnuityIncome'].cumsum().tolist()
-              path_cumulative_interest_paid = path_data['CumInterestPaid'].tolist()
-              path_pooled_units = path_data['CumUnitsToPool'].tolist()
-              path_hedged_units = path_data['HedgeUnitsDelta'].tolist()
-      #{'        '}
-              all_paths_chart_data.append(path_reinvestment)
-              all_sp500_paths.append(path_sp500)
-              all_loan_paths.append(path_loan)
-              all_interest_deficit_paths.append(path_interest_deficit)
-              all_capital_deficit_paths.append(path_capital_deficit)
-              all_surplus_paths.append(path_surplus)
-              all_units_paths.append(path_units)
-              all_cumulative_annuity_paths.append(path_cumulative_annuity)
-              all_cumulative_interest_paid_paths.append(path_cumulative_interest_paid)
-              all_pooled_units_paths.append(path_pooled_units)
-              all_hedged_units_paths.append(path_hedged_units)
-      #{'        '}
-              # Aggregate for mean calculation
-              for i, period in enumerate(path_data['Period']):
-                  if period not in periods_data:
-                      periods_data[period] = []
-                  periods_data[period].append({
-                      'Period': period,
-                      'Year': path_data.iloc[i]['Year'],
-                      'Quarter': path_data.iloc[i]['Quarter'],
-                      'SP500': path_data.iloc[i]['SP500'],
-                      'Interest': path_data.iloc[i]['Interest'],
-                      'Loan size': path_data.iloc[i]['Loan size'],
-                      'Units': path_data.iloc[i]['Units'],
-                      'Reinvestment': path_data.iloc[i]['Reinvestment'],
-                      'InterestDeficit': path_data.iloc[i]['InterestDeficit'],
-                      'CapitalDeficit': path_data.iloc[i]['CapitalDeficit'],
-                      'Surplus': path_data.iloc[i]['Surplus'],
-                      'FunderEarned': path_data.iloc[i]['FunderEarned'],
-                      'AnnuityIncome': path_data.iloc[i]['AnnuityIncome'],
-                      'CumInterestPaid': path_data.iloc[i]['CumInterestPaid'],
-                      'CumUnitsToPool': path_data.iloc[i]['CumUnitsToPool'],
-                      'HedgeUnitsDelta': path_data.iloc[i]['HedgeUnitsDelta']
-                  })
-      #{'        '}
-              # Save first few paths for detailed data
-              if path_id < 5:
-                  sample_paths.append({
-                      'path_id': path_id,
-                      'pathdf': path_data.to_dict('list')
-                  })
-
-      print(f"Final values extracted: {len(final_values)} values")
-
-      # Calculate mean path data
-      mean_path_data = []
-      median_path_data = []
-      percentile_2_data = []
-      percentile_25_data = []
-      percentile_75_data = []
-
-      for period in sorted(periods_data.keys()):
-          period_values = periods_data[period]
-          if period_values:
-              # Calculate mean values for this period
-              mean_values = {}
-              for key in period_values[0].keys():
-                  if key in ['Period', 'Year', 'Quarter']:
-                      mean_values[key] = period_values[0][key]  # These should be the same across paths
-                  else:
-                      values = [pv[key] for pv in period_values if pv[key] is not None]
-                      if values:
-                          mean_values[key] = np.mean(values)
-                          # Calculate percentiles for key metrics
-                          if key == 'Reinvestment':
-                              percentiles = np.percentile(values, [2, 25, 50, 75])
-                              if len(percentile_2_data) == len(mean_path_data):
-                                  percentile_2_data.append(dict(mean_values, **{key: percentiles[0]}))
-                                  percentile_25_data.append(dict(mean_values, **{key: percentiles[1]}))
-                                  median_path_data.append(dict(mean_values, **{key: percentiles[2]}))
-                                  percentile_75_data.append(dict(mean_values, **{key: percentiles[3]}))
-                      else:
-                          mean_values[key] = 0
-      #{'        '}
-              mean_path_data.append(mean_values)
-
-      print(f"Mean path data calculated: {len(mean_path_data)} periods")
-
-      # Calculate statistics
-      mean_final = np.mean(final_values)
-      std_final = np.std(final_values)
-      percentiles = np.percentile(final_values, [2, 25, 50, 75, 98])
-
-      # Prepare output
-      output = {
-          'total_paths': total_paths,
-          'mean_final_reinvestment': mean_final,
-          'std_final_reinvestment': std_final,
-          'percentile_2': percentiles[0],
-          'percentile_25': percentiles[1],
-          'percentile_50': percentiles[2],
-          'percentile_75': percentiles[3],
-          'percentile_98': percentiles[4],
-          'all_final_values': final_values,
-          'all_paths_chart_data': all_paths_chart_data,
-          'all_sp500_paths': all_sp500_paths,
-          'all_loan_paths': all_loan_paths,
-          'all_interest_deficit_paths': all_interest_deficit_paths,
-          'all_capital_deficit_paths': all_capital_deficit_paths,
-          'all_surplus_paths': all_surplus_paths,
-          'all_units_paths': all_units_paths,
-          'all_cumulative_annuity_paths': all_cumulative_annuity_paths,
-          'all_cumulative_interest_paid_paths': all_cumulative_interest_paid_paths,
-          'all_pooled_units_paths': all_pooled_units_paths,
-          'all_hedged_units_paths': all_hedged_units_paths,
-          'mean_path_data': mean_path_data,
-          'median_path_data': median_path_data,
-          'percentile_2_data': percentile_2_data,
-          'percentile_25_data': percentile_25_data,
-          'percentile_75_data': percentile_75_data,
-          'sample_paths': sample_paths,
-          'path_generation_time': path_generation_time,
-          'simulation_time': simulation_time,
-          'total_execution_time': path_generation_time + simulation_time,
-          'parameters': {
-              'house_value': house_value,
-              'loan_duration': loan_duration,
-              'annuity_duration': annuity_duration,
-              'loan_to_value': loan_to_value,
-              'annual_income': annual_income,
-              'equity_return': equity_return,
-              'volatility': volatility,
-              'cash_rate': cash_rate,
-              'total_paths': total_paths
-          }
-      }
-
-      print(json.dumps(output))
-    PYTHON
+  # Parameters of python/monte_carlo.py's run(), already converted (rates and loan_to_value as
+  # fractions). With raw_paths and the columnar format the per-path series come back in a binary
+  # column file.
+  def python_params
+    columnar = @params[:raw_paths] && @params[:output_format] == "columnar"
+    @columnar_path = columnar ? File.join(Dir.tmpdir, "ruby_monte_carlo_#{SecureRandom.hex(8)}.bin") : nil
+
+    %i[
+      house_value loan_duration annuity_duration loan_type loan_to_value annual_income
+      equity_return volatility cash_rate total_paths time_budget_ms random_seed
+      insurer_profit_margin wholesale_lending_margin additional_loan_margins
+      holiday_enter_fraction holiday_exit_fraction subperform_loan_threshold_quarters
+      insurance_cost_pa hedged hedging_max_loss hedging_cap hedging_cost_pa
+      raw_paths lazy_tables chart_max_points columnar_float32
+    ].index_with { |key| @params[key] }.merge(columnar_path: @columnar_path)
   end
 
   def format_monte_carlo_result(python_result, execution_time)
@@ -351,6 +115,7 @@ class PythonMonteCarloService
       main_outputs: generate_monte_carlo_main_outputs(python_result),
       path_data: generate_monte_carlo_path_data(python_result),
       total_paths: python_result["total_paths"],
+      run_id: python_result["run_id"],
       chart_data: generate_monte_carlo_chart_data(python_result),
       execution_time: execution_time,
       data_source: "python_monte_carlo",
@@ -366,6 +131,7 @@ class PythonMonteCarloService
       statistics: {
         mean: python_result["mean_final_reinvestment"],
         std: python_result["std_final_reinvestment"],
+        standard_error: python_result["standard_error"],
         percentiles: {
           p2: python_result["percentile_2"],
           p25: python_result["percentile_25"],
@@ -375,7 +141,8 @@ class PythonMonteCarloService
         }
       },
       all_final_values: python_result["all_final_values"],
-      sample_paths: python_result["sample_paths"]
+      sample_paths: python_result["sample_paths"],
+      path_budget: python_result["path_budget"]
     }
   end
 
@@ -479,6 +246,14 @@ class PythonMonteCarloService
     all_pooled_units_paths = python_result["all_pooled_units_paths"] || []
     all_hedged_units_paths = python_result["all_hedged_units_paths"] || []
 
+    # Without the raw series (raw_paths off) the charts draw the representative paths,
+    # downsampled as { "x" => periods, "y" => values }
+    charts = python_result["charts"] || {}
+    series = charts["series"] || {}
+    representative = ->(name) { (series.dig(name, "paths") || []).map { |path| path.slice("x", "y", "quantile") } }
+    all_reinvestment_paths = representative.call("reinvestment") if all_reinvestment_paths.empty?
+    all_sp500_paths = representative.call("sp500") if all_sp500_paths.empty?
+
     # Fallback to sample paths if chart data is not available
     if all_reinvestment_paths.empty?
       sample_paths.each do |path_info|
@@ -493,18 +268,19 @@ class PythonMonteCarloService
 
     Rails.logger.info "Chart data: #{all_reinvestment_paths.size} paths available for visualization"
 
-    # Calculate mean paths for charts
-    mean_sp500_path = calculate_mean_path(all_sp500_paths)
-    mean_reinvestment_path = calculate_mean_path(all_reinvestment_paths)
-    mean_loan_path = calculate_mean_path(all_loan_paths)
-    mean_interest_deficit_path = calculate_mean_path(all_interest_deficit_paths)
-    mean_capital_deficit_path = calculate_mean_path(all_capital_deficit_paths)
-    mean_surplus_path = calculate_mean_path(all_surplus_paths)
-    mean_units_path = calculate_mean_path(all_units_paths)
-    mean_cumulative_annuity_path = calculate_mean_path(all_cumulative_annuity_paths)
-    mean_cumulative_interest_paid_path = calculate_mean_path(all_cumulative_interest_paid_paths)
-    mean_pooled_units_path = calculate_mean_path(all_pooled_units_paths)
-    mean_hedged_units_path = calculate_mean_path(all_hedged_units_paths)
+    # Mean paths for charts: computed by Python when it sends chart aggregates
+    mean_paths = charts["mean_paths"] || {}
+    mean_sp500_path = mean_paths["sp500"] || calculate_mean_path(all_sp500_paths)
+    mean_reinvestment_path = mean_paths["reinvestment"] || calculate_mean_path(all_reinvestment_paths)
+    mean_loan_path = mean_paths["loan"] || calculate_mean_path(all_loan_paths)
+    mean_interest_deficit_path = mean_paths["interest_deficit"] || calculate_mean_path(all_interest_deficit_paths)
+    mean_capital_deficit_path = mean_paths["capital_deficit"] || calculate_mean_path(all_capital_deficit_paths)
+    mean_surplus_path = mean_paths["surplus"] || calculate_mean_path(all_surplus_paths)
+    mean_units_path = mean_paths["units"] || calculate_mean_path(all_units_paths)
+    mean_cumulative_annuity_path = mean_paths["cumulative_annuity"] || calculate_mean_path(all_cumulative_annuity_paths)
+    mean_cumulative_interest_paid_path = mean_paths["cumulative_interest_paid"] || calculate_mean_path(all_cumulative_interest_paid_paths)
+    mean_pooled_units_path = mean_paths["pooled_units"] || calculate_mean_path(all_pooled_units_paths)
+    mean_hedged_units_path = mean_paths["hedged_units"] || calculate_mean_path(all_hedged_units_paths)
 
     chart_data = {
       # Original data
@@ -538,7 +314,13 @@ class PythonMonteCarloService
       mean_cumulative_annuity_path: mean_cumulative_annuity_path,
       mean_cumulative_interest_paid_path: mean_cumulative_interest_paid_path,
       mean_pooled_units_path: mean_pooled_units_path,
-      mean_hedged_units_path: mean_hedged_units_path
+      mean_hedged_units_path: mean_hedged_units_path,
+
+      # Server-side aggregates: fan bands per series, terminal and return histograms, risk figures
+      fan_bands: series.transform_values { |s| s.slice("x", "bands") },
+      terminal_histogram: charts["histogram"],
+      return_histogram: charts["return_histogram"],
+      risk_metrics: charts["risk"]
     }
 
     # Set default single path data from first sample if available
@@ -548,7 +330,7 @@ class PythonMonteCarloService
       chart_data[:equity_prices] = first_path["SP500"] || []
       chart_data[:periods] = first_path["Period"] || []
       chart_data[:years] = first_path["Year"] || []
-    elsif all_reinvestment_paths.any?
+    elsif all_reinvestment_paths.any? && all_reinvestment_paths[0].is_a?(Array)
       chart_data[:portfolio_values] = all_reinvestment_paths[0] || []
       chart_data[:equity_prices] = all_sp500_paths[0] || []
       chart_data[:periods] = (0...chart_data[:portfolio_values].length).to_a
@@ -0,0 +1,210 @@
+require "json"
+require "open3"
+require "socket"
+require "tempfile"
+
+# Runs the Python calculators on a small pool of long-lived
+# python/calc_worker.py processes instead of a fresh `python3` per request, so
+# interpreter start, the numpy/pandas imports and the market-data reads are
+# paid once per worker rather than on every web request.
+#
+#   output = PythonWorker.call("monte_carlo", params)       # python/monte_carlo.py's run(params)
+#   output = PythonWorker.run(python_script, name: "ruby_calculator")
+#
+# returns the module's JSON line, or what the generated script printed (stdout
+# and stderr) exactly as the old `cd python && python3 <file> 2>&1` did, so
+# callers keep parsing the first JSON line. Workers recycle themselves on memory growth; one that dies or
+# times out is discarded and replaced. If no worker can be used the script
+# falls back to a one-off python3 run. PYTHON_WORKER_DISABLED=1 always does.
+# A request that runs past TIMEOUT raises TimeoutError instead: it is not rerun.
+# When PYTHON_ZYGOTE_SOCKET names a running python/zygote.py, that fallback is
+# a forked, already-imported child instead of a cold python3.
+class PythonWorker
+  POOL_SIZE = ENV.fetch("PYTHON_WORKERS", 2).to_i
+  TIMEOUT = ENV.fetch("PYTHON_WORKER_TIMEOUT", 300).to_i
+  ZYGOTE_SOCKET = ENV["PYTHON_ZYGOTE_SOCKET"]
+
+  class Error < StandardError; end
+  # The request itself took longer than TIMEOUT (not a missing worker): reported, never rerun
+  class TimeoutError < Error; end
+
+  @idle = Queue.new
+  @lock = Mutex.new
+  @started = 0
+
+  class << self
+    def enabled?
+      !ActiveModel::Type::Boolean.new.cast(ENV["PYTHON_WORKER_DISABLED"])
+    end
+
+    def python_dir
+      Rails.root.join("python")
+    end
+
+    def run(script, name: "ruby_script")
+      if enabled?
+        begin
+          return checkout { |worker| worker.call(script: script) }["output"]
+        rescue TimeoutError
+          raise
+        rescue Error => e
+          Rails.logger.warn "Python worker unavailable (#{e.message}); running #{name} with python3"
+        end
+      end
+      zygote_run(script: script) || spawn(script, name)
+    end
+
+    # python/<module_name>.py's run(params) as its JSON line (the traceback if it failed). The
+    # module is imported once per worker; the python3 fallback pipes params to its CLI, so no
+    # script is written.
+    def call(module_name, params)
+      request = { op: "call", module: module_name, params: params }
+      if enabled?
+        begin
+          return checkout { |worker| worker.call(request) }["output"]
+        rescue TimeoutError
+          raise
+        rescue Error => e
+          Rails.logger.warn "Python worker unavailable (#{e.message}); running #{module_name}.py with python3"
+        end
+      end
+      zygote_run(request) || spawn_module(module_name, params)
+    end
+
+    # The request's output from a fork of python/zygote.py, or nil when no zygote is serving.
+    # Raises TimeoutError if the fork does not answer within TIMEOUT.
+    def zygote_run(request)
+      return unless ZYGOTE_SOCKET && File.socket?(ZYGOTE_SOCKET)
+
+      UNIXSocket.open(ZYGOTE_SOCKET) do |socket|
+        socket.puts(JSON.generate(request.merge(id: 1)))
+        raise TimeoutError, "no response within #{TIMEOUT}s" unless IO.select([ socket ], nil, nil, TIMEOUT)
+
+        line = socket.gets
+        line && JSON.parse(line)["output"]
+      end
+    rescue IOError, SystemCallError, JSON::ParserError => e
+      Rails.logger.warn "Python zygote unavailable (#{e.message})"
+      nil
+    end
+
+    # One path of a run retained by python/drilldown.py (the Monte Carlo result's run_id), built on
+    # demand: selection is path:, rank: or percentile: (of field: at period:), optional from:/to:
+    # periods and table: "ledger" | "accounts" | "both". Returns the parsed JSON, or raises Error
+    # when the run is no longer retained.
+    def ledger(run_id, **selection)
+      request = selection.compact.merge(op: "ledger", run: run_id)
+      response = nil
+      if enabled?
+        begin
+          response = checkout { |worker| worker.call(request) }
+        rescue TimeoutError
+          raise
+        rescue Error => e
+          Rails.logger.warn "Python worker unavailable (#{e.message}); running drilldown.py with python3"
+        end
+      end
+      output, error = response ? response.values_at("output", "error") : spawn_ledger(request)
+      raise Error, error if error
+
+      JSON.parse(output)
+    end
+
+    # One-off `python3 <file>` run of a script written into python/ so its imports resolve.
+    def spawn(script, name)
+      temp_path = python_dir.join("#{name}_#{Time.current.to_i}_#{rand(1000)}.py")
+      File.write(temp_path, script)
+      `cd #{python_dir} && python3 #{temp_path.basename} 2>&1`
+    ensure
+      File.delete(temp_path) if temp_path && File.exist?(temp_path)
+    end
+
+    # One-off `python3 <module_name>.py < params.json`: the JSON line, then its progress and errors.
+    def spawn_module(module_name, params)
+      output, _status = Open3.capture2e("python3", "#{module_name}.py", stdin_data: JSON.generate(params),
+                                        chdir: python_dir.to_s)
+      output
+    end
+
+    # One-off `python3 drilldown.py <run> --percentile ...`: [output, error message or nil].
+    def spawn_ledger(request)
+      args = request.except(:op, :run).flat_map { |key, value| [ "--#{key}", value.to_s ] }
+      output, error, status = Open3.capture3("python3", "drilldown.py", request[:run].to_s, *args, chdir: python_dir.to_s)
+      status.success? ? [ output, nil ] : [ nil, error.strip.presence || "drilldown.py failed" ]
+    end
+
+    def shutdown
+      @lock.synchronize do
+        @idle.pop.close until @idle.empty?
+        @started = 0
+      end
+    end
+
+    private
+
+    def checkout
+      worker = acquire
+      begin
+        result = yield worker
+      rescue Error
+        worker.close
+        @lock.synchronize { @started -= 1 }
+        raise
+      end
+      @idle << worker
+      result
+    end
+
+    # An idle worker, a new one while the pool is below POOL_SIZE, or the first one returned within
+    # TIMEOUT; Error (so the caller falls back) if every worker stays busy that long.
+    def acquire
+      @lock.synchronize do
+        return @idle.pop unless @idle.empty?
+        if @started < POOL_SIZE
+          @started += 1
+          return start_worker
+        end
+      end
+      @idle.pop(timeout: TIMEOUT) || raise(Error, "no idle worker within #{TIMEOUT}s")
+    end
+
+    def start_worker
+      WorkerProcess.new(python_dir)
+    rescue SystemCallError => e
+      @started -= 1
+      raise Error, "could not start calc_worker.py: #{e.message}"
+    end
+  end
+
+  # One calc_worker.py process speaking JSON lines on its stdin/stdout.
+  class WorkerProcess
+    def initialize(dir)
+      @stdin, @stdout, @thread = Open3.popen2("python3", "calc_worker.py", chdir: dir.to_s)
+      @ids = 0
+    end
+
+    def call(request)
+      @ids += 1
+      @stdin.puts(JSON.generate(request.merge(id: @ids)))
+      @stdin.flush
+      raise TimeoutError, "no response within #{TIMEOUT}s" unless IO.select([ @stdout ], nil, nil, TIMEOUT)
+
+      line = @stdout.gets
+      raise Error, "calc_worker.py exited (#{@thread.value})" if line.nil?
+
+      response = JSON.parse(line)
+      raise Error, "out-of-order response #{response['id']}" unless response["id"] == @ids
+      response
+    rescue IOError, SystemCallError, JSON::ParserError => e
+      raise Error, e.message
+    end
+
+    def close
+      @stdin.close unless @stdin.closed?
+      @stdout.close unless @stdout.closed?
+      ::Process.kill("KILL", @thread.pid) if @thread.alive?
+    rescue SystemCallError
+      nil
+    end
+  end
+end
@@ -148,6 +148,11 @@ Rails.application.routes.draw do
 
     get "calculators", to: "calculators#index"
     post "calculators/calculate", to: "calculators#calculate", as: :calculate_calculators
+    get "calculators/path_ledger", to: "calculators#path_ledger", as: :path_ledger_calculators
+    post "calculators/jobs", to: "calculators#submit_job", as: :calculator_jobs
+    get "calculators/jobs/:job_id", to: "calculators#job", as: :calculator_job
+    delete "calculators/jobs/:job_id", to: "calculators#cancel_job"
+    get "calculators/jobs/:job_id/events", to: "calculators#job_events", as: :calculator_job_events
 
     resources :email_templates, only: [ :index, :show, :new, :create, :edit, :update ] do
       member do
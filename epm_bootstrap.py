@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Empirical scenario generator for epm_engine_v14d: stationary / circular block bootstrap of the
+bundled monthly history (data/sp500tr.csv total-return index + data/FEDFUNDS2.csv).
+
+Joint (equity return, cash rate) months are resampled in blocks so that the equity/rate
+co-movement and within-block autocorrelation (rate cycles, drawdown clustering) survive —
+the things the GBM+MR / OU assumptions are accused of smoothing away.
+
+Fully vectorised: one (N, 12T) index matrix, one gather per series, then a reshape to years.
+No per-path loops, so a 50k-path empirical run costs about the same as a parametric one:
+
+    import epm_engine_v14d as e, epm_bootstrap as b
+    r = e.run(scenario=b.generate(50_000, tenure=30, mean_block=24, seed=42))
+
+Methods:
+  stationary -> Politis-Romano: block lengths ~ Geometric(1/mean_block), random circular starts
+  circular   -> fixed blocks of mean_block months, random circular starts
+"""
+import csv
+import os
+from datetime import datetime
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+_HISTORY = None
+
+def load_history(data_dir=DATA_DIR):
+    """Aligned monthly history -> (log_ret, cash, months).
+    log_ret[i] = log total return of S&P 500 over month i; cash[i] = Fed Funds (decimal) in month i."""
+    global _HISTORY
+    if _HISTORY is not None and _HISTORY[0] == data_dir:
+        return _HISTORY[1]
+    px = {}
+    with open(os.path.join(data_dir, 'sp500tr.csv'), encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            d = datetime.strptime(row['Date'], '%b %d, %Y')
+            key = (d.year, d.month)
+            # the file carries a mid-month duplicate for the latest month — keep the month-start print
+            if key not in px or d.day == 1:
+                px[key] = float(row['AdjClose'].replace(',', ''))
+    ff = {}
+    with open(os.path.join(data_dir, 'FEDFUNDS2.csv'), newline='') as f:
+        for row in csv.DictReader(f):
+            d = datetime.strptime(row['DATE'], '%Y-%m-%d')
+            ff[(d.year, d.month)] = float(row['FEDFUNDS'])/100.0
+    keys = sorted(px)
+    months, log_ret, cash = [], [], []
+    for prev, cur in zip(keys[:-1], keys[1:]):
+        if cur in ff:
+            months.append(cur)
+            log_ret.append(np.log(px[cur]/px[prev]))
+            cash.append(ff[cur])
+    hist = (np.array(log_ret), np.array(cash), months)
+    _HISTORY = (data_dir, hist)
+    return hist
+
+def block_indices(n_obs, n_paths, n_steps, mean_block=24, method='stationary', rng=None):
+    """(n_paths, n_steps) int matrix of history indices, built without per-path loops.
+    Each block starts at a uniform random month and runs forward, wrapping circularly."""
+    if mean_block < 1:
+        raise ValueError(f"mean_block must be >= 1 month, got {mean_block}")
+    rng = rng if rng is not None else np.random.default_rng()
+    steps = np.arange(n_steps, dtype=np.int32)
+    if method == 'stationary':
+        new_block = rng.random((n_paths, n_steps), dtype=np.float32) < 1.0/mean_block
+        new_block[:, 0] = True
+    elif method == 'circular':
+        new_block = np.broadcast_to(steps % int(round(mean_block)) == 0, (n_paths, n_steps))
+    else:
+        raise ValueError(f"unknown bootstrap method {method!r} (use 'stationary' or 'circular')")
+    # inside block b (start month s_b, opened at step t_b) the index is t + (s_b - t_b), so one
+    # offset per block, broadcast by a running block id, gives the whole matrix
+    flat = new_block.ravel()
+    opened_at = np.flatnonzero(flat) % n_steps
+    offset = rng.integers(0, n_obs, size=opened_at.size, dtype=np.int32) - opened_at.astype(np.int32)
+    block_id = np.cumsum(flat, dtype=np.int32).reshape(n_paths, n_steps) - 1
+    idx = offset[block_id] + steps
+    return np.remainder(idx, n_obs, out=idx)
+
+def generate(n_paths=50_000, tenure=30, mean_block=24, method='stationary', seed=42,
+             eq_shift=0.0, cash_shift=0.0, history=None):
+    """Bootstrapped economy in epm_engine_v14d.run(scenario=...) layout.
+    Returns {'eq_ret': (N, T+1) annual equity returns, 'cash': (N, T+1) annual-average cash rates,
+    'idx': (N, 12T) sampled history months}. Column 0 is the t=0 state (no return; first month's rate).
+    eq_shift / cash_shift: optional annual de-meaning / stress offsets (log-return p.a., rate p.a.)."""
+    log_ret, cash_m, _ = history if history is not None else load_history()
+    rng = np.random.default_rng(seed)
+    T = tenure; M = 12*T
+    idx = block_indices(len(log_ret), n_paths, M, mean_block, method, rng)
+    # gather joint (return, rate) months through the same index matrix -> (N, T, 12)
+    lr = log_ret[idx].reshape(n_paths, T, 12)
+    cm = cash_m[idx].reshape(n_paths, T, 12)
+    eq_ret = np.zeros((n_paths, T+1)); cash = np.zeros((n_paths, T+1))
+    eq_ret[:, 1:] = np.expm1(lr.sum(axis=2) + eq_shift)
+    cash[:, 1:] = np.maximum(cm.mean(axis=2) + cash_shift, 0.0)
+    cash[:, 0] = np.maximum(cm[:, 0, 0] + cash_shift, 0.0)
+    return dict(eq_ret=eq_ret, cash=cash, idx=idx)
+
+if __name__ == '__main__':
+    import time
+    import epm_engine_v14d as e
+    log_ret, cash_m, months = load_history()
+    print(f"history: {months[0][0]}-{months[0][1]:02d} .. {months[-1][0]}-{months[-1][1]:02d}  "
+          f"({len(months)} months)  equity {np.expm1(12*log_ret.mean()):.2%} p.a. geo, "
+          f"vol {log_ret.std()*np.sqrt(12):.1%}  cash mean {cash_m.mean():.2%}")
+    t0 = time.perf_counter(); base = e.run(); t_par = time.perf_counter() - t0
+    print(f"PARAMETRIC GBM+MR: PoD={base['pod']}%  mean=${base['mean_surplus']:,.0f}  ({t_par:.2f}s)")
+    for method in ['stationary', 'circular']:
+        for L in [12, 24, 60]:
+            t0 = time.perf_counter()
+            r = e.run(scenario=generate(50_000, mean_block=L, method=method))
+            dt = time.perf_counter() - t0
+            print(f"BOOTSTRAP {method:10} L={L:2}m: PoD={r['pod']:5.2f}% (SE {r['se']}%)  "
+                  f"mean=${r['mean_surplus']:>10,.0f}  p10=${r['p10']:>10,.0f}  ({dt:.2f}s)")
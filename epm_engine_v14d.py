@@ -33,33 +33,77 @@ def _collar_price(cash, cap, floor, implvol):
     put = floor*np.exp(-cash)*(1.0-_norm_cdf(d2p)) - (1.0-_norm_cdf(d1p))
     return put - call
 
-def run(params=None, n_paths=50_000, seed=42):
-    p = dict(
-        home_value=1_500_000, lvr=0.80, initial_loan=900_000,
-        annuity_pa=30_000, annuity_term=10, tenure=30, loan_type='PI',
-        wholesale_margin=0.02, retail_margin=0.007, fp_margin=0.005,
-        hedging_fee=0.0025, lmi_upfront=0.0125, reins_upfront=0.001,
-        eq_expret=0.092, eq_vol=0.166, eq_meanrev=0.163,
-        hedge_cap=1.40, hedge_floor=0.80,
-        cash_init=0.0421, cash_theta=0.0213, cash_kappa=0.24, cash_vol=0.0122,
-        corr=0.30, holiday_entry=0.75, holiday_exit=1.458,
-        profit_share_years=3, profit_taken_pct=0.10,
-        implvol=0.175,          # StochReturnVol (E31) — used for BS collar pricing
-        collar_fixed=None,      # if set (e.g. 0.003), use fixed collar ("Given" mode); else BS-priced
-        # --- glide path (NOT in Pavel's xlsm — prototype extension) ---
-        # None = 100% collared-equity throughout (matches xlsm). Else dict:
-        #   {'w_start':1.0,'w_end':0.3,'start_year':20} -> equity weight glides linearly
-        #   from w_start (held until start_year) down to w_end at maturity; rest in cash.
-        glide=None,
-        # State-dependent ratchet (NOT in xlsm — prototype). If set (e.g. 0.10), each year keep
-        # loan*(1+ratchet) in the collared-equity sleeve and lock the surplus above it into cash.
-        ratchet=None,
-        # Methodology toggle:
-        #   amortise=False -> FLAT principal (Pavel's xlsm; lump repayment at maturity)
-        #   amortise=True  -> principal pays down straight-line to 0 over the post-annuity years,
-        #                     funded from the investment account (the "P&I" reading)
-        amortise=False,
-    )
+DEFAULTS = dict(
+    home_value=1_500_000, lvr=0.80, initial_loan=900_000,
+    annuity_pa=30_000, annuity_term=10, tenure=30, loan_type='PI',
+    wholesale_margin=0.02, retail_margin=0.007, fp_margin=0.005,
+    hedging_fee=0.0025, lmi_upfront=0.0125, reins_upfront=0.001,
+    eq_expret=0.092, eq_vol=0.166, eq_meanrev=0.163,
+    hedge_cap=1.40, hedge_floor=0.80,
+    cash_init=0.0421, cash_theta=0.0213, cash_kappa=0.24, cash_vol=0.0122,
+    corr=0.30, holiday_entry=0.75, holiday_exit=1.458,
+    profit_share_years=3, profit_taken_pct=0.10,
+    implvol=0.175,          # StochReturnVol (E31) — used for BS collar pricing
+    collar_fixed=None,      # if set (e.g. 0.003), use fixed collar ("Given" mode); else BS-priced
+    # --- glide path (NOT in Pavel's xlsm — prototype extension) ---
+    # None = 100% collared-equity throughout (matches xlsm). Else dict:
+    #   {'w_start':1.0,'w_end':0.3,'start_year':20} -> equity weight glides linearly
+    #   from w_start (held until start_year) down to w_end at maturity; rest in cash.
+    glide=None,
+    # State-dependent ratchet (NOT in xlsm — prototype). If set (e.g. 0.10), each year keep
+    # loan*(1+ratchet) in the collared-equity sleeve and lock the surplus above it into cash.
+    ratchet=None,
+    # Methodology toggle:
+    #   amortise=False -> FLAT principal (Pavel's xlsm; lump repayment at maturity)
+    #   amortise=True  -> principal pays down straight-line to 0 over the post-annuity years,
+    #                     funded from the investment account (the "P&I" reading)
+    amortise=False,
+)
+
+def economy(p, n_paths, rng, start=None):
+    """Parametric economy: OU cash rate and GBM + mean reversion to the LAGGED trend (start 100),
+    equity shocks correlated to cash. Returns {'eq_ret', 'cash', 'sp'}, each (N, T+1).
+    start=(t0, cash_t0, sp_t0) continues each path from its year-t0 state (columns < t0 unused) —
+    used for nested/inner simulation from an outer scenario."""
+    T = p['tenure']; N = n_paths
+    # ---- shocks: cash, and equity correlated to cash ----
+    zc = rng.standard_normal((N, T+1))
+    ze_ind = rng.standard_normal((N, T+1))
+    ze = p['corr']*zc + np.sqrt(1-p['corr']**2)*ze_ind
+    er, ev, ek = p['eq_expret'], p['eq_vol'], p['eq_meanrev']
+
+    t0 = 0
+    cash = np.zeros((N, T+1)); sp_path = np.zeros((N, T+1)); eq_ret = np.zeros((N, T+1))
+    if start is None:
+        cash[:, 0] = p['cash_init']; sp = np.full(N, 100.0); ltm = np.full(N, 100.0)
+    else:
+        t0, cash0, sp0 = start
+        cash[:, t0] = cash0; sp = np.broadcast_to(np.asarray(sp0, dtype=float), (N,)).copy()
+        ltm = np.full(N, 100.0*(1+er)**t0)
+    sp_path[:, t0] = sp
+
+    # ---- cash rate (OU exact discretisation) ----
+    w = np.exp(-p['cash_kappa'])
+    for t in range(t0+1, T+1):
+        cash[:, t] = np.maximum(cash[:, t-1]*w + p['cash_theta']*(1-w) + p['cash_vol']*zc[:, t], 0)
+
+    # ---- equity (GBM + mean reversion to LAGGED trend) ----
+    for t in range(t0+1, T+1):
+        sp_new = sp*(1+er+ev*ze[:, t]) + ek*(ltm - sp)
+        ltm = ltm*(1+er)
+        eq_ret[:, t] = sp_new/sp - 1
+        sp = sp_new
+        sp_path[:, t] = sp
+    return dict(eq_ret=eq_ret, cash=cash, sp=sp_path)
+
+def run(params=None, n_paths=50_000, seed=42, scenario=None, keep_states=False):
+    # scenario: optional pre-generated economy {'eq_ret': (N, T+1) raw annual equity returns,
+    # 'cash': (N, T+1) cash rates}, e.g. from epm_bootstrap.generate(). Replaces the GBM+MR /
+    # OU shocks; n_paths and seed are then ignored (N comes from the arrays). An optional
+    # 'collar' (N, T+1) entry reuses a precomputed _collar_price() matrix for the same economy.
+    # keep_states: also return out['states'] — the per-path, per-year (N, T+1) state matrices
+    # (end-of-year IA, holiday account/flag, surplus, economy) plus per-path claims.
+    p = dict(DEFAULTS)
     if params: p.update(params)
     T = p['tenure']; N = n_paths
     rng = np.random.default_rng(seed)
@@ -80,28 +124,17 @@ def run(params=None, n_paths=50_000, seed=42):
         cust_loan[t] = cust_loan[t-1] + (p['annuity_pa'] if t <= p['annuity_term'] else 0)
     max_loan = loan.max()
 
-    # ---- shocks: cash, and equity correlated to cash ----
-    zc = rng.standard_normal((N, T+1))
-    ze_ind = rng.standard_normal((N, T+1))
-    ze = p['corr']*zc + np.sqrt(1-p['corr']**2)*ze_ind
-
-    # ---- cash rate (OU exact discretisation) ----
-    cash = np.zeros((N, T+1)); cash[:, 0] = p['cash_init']
-    w = np.exp(-p['cash_kappa'])
-    for t in range(1, T+1):
-        cash[:, t] = np.maximum(cash[:, t-1]*w + p['cash_theta']*(1-w) + p['cash_vol']*zc[:, t], 0)
-
-    # ---- equity (GBM + mean reversion to LAGGED trend), start 100 ----
-    sp = np.full(N, 100.0); ltm = np.full(N, 100.0)
-    inv_ret_hedged = np.zeros((N, T+1))
-    er, ev, ek = p['eq_expret'], p['eq_vol'], p['eq_meanrev']
-    floor_r, cap_r = p['hedge_floor']-1, p['hedge_cap']-1
-    for t in range(1, T+1):
-        sp_new = sp*(1+er+ev*ze[:, t]) + ek*(ltm - sp)
-        ltm = ltm*(1+er)
-        raw = sp_new/sp - 1
-        sp = sp_new
-        inv_ret_hedged[:, t] = np.clip(raw, floor_r, cap_r)
+    # ---- economy: parametric GBM+MR / OU unless a pre-generated scenario is supplied ----
+    if scenario is None:
+        scenario = economy(p, N, rng)
+    cash = np.asarray(scenario['cash'], dtype=float)
+    raw_ret = np.asarray(scenario['eq_ret'], dtype=float)
+    if cash.ndim != 2 or cash.shape[1] != T+1 or raw_ret.shape != cash.shape:
+        raise ValueError(f"scenario arrays must both be (n_paths, {T+1}); "
+                         f"got cash {cash.shape}, eq_ret {raw_ret.shape}")
+    N = cash.shape[0]
+    inv_ret_hedged = np.clip(raw_ret, p['hedge_floor']-1, p['hedge_cap']-1)
+    inv_ret_hedged[:, 0] = 0.0
 
     # ---- equity-weight schedule: glide (calendar) precomputed; ratchet (state-dependent) in-loop ----
     wq = np.ones(T+1)
@@ -113,6 +146,8 @@ def run(params=None, n_paths=50_000, seed=42):
     # ---- base collar price per path/period (BS each year, or fixed "Given" mode) ----
     if p['collar_fixed'] is not None:
         base_collar = np.full((N, T+1), float(p['collar_fixed']))
+    elif scenario.get('collar') is not None:   # caller-cached BS price for this cap/floor/implvol
+        base_collar = np.asarray(scenario['collar'], dtype=float)
     else:
         base_collar = _collar_price(cash, p['hedge_cap'], p['hedge_floor'], p['implvol'])
 
@@ -135,6 +170,10 @@ def run(params=None, n_paths=50_000, seed=42):
     profit_share_fp = np.zeros(N)
     holiday_years = np.zeros(N)
     holiday_by_year = np.zeros(T+1)
+    if keep_states:
+        ia_by_year = np.zeros((N, T+1)); ia_by_year[:, 0] = IA
+        hacct_by_year = np.zeros((N, T+1))
+        hflag_by_year = np.zeros((N, T+1), dtype=np.int8)
 
     for t in range(1, T+1):
         funding_cost = p['wholesale_margin'] + cash[:, t]
@@ -201,6 +240,8 @@ def run(params=None, n_paths=50_000, seed=42):
             IA = IA*(1 - base_collar[:, t]*eqw)   # collar only on the equity sleeve
         else:
             IA = IA - np.maximum(surplus, 0)   # windup
+        if keep_states:
+            ia_by_year[:, t] = IA; hacct_by_year[:, t] = holiday_acct; hflag_by_year[:, t] = holiday_flag
 
     final = surplus_by_year[:, T]
     pod = float(np.mean(final < 0)*100)
@@ -250,6 +291,10 @@ def run(params=None, n_paths=50_000, seed=42):
         p25=round(float(np.percentile(final, 25)), 0),
         final=final,
     )
+    if keep_states:
+        out['states'] = dict(IA=ia_by_year, holiday_acct=hacct_by_year, holiday_flag=hflag_by_year,
+                             surplus=surplus_by_year, cash=cash, eq_ret=raw_ret, sp=scenario.get('sp'),
+                             loan=loan, top_cover=top_cover, lmi_claim=lmi_claim, reins_claim=reins_claim)
     return out
 
 if __name__ == '__main__':
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Least-squares Monte Carlo (LSMC) proxies for mid-life valuation and tail capital of an
+outstanding v14d EPM — without nested simulation.
+
+One epm_engine_v14d run (keep_states=True) gives, for every path, the year-t state and the
+realised maturity outcome. Regressing the discounted outcome on a polynomial basis of the state
+estimates the conditional expectation E[PV_t | state_t], i.e. the value of the book at year t:
+
+    targets (PV at t, pathwise discount exp(-sum cash[t+1..T])):
+      surplus      terminal BalanceSurplus (negative = deficit)
+      lmi_claim    LMI first-loss layer (deficit capped at the base run's top_cover boundary)
+      reins_claim  reinsurance tail layer (excess deficit beyond top_cover)
+    state at t:   IA/loan, cash rate, holiday account/loan, holiday flag, equity gap sp/trend-1
+
+The fitted proxy then prices any outer scenario set (real-world states at t, stressed states,
+bootstrap states) in milliseconds, which makes 99.5% capital for the LMI/reinsurance layers a
+quantile over proxy values. nested_benchmark() checks the proxy out-of-sample against a small
+brute-force nested run (outer paths replayed exactly to year t, fresh inner economies after).
+
+    import epm_lsmc as L
+    m = L.fit(years=(10,))
+    outer = L.outer_states(m, 10, n_outer=100_000, seed=7)
+    L.capital(m, 10, outer)          # {'reins_claim': {'mean':..,'q':..,'capital':..}, ...}
+"""
+import itertools
+import numpy as np
+import epm_engine_v14d as e
+
+TARGETS = ('surplus', 'lmi_claim', 'reins_claim')
+FEATURES = ('ia', 'cash', 'holiday', 'holiday_flag', 'eq_gap')
+
+def state_at(p, states, t):
+    """Year-t state vector of every path, from run(..., keep_states=True)['states']."""
+    loan_t = float(states['loan'][t])
+    sp = states.get('sp')
+    if sp is not None:
+        eq_gap = sp[:, t]/(100.0*(1+p['eq_expret'])**t) - 1.0
+    else:   # bootstrap scenarios carry no trend — the gap is not a state there
+        eq_gap = np.zeros(len(states['IA']))
+    return dict(ia=states['IA'][:, t]/loan_t, cash=states['cash'][:, t],
+                holiday=states['holiday_acct'][:, t]/loan_t,
+                holiday_flag=states['holiday_flag'][:, t].astype(float), eq_gap=eq_gap)
+
+def _pv_targets(states, t, top_cover):
+    final = states['surplus'][:, -1]
+    disc = np.exp(-states['cash'][:, t+1:].sum(axis=1))
+    deficit = np.maximum(-final, 0.0)
+    return dict(surplus=disc*final,
+                lmi_claim=disc*np.minimum(deficit, -top_cover),
+                reins_claim=disc*np.maximum(top_cover - final, 0.0))
+
+def _basis(X, degree):
+    # all monomials of the standardised features up to `degree` (incl. intercept)
+    n, k = X.shape
+    cols = [np.ones(n)]
+    for d in range(1, degree+1):
+        for combo in itertools.combinations_with_replacement(range(k), d):
+            cols.append(np.prod(X[:, combo], axis=1))
+    return np.column_stack(cols)
+
+def _design(state, scale, degree):
+    X = np.column_stack([state[f] for f in FEATURES])
+    return _basis((X - scale[0])/scale[1], degree)
+
+def fit(params=None, years=(5, 10, 15, 20), n_paths=50_000, seed=42, degree=3, ridge=1e-6):
+    """Regress discounted maturity outcomes on year-t state from ONE engine run.
+    Returns a model dict: {'params', 'degree', 'top_cover', 'proxies': {t: {...}}}."""
+    p = dict(e.DEFAULTS)
+    if params: p.update(params)
+    r = e.run(p, n_paths=n_paths, seed=seed, keep_states=True)
+    states = r['states']
+    top_cover = states['top_cover']
+    proxies = {}
+    for t in years:
+        if not 0 < t < p['tenure']:
+            raise ValueError(f"valuation year must be inside the term (0, {p['tenure']}), got {t}")
+        state = state_at(p, states, t)
+        X = np.column_stack([state[f] for f in FEATURES])
+        sd = X.std(axis=0); sd[sd == 0] = 1.0
+        scale = (X.mean(axis=0), sd)
+        B = _basis((X - scale[0])/scale[1], degree)
+        # ridge-regularised normal equations (basis is small; N x K once per year)
+        A = B.T @ B + ridge*n_paths*np.eye(B.shape[1])
+        ys = _pv_targets(states, t, top_cover)
+        coef = {k: np.linalg.solve(A, B.T @ y) for k, y in ys.items()}
+        r2 = {k: float(1 - np.var(y - B @ coef[k])/np.var(y)) if np.var(y) > 0 else 1.0
+              for k, y in ys.items()}
+        proxies[t] = dict(scale=scale, coef=coef, r2_insample=r2)
+    return dict(params=p, degree=degree, top_cover=top_cover, proxies=proxies,
+                base=dict(pod=r['pod'], lmi_prem=r['lmi_prem'], reins_prem=r['reins_prem']))
+
+def evaluate(model, t, state):
+    """Proxy PV at year t of each target for every state in `state` (dict of arrays)."""
+    px = model['proxies'][t]
+    B = _design(state, px['scale'], model['degree'])
+    return {k: B @ c for k, c in px['coef'].items()}
+
+def capital(model, t, state, q=0.995):
+    """Value and tail capital over an outer scenario set: for the claim layers the q-quantile
+    of PV (loss), for surplus the (1-q)-quantile; capital = |quantile - mean|."""
+    vals = evaluate(model, t, state)
+    out = {}
+    for k, v in vals.items():
+        level = 1-q if k == 'surplus' else q
+        qv = float(np.quantile(v, level))
+        out[k] = dict(mean=float(v.mean()), q=qv, capital=abs(qv - float(v.mean())))
+    return out
+
+def outer_states(model, t, n_outer=100_000, seed=7, scenario=None):
+    """Real-world outer scenario set at year t (parametric, or a supplied scenario)."""
+    r = e.run(model['params'], n_paths=n_outer, seed=seed, scenario=scenario, keep_states=True)
+    return state_at(model['params'], r['states'], t)
+
+def nested_benchmark(model, t, n_outer=200, n_inner=500, seed=7, q=0.995):
+    """Brute-force nested valuation for a small outer set, to validate the proxy out-of-sample.
+    Each outer path's economy is replayed exactly to year t (so its waterfall state is exact),
+    then n_inner fresh parametric continuations are drawn from its (cash, equity) state."""
+    p = model['params']; T = p['tenure']
+    outer = e.run(p, n_paths=n_outer, seed=seed, keep_states=True)['states']
+    rep = np.repeat(np.arange(n_outer), n_inner)
+    inner = e.economy(p, n_outer*n_inner, np.random.default_rng(seed + 1),
+                      start=(t, outer['cash'][rep, t], outer['sp'][rep, t]))
+    for k in ('eq_ret', 'cash', 'sp'):
+        inner[k][:, :t+1] = outer[k][rep, :t+1]
+    st = e.run(p, scenario=inner, keep_states=True)['states']
+    ys = _pv_targets(st, t, model['top_cover'])
+    nested = {k: v.reshape(n_outer, n_inner).mean(axis=1) for k, v in ys.items()}
+    nested_se = {k: v.reshape(n_outer, n_inner).std(axis=1).mean()/np.sqrt(n_inner) for k, v in ys.items()}
+    proxy = evaluate(model, t, state_at(p, outer, t))
+    out = {}
+    for k in TARGETS:
+        err = proxy[k] - nested[k]
+        var = np.var(nested[k])
+        out[k] = dict(rmse=float(np.sqrt(np.mean(err**2))), bias=float(err.mean()),
+                      r2=float(1 - np.mean(err**2)/var) if var > 0 else 1.0,
+                      inner_se=float(nested_se[k]),
+                      nested_mean=float(nested[k].mean()), proxy_mean=float(proxy[k].mean()))
+    return out
+
+if __name__ == '__main__':
+    import time
+    t0 = time.perf_counter()
+    m = fit(years=(5, 10, 20))
+    print(f"fit (one 50k-path run, 3 valuation years): {time.perf_counter()-t0:.2f}s   "
+          f"base PoD={m['base']['pod']}%  top_cover=${m['top_cover']:,.0f}")
+    for t, px in m['proxies'].items():
+        print(f"  t={t:2}: in-sample R2 " + "  ".join(f"{k}={v:.3f}" for k, v in px['r2_insample'].items()))
+    t = 10
+    outer = outer_states(m, t, n_outer=100_000)
+    t0 = time.perf_counter(); cap = capital(m, t, outer); dt = time.perf_counter() - t0
+    print(f"\nYear-{t} value & 99.5% capital over 100k outer states ({dt*1000:.1f} ms):")
+    for k, v in cap.items():
+        print(f"  {k:12} mean=${v['mean']:>12,.0f}  q=${v['q']:>12,.0f}  capital=${v['capital']:>12,.0f}")
+    t0 = time.perf_counter(); nb = nested_benchmark(m, t, n_outer=100, n_inner=400)
+    print(f"\nOut-of-sample vs nested benchmark (100 outer x 400 inner, {time.perf_counter()-t0:.1f}s):")
+    for k, v in nb.items():
+        print(f"  {k:12} R2={v['r2']:.3f}  RMSE=${v['rmse']:>10,.0f}  bias=${v['bias']:>9,.0f}  "
+              f"(inner SE ${v['inner_se']:,.0f})  nested mean=${v['nested_mean']:,.0f} proxy=${v['proxy_mean']:,.0f}")
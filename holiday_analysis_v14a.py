@@ -7,6 +7,7 @@ and their percentile distribution.
 
 import numpy as np
 import json
+from epm_path_analytics import total_hist
 
 # ============================================================
 # v14a PARAMETERS (from FutureProofCalculator_Pavel_v14a.xlsm)
@@ -159,6 +160,7 @@ def run_holiday_analysis():
     # HOLIDAY DISTRIBUTION ANALYSIS
     # ============================================================
     total_holidays_per_path = np.sum(yearly_holidays, axis=1)
+    count_hist = total_hist(yearly_holidays.astype(bool))
 
     print("=" * 70)
     print("HOLIDAY DISTRIBUTION ANALYSIS — 50,000 paths")
@@ -176,8 +178,7 @@ def run_holiday_analysis():
 
     # Distribution histogram
     print(f"\n--- Distribution of Total Holidays ---")
-    for count in range(int(np.max(total_holidays_per_path)) + 1):
-        n = np.sum(total_holidays_per_path == count)
+    for count, n in enumerate(count_hist):
         pct = n / N_PATHS * 100
         if pct >= 0.1:  # Only show if >= 0.1%
             bar = '#' * int(pct * 2)
@@ -225,10 +226,9 @@ def run_holiday_analysis():
         # Distribution of total holiday counts
         'holiday_count_distribution': {},
     }
-    for count in range(int(np.max(total_holidays_per_path)) + 1):
-        n = int(np.sum(total_holidays_per_path == count))
+    for count, n in enumerate(count_hist):
         if n > 0:
-            results['holiday_count_distribution'][str(count)] = n
+            results['holiday_count_distribution'][str(count)] = int(n)
 
     with open('holiday_analysis_v14a_results.json', 'w') as f:
         json.dump(results, f, indent=2)
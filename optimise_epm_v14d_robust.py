@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Robust EPM v14d optimisation: score every candidate product under K assumption sets.
+optimise_epm_v14d.py picks winners under the base assumptions only, but PoD moves from ~9%
+(base) to ~40% (central) and ~70% (adverse). Here each candidate is scored across the whole
+ensemble and ranked on a robust objective:
+    worst  -> max PoD over the assumption sets
+    cvar   -> weighted CVaR of PoD across sets (mean of the worst (1-alpha) probability mass)
+Cost ~ K x one sweep. Candidates are not batched: each (candidate, set) pair is still its own
+e.run() over the set's paths. What is shared is the common random numbers: every set's economy
+(shocks, cash/equity paths) is generated ONCE from the same seed, so candidate differences are
+not simulation noise, and the BS collar matrix is cached per (set, cap, floor), so each pair
+pays only for the waterfall.
+NOTE: engine is ~1-2.5pp conservative on PoD; winners must be spot-checked on Pavel's xlsm."""
+import itertools
+import time
+import numpy as np
+import epm_engine_v14d as e
+
+GROSS = 1_200_000   # 80% LVR x $1.5M; peak loan is always gross regardless of annuity
+NP = 20_000
+
+# scenario ensemble from epm_engine_v14d.__main__ (xlsm targets 8% / 40% / 69%); weights for CVaR
+ASSUMPTION_SETS = {
+    'base':    dict(),
+    'central': dict(eq_expret=0.085, eq_meanrev=0.13, cash_theta=0.027, collar_fixed=0.003, wholesale_margin=0.022),
+    'adverse': dict(eq_expret=0.080, eq_meanrev=0.10, cash_theta=0.030, collar_fixed=0.004, wholesale_margin=0.025),
+}
+WEIGHTS = {'base': 0.5, 'central': 0.3, 'adverse': 0.2}
+ECONOMY_KEYS = ('tenure', 'eq_expret', 'eq_vol', 'eq_meanrev', 'cash_init', 'cash_theta',
+                'cash_kappa', 'cash_vol', 'corr')
+
+def cfg(annuity_total, term, floor=0.80, cap=1.40, fp=0.005, ps_pct=0.10, glide=None):
+    return dict(initial_loan=GROSS-annuity_total, annuity_pa=annuity_total/term, annuity_term=term,
+                hedge_floor=floor, hedge_cap=cap, fp_margin=fp, profit_taken_pct=ps_pct, glide=glide)
+
+def prepare(sets=ASSUMPTION_SETS, n_paths=NP, seed=42):
+    """One economy per assumption set, all from the same seed (shared shocks)."""
+    prepared = []
+    for name, overrides in sets.items():
+        p = dict(e.DEFAULTS); p.update(overrides)
+        econ = e.economy(p, n_paths, np.random.default_rng(seed))
+        prepared.append(dict(name=name, overrides=overrides, p=p, econ=econ, collars={}))
+    return prepared
+
+def evaluate(candidate, prepared):
+    """Run one candidate product under every prepared assumption set -> list of result dicts."""
+    clash = [k for k in candidate if k in ECONOMY_KEYS]
+    if clash:
+        raise ValueError(f"candidate sets economy parameters {clash}; put them in the assumption sets")
+    results = []
+    for s in prepared:
+        params = dict(s['overrides']); params.update(candidate)
+        scenario = dict(s['econ'])
+        p = dict(s['p']); p.update(candidate)
+        if p['collar_fixed'] is None:
+            key = (p['hedge_cap'], p['hedge_floor'], p['implvol'])
+            if key not in s['collars']:
+                s['collars'][key] = e._collar_price(scenario['cash'], *key)
+            scenario['collar'] = s['collars'][key]
+        results.append(e.run(params, scenario=scenario))
+    return results
+
+def cvar(values, weights, alpha=0.5):
+    """Weighted CVaR across scenarios: mean of the worst (1-alpha) mass of `values` (higher = worse)."""
+    x = np.asarray(values, dtype=float); w = np.asarray(weights, dtype=float)
+    order = np.argsort(-x); xs, ws = x[order], w[order]/w.sum()
+    tail = 1.0 - alpha
+    take = np.clip(tail - (np.cumsum(ws) - ws), 0.0, ws)
+    return float((xs*take).sum()/tail)
+
+def robust(values, weights, objective='worst', alpha=0.5):
+    if objective == 'worst':
+        return float(np.max(values))
+    if objective == 'cvar':
+        return cvar(values, weights, alpha)
+    raise ValueError(f"unknown robust objective {objective!r} (use 'worst' or 'cvar')")
+
+def sweep(candidates, prepared, weights=WEIGHTS, alpha=0.5):
+    w = [weights.get(s['name'], 1.0) for s in prepared]
+    rows = []
+    for (annuity, term, floor), c in candidates:
+        res = evaluate(c, prepared)
+        pods = [r['pod'] for r in res]
+        stake = [r['fp_revenue']+r['lender_nim']+r['funder_margin'] for r in res]
+        rows.append(dict(annuity=annuity, term=term, floor=floor, pods=pods,
+                         worst=robust(pods, w, 'worst'), cvar=robust(pods, w, 'cvar', alpha),
+                         stakeholder=float(np.dot(w, stake)/np.sum(w))))
+    return rows
+
+def best_at(rows, ceiling_pod, objective, label):
+    feas = [x for x in rows if x[objective] <= ceiling_pod]
+    if not feas:
+        print(f"  {label}: no feasible config"); return
+    # borrower income wins ties: max annuity, then max weighted stakeholder revenue
+    feas.sort(key=lambda x: (-x['annuity'], -x['stakeholder']))
+    b = feas[0]
+    print(f"  {label} ({objective} PoD<= {ceiling_pod}%): annuity=${b['annuity']:,} ({b['term']}yr)  floor={b['floor']:.2f}  "
+          f"-> PoD base/central/adverse={'/'.join(f'{v:.1f}' for v in b['pods'])}%  stakeholder=${b['stakeholder']:,.0f}")
+
+if __name__ == '__main__':
+    grid = [((a, t, f), cfg(a, t, floor=f)) for a, t, f in itertools.product(
+        [250_000, 300_000, 350_000, 400_000], [10, 15, 20, 25], [0.80, 0.85, 0.90])]
+    K = len(ASSUMPTION_SETS)
+    t0 = time.perf_counter(); e.run(grid[0][1], n_paths=NP); t_single = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    prepared = prepare()
+    rows = sweep(grid, prepared)
+    elapsed = time.perf_counter() - t0
+    print("="*72)
+    print(f"ROBUST SWEEP: {len(grid)} candidates x {K} assumption sets ({', '.join(ASSUMPTION_SETS)})")
+    print(f"  {elapsed:.1f}s vs ~{t_single*len(grid)*K:.1f}s for {K} independent sweeps "
+          f"({elapsed/(t_single*len(grid)):.2f}x one single-assumption sweep)")
+    print("="*72)
+    for objective in ['worst', 'cvar']:
+        print(f"\nBest config by {objective} PoD across sets (borrower annuity maximised, then revenue):")
+        for ceil in [25.0, 50.0, 75.0]:
+            best_at(rows, ceil, objective, f"ceiling {ceil:.0f}%")
@@ -14,6 +14,7 @@ All tests replicate the v14c-003 simulation core except where noted.
 
 import numpy as np
 import time
+import epm_path_analytics as pa
 
 # ============================================================
 # v14c-003 PARAMETERS (from monte_carlo_v14c_003.py)
@@ -188,7 +189,7 @@ def simulate(mean_rev=EQUITY_MEAN_REV,
         yearly_surplus[:, t] = surplus
 
     final = yearly_surplus[:, -1]
-    pod = np.mean(final < 0) * 100
+    pod = pa.rate(final < 0)
     se = np.sqrt(pod/100 * (1 - pod/100) / N_PATHS) * 100
 
     result = {
@@ -225,7 +226,7 @@ for gamma in [0.0, 0.05, 0.10, 0.163, 0.25, 0.40]:
 
 base_pod = next(r for r in mr_tests if r['params']['gamma'] == 0.163)['pod']
 no_mr_pod = next(r for r in mr_tests if r['params']['gamma'] == 0.0)['pod']
-print(f"\n  γ=0 (pure GBM) vs base γ=0.163: PoD multiplier = {no_mr_pod/base_pod:.1f}×")
+print(f"\n  γ=0 (pure GBM) vs base γ=0.163: PoD multiplier = {no_mr_pod/max(base_pod,0.01):.1f}×")
 
 # ============================================================
 # T2: Sequence-of-returns
@@ -244,13 +245,8 @@ last10_cum = np.prod(1 + ret[:, 20:30], axis=1) - 1
 mid10_cum = np.prod(1 + ret[:, 10:20], axis=1) - 1
 
 def tercile_pod(cumret, final):
-    q33, q67 = np.percentile(cumret, [33.3, 66.7])
-    bot = cumret < q33
-    mid = (cumret >= q33) & (cumret < q67)
-    top = cumret >= q67
-    return (np.mean(final[bot] < 0)*100,
-            np.mean(final[mid] < 0)*100,
-            np.mean(final[top] < 0)*100)
+    # PoD in the bottom / middle / top tercile of cumret, one bincount pass
+    return tuple(pa.bucket_rates(cumret, final < 0, np.percentile(cumret, [33.3, 66.7])))
 
 print("  First 10 years (annuity draw-down phase):")
 b, m, t = tercile_pod(first10_cum, final)
@@ -331,14 +327,14 @@ ret_p10 = np.percentile(mean_return, 10)
 stress_equity = mean_return < ret_p20
 stress_equity_extreme = mean_return < ret_p10
 
-pod_overall = np.mean(final < 0) * 100
-pod_stress = np.mean(final[stress_equity] < 0) * 100
-pod_stress_extreme = np.mean(final[stress_equity_extreme] < 0) * 100
-pod_benign = np.mean(final[~stress_equity] < 0) * 100
+pod_overall = pa.rate(final < 0)
+pod_stress = pa.rate(final < 0, stress_equity)
+pod_stress_extreme = pa.rate(final < 0, stress_equity_extreme)
+pod_benign = pa.rate(final < 0, ~stress_equity)
 
 print(f"  PoD overall:                        {pod_overall:6.2f}%")
-print(f"  PoD | equity worst 20% paths:       {pod_stress:6.2f}%  ({pod_stress/pod_overall:.1f}× base)")
-print(f"  PoD | equity worst 10% paths:       {pod_stress_extreme:6.2f}%  ({pod_stress_extreme/pod_overall:.1f}× base)")
+print(f"  PoD | equity worst 20% paths:       {pod_stress:6.2f}%  ({pod_stress/max(pod_overall,0.01):.1f}× base)")
+print(f"  PoD | equity worst 10% paths:       {pod_stress_extreme:6.2f}%  ({pod_stress_extreme/max(pod_overall,0.01):.1f}× base)")
 print(f"  PoD | better than worst 20%:        {pod_benign:6.2f}%")
 
 # What fraction of total EPM loss is concentrated in the worst-10% equity paths?
@@ -347,7 +343,7 @@ worst10_loss_abs = np.sum(np.minimum(final[stress_equity_extreme], 0))
 print(f"\n  Loss concentration:")
 print(f"    Total deficit dollars (all paths):        ${-total_loss_abs:,.0f}")
 print(f"    Dollars in worst-10% equity paths:        ${-worst10_loss_abs:,.0f}")
-print(f"    Concentration:                            {worst10_loss_abs/total_loss_abs*100:.1f}%")
+print(f"    Concentration:                            {(worst10_loss_abs/total_loss_abs*100 if total_loss_abs else 0.0):.1f}%")
 
 # ============================================================
 # T5: Like-for-like traditional mortgage
@@ -2,15 +2,12 @@ import sys
 import json
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 from statistics import geometric_mean
 
-import pprint
-import math
-import numpy_financial as npf
 from core_model import single_mortgage, gen_monte_carlo_paths
-from utils import mean_sd, dollar, pcntdf, pcnt, secant
+from utils import mean_sd, dollar, pcntdf, pcnt
+import calibration
 
 input = json.loads(sys.stdin.read())
 output = {}
@@ -95,21 +92,23 @@ for loan_duration in [15, 20, 25, 30]:
 
 
   
-  def simulate_with_insurance(insurance_cost):
+  def simulate_with_insurance(insurance_cost, paths = mc_price_paths, as_cube = False):
     return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                       insurance_profit_margin,insurance_cost,
                       cash_rate,wholesale_lending_margin,additional_loan_margins,
                       holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                      mc_price_paths, S0, dt1, max_superpay_factor, superpay_start_factor)
-  def insurance_deficit(insurance_cost):
-    df = simulate_with_insurance(insurance_cost)
-    dfend = df[df['Period']==loan_duration*4]
-    insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-    #print("insurance deficit", insurance_payout - insurance_cost)
-    return insurance_payout - insurance_cost
-
-
-  insurance_secant = secant(insurance_deficit,10000,50000,250)
+                      paths, S0, dt1, max_superpay_factor, superpay_start_factor, as_cube=as_cube)
+  def insurance_deficit(insurance_costs):
+    paths, cost = calibration.tile_paths(mc_price_paths, insurance_costs)
+    dfend = simulate_with_insurance(cost, paths, as_cube=True).at(loan_duration*4)
+    insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+    #print("insurance deficit", insurance_payout - insurance_costs)
+    return insurance_payout - insurance_costs
+
+
+  insurance_secant = calibration.solve(insurance_deficit,10000,50000,250,
+    upper=calibration.max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin, cash_rate, loan_duration),
+    key=dict(input, script='book', loan_duration=loan_duration))
   df = simulate_with_insurance(insurance_secant)
   
   initial_units = df.at[0, 'Units'].mean()
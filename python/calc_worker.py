@@ -0,0 +1,241 @@
+"""
+Long-lived calculation worker for the Rails Python services.
+
+PythonMonteCarloService and PythonCalculatorService wrote a script into python/ and ran
+`python3 <file>` per web request: interpreter start, the numpy / pandas / matplotlib imports,
+bytecode compilation and the CSV reads came before any maths, ~1s of a typical request. The worker
+pays that once. It preloads the engines (core_model, engine, epm_engine_v14d, ...) and the market
+data, then runs each request's script in a fresh namespace of the same process, returning what the
+script printed, so the services parse the same output as before.
+
+Protocol: one JSON object per line in, one per line out.
+
+    {"id": 1, "script": "<python source>"}                      run a generated script
+    {"id": 2, "file": "pyrainy.py", "stdin": "{...inputs...}"}  run a script in python/ with stdin
+    {"id": 4, "calculator": "pyrainy", "input": {...}}          the same through result_cache
+    {"id": 5, "op": "ledger", "run": "<run id>", "percentile": 0.25, "table": "accounts"}
+                                                                one path of a retained run (drilldown.py)
+    {"id": 6, "op": "call", "module": "monte_carlo", "params": {...}}
+                                                                an entry module's run(params) as a JSON line
+    {"id": 3, "op": "ping"}                                     liveness / memory probe
+ -> {"id": 1, "status": "ok" | "error", "output": "<stdout + stderr>", "error": null | "<message>",
+     "elapsed": seconds, "rss_mb": ..., "requests": ...}
+
+    python3 calc_worker.py                       serve stdin / stdout (the Rails client's pool)
+    python3 calc_worker.py --socket /tmp/calc.sock [--max-requests N] [--max-growth-mb MB]
+
+The worker recycles itself, re-executing in place after answering, once it has served MAX_REQUESTS
+requests or its resident memory has grown MAX_GROWTH_MB past the post-preload baseline (pandas
+and matplotlib caches, fragmentation). Pipes and the socket path survive the re-exec, so clients
+only see one slower request.
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import socket
+import sys
+import time
+import traceback
+
+import result_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAX_REQUESTS = 500
+MAX_GROWTH_MB = 512
+PRELOAD = ('numpy', 'pandas', 'numpy_financial', 'core_model', 'core_model_advanced',
+           'core_model_montecarlo', 'engine', 'path_cube', 'calibration', 'run_store', 'utils',
+           'chart_data', 'drilldown', 'lattice', 'monte_carlo', 'epm_engine_v14d')
+MODULES = ('monte_carlo',)       # entry modules the 'call' op runs: run(params) -> dict, dumps(result)
+
+
+def preload():
+    """Import the engines and read the market data; returns the modules that failed to import."""
+    os.chdir(HERE)
+    for path in (HERE, os.path.dirname(HERE)):       # epm_engine_v14d lives at the repo root
+        if path not in sys.path:
+            sys.path.append(path)
+    missing = []
+    for name in PRELOAD:
+        try:
+            __import__(name)
+        except ImportError:
+            missing.append(name)
+    import market_data
+    market_data.preload()
+    return missing
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2**20
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+
+def request_source(request):
+    """(source, filename) of a request's script: inline 'script', or 'file' in python/."""
+    if 'script' in request:
+        return request['script'], '<request>'
+    name = os.path.basename(request['file'])
+    with open(os.path.join(HERE, name)) as f:
+        return f.read(), os.path.join(HERE, name)
+
+
+def call_module(name, params):
+    """(output, error) of an entry module's run(params): its JSON line, or the traceback and the
+    failure's message."""
+    if name not in MODULES:
+        return '', f"invalid request: unknown module {name!r}"
+    try:
+        module = importlib.import_module(name)
+        return module.dumps(module.run(params)), None
+    except Exception as e:
+        return traceback.format_exc(), f"{type(e).__name__}: {e}"
+
+
+def run_script(source, filename='<request>', stdin=''):
+    """Run source as __main__ with stdin / argv as a spawned script would see them.
+    Returns (output, error): everything printed, and None or the failure's message."""
+    captured = io.StringIO()
+    error = None
+    saved_stdin, saved_argv = sys.stdin, sys.argv
+    sys.stdin, sys.argv = io.StringIO(stdin), [filename]
+    try:
+        with contextlib.redirect_stdout(captured), contextlib.redirect_stderr(captured):
+            try:
+                exec(compile(source, filename, 'exec'), {'__name__': '__main__', '__file__': filename})
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    error = f"exit status {e.code}"
+            except BaseException as e:
+                if isinstance(e, KeyboardInterrupt):
+                    raise
+                traceback.print_exc()
+                error = f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdin, sys.argv = saved_stdin, saved_argv
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+    return captured.getvalue(), error
+
+
+class Worker:
+    def __init__(self, max_requests=MAX_REQUESTS, max_growth_mb=MAX_GROWTH_MB):
+        self.missing = preload()
+        self.baseline = rss_mb()
+        self.max_requests = max_requests
+        self.max_growth_mb = max_growth_mb
+        self.requests = 0
+
+    def handle(self, line):
+        """Response dict for one request line."""
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return dict(id=None, status='error', output='', error=f"invalid request: {e}")
+        response = dict(id=request.get('id'))
+        if request.get('op') == 'ping':
+            output, error = '', None
+            response['missing'] = self.missing
+        elif request.get('op') == 'ledger':
+            import drilldown
+            try:
+                output, error = json.dumps(drilldown.request(request), default=lambda o: o.item()), None
+            except (LookupError, ValueError, TypeError) as e:
+                output, error = '', str(e)
+        elif request.get('op') == 'call':
+            self.requests += 1
+            output, error = call_module(request.get('module'), request.get('params', {}))
+        elif 'calculator' in request:
+            self.requests += 1
+            try:
+                output = result_cache.run(request['calculator'], request.get('input', {}))
+                error = None if result_cache.json_line(output) else f"{request['calculator']} failed"
+            except ValueError as e:
+                output, error = '', f"invalid request: {e}"
+        else:
+            self.requests += 1
+            try:
+                source, filename = request_source(request)
+            except (KeyError, OSError) as e:
+                output, error = '', f"invalid request: {e}"
+            else:
+                output, error = run_script(source, filename, request.get('stdin', ''))
+        response.update(status='error' if error else 'ok', output=output, error=error,
+                        elapsed=round(time.perf_counter() - start, 6), rss_mb=round(rss_mb(), 1),
+                        requests=self.requests)
+        return response
+
+    def worn_out(self):
+        return self.requests >= self.max_requests or rss_mb() - self.baseline > self.max_growth_mb
+
+    def recycle(self):
+        """Replace this process with a fresh worker (same pid, pipes and arguments)."""
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+def serve_stdio(worker):
+    # responses go to a private copy of fd 1; fd 1 itself is pointed at stderr so output written
+    # below sys.stdout (extension modules, subprocesses) cannot corrupt the protocol
+    out = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        out.write(json.dumps(worker.handle(line)) + '\n')
+        out.flush()
+        if worker.worn_out():
+            os.dup2(out.fileno(), 1)
+            worker.recycle()
+
+
+def serve_socket(worker, path):
+    # one connection at a time, any number of requests per connection; run several workers on
+    # several sockets for a pool
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(8)
+    while True:
+        conn, _ = server.accept()
+        with conn, conn.makefile('rw', encoding='utf-8') as stream:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    stream.write(json.dumps(worker.handle(line)) + '\n')
+                    stream.flush()
+                except OSError:
+                    break
+                if worker.worn_out():
+                    break
+        if worker.worn_out():
+            server.close()
+            worker.recycle()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--socket', help='serve this Unix socket instead of stdin / stdout')
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS)
+    parser.add_argument('--max-growth-mb', type=float, default=MAX_GROWTH_MB)
+    args = parser.parse_args(argv)
+    worker = Worker(args.max_requests, args.max_growth_mb)
+    if args.socket:
+        serve_socket(worker, args.socket)
+    else:
+        serve_stdio(worker)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Break-even insurance-cost calibration over shared paths.
+
+The calculator scripts found the insurance cost c with payout(c) - c = 0 by calling
+utils.secant(insurance_deficit, ...). That re-ran single_mortgage for every iterate, up to 17
+times. It also failed with "No solution found" whenever the secant stepped past the cost at which
+the initial reinvestment is used up; past that point the deficit turns up and never crosses zero.
+
+Here the deficit is evaluated for a whole batch of candidate costs in one pass:
+single_mortgage takes a per-path insurance_cost, so K candidates run as K tiled copies of the
+same paths. Every candidate is a cost on a fixed grid (steps of eps/QUANTA) and the answer is the
+grid crossing: the first grid cost where the deficit is <= 0 with the one below it still positive.
+Any |deficit| <= eps would do, but a cost that depended on where the search started would make
+calculator outputs depend on calibration_cache.json, not just on their input JSON. Each batch is
+the grid pair around a secant prediction, so the pair that lands on the crossing also confirms it,
+plus the bracket's midpoint when the previous batch did not halve the bracket (the deficit can jump
+where paths' payouts switch on). No candidate goes past the cost that exhausts the reinvestment
+(upper).
+
+A warm start is the cached solution (and the deficit's slope there) for the nearest earlier inputs:
+the first batch is the grid pair around that cost, the second the pair one cached-slope step away,
+after which the search continues as a cold one from the costs seen. Measured with pyrainy's default
+inputs at 1000 paths, in simulation-equivalents (candidates evaluated): the same inputs again 2,
+a nearby cached run 4-7 (house_value +-20k, volatility 15 -> 14 or 16, cash_rate 3.85 -> 4.0),
+cold 6-8 (utils.secant: 5-17 full runs).
+
+    import calibration as cal
+    def insurance_deficit(costs):                       # costs: (K,) array -> (K,) deficits
+        paths, cost = cal.tile_paths(price_paths, costs)
+        end = single_mortgage(..., cost, ..., paths, ..., as_cube=True).at(loan_duration*4)
+        payout = (total_loan + end['InterestDeficit'] - end['Reinvestment'] - repay).clip(0, None)
+        return cal.candidate_means(payout, len(costs)) - costs
+    cost = cal.solve(insurance_deficit, 10000, 50000, 250, upper=cal.max_insurance_cost(...), key=inputs)
+"""
+import json
+import os
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(HERE, 'calibration_cache.json')
+CACHE_SIZE = 500          # most recent solutions kept
+NEARBY = 0.10             # max relative difference of any numeric input for a warm start
+QUANTA = 2                # grid steps per eps: |deficit| <= eps at the root while |slope| <= QUANTA
+
+_CACHE = None
+
+def tile_paths(price_paths, costs):
+    """price_paths repeated once per candidate cost, with the matching (K*paths,) cost array.
+    Path ids are renumbered so every copy stays distinct; the price arrays are shared, not copied."""
+    costs = np.asarray(costs, dtype=float)
+    n = len(price_paths)
+    tiled = [(k*n + i, S) for k in range(len(costs)) for i, (pathn, S) in enumerate(price_paths)]
+    return tiled, np.repeat(costs, n)
+
+def candidate_means(values, k):
+    """Per-candidate mean of a (K*paths,) end-of-term array from a tile_paths run."""
+    return np.asarray(values, dtype=float).reshape(k, -1).mean(axis=1)
+
+def max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin, cash_rate, loan_duration):
+    """Cost at which the initial reinvestment reaches zero: no break-even cost lies beyond it."""
+    return total_loan*reinvest_fraction*pow(1 + cash_rate, loan_duration)/insurance_profit_margin
+
+def _load_cache(path):
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = {}
+    if path not in _CACHE:
+        try:
+            with open(path) as f:
+                _CACHE[path] = json.load(f)
+        except (OSError, ValueError):
+            _CACHE[path] = []
+    return _CACHE[path]
+
+def _plain(key):
+    # numpy scalars (np.linspace / optimiser values) as plain Python numbers, for JSON and matching
+    return {k: v.item() if isinstance(v, np.generic) else v for k, v in key.items()}
+
+def _distance(key, other):
+    # None if the two parameter sets are not comparable, else the largest relative difference
+    if set(key) != set(other):
+        return None
+    worst = 0.0
+    for name, value in key.items():
+        v = other[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            if value != v:
+                return None
+        elif value != v:
+            worst = max(worst, abs(value - v)/max(abs(value), abs(v)))
+    return worst
+
+def warm_start(key, path=CACHE_FILE):
+    """{'cost', 'slope'} cached for the nearest earlier parameter set within NEARBY, or None.
+    slope (deficit per unit cost near that cost) is None when it was not measured."""
+    best, key = None, _plain(key)
+    for entry in _load_cache(path):
+        d = _distance(key, entry['key'])
+        if d is not None and d <= NEARBY and (best is None or d < best[0]):
+            best = (d, dict(cost=entry['cost'], slope=entry.get('slope')))
+    return None if best is None else best[1]
+
+def remember(key, cost, slope=None, path=CACHE_FILE):
+    """Record a solution for later warm starts (rewritten atomically; the cache is best effort)."""
+    key = _plain(key)
+    entries = _load_cache(path)
+    if any(e['key'] == key and e['cost'] == float(cost) for e in entries):
+        return                                          # already known: no rewrite per run
+    entries = [e for e in entries if e['key'] != key] + [dict(key=key, cost=float(cost), slope=slope)]
+    _CACHE[path] = entries = entries[-CACHE_SIZE:]
+    try:
+        tmp = f'{path}.{os.getpid()}'
+        with open(tmp, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _prediction(k, f, lo, hi, min_span):
+    # grid index of the secant root through the seen point nearest zero and the nearest other point
+    # at least min_span steps from it (adjacent grid values are too close for a stable slope), from
+    # the bracket's ends only, and kept inside (lo, hi], when there is one; 2 spans beyond the seen
+    # range when the deficit is not falling there
+    if lo is not None:
+        k, f = k[(k >= lo) & (k <= hi)], f[(k >= lo) & (k <= hi)]
+    near = int(np.argmin(np.abs(f)))
+    apart = np.flatnonzero(np.abs(k - k[near]) >= min_span)
+    if len(apart):
+        far = apart[np.argmin(np.abs(k[apart] - k[near]))]
+    else:
+        far = 0 if near == len(k) - 1 else len(k) - 1
+    span = k[-1] - k[0]
+    slope = (f[far] - f[near])/(k[far] - k[near]) if far != near else 0.0
+    if slope < 0:
+        r = k[near] - f[near]/slope
+    else:
+        r = k[-1] + 2*span if f[-1] > 0 else k[0] - 2*span
+    r = int(np.ceil(min(max(r, k[0] - 8*span), k[-1] + 8*span)))
+    if lo is not None:
+        r = min(max(r, lo + 1), hi)
+    return r
+
+def _slope(k, f, root, step, min_span):
+    # deficit per unit cost from the root to the nearest seen cost min_span or more steps away
+    apart = np.flatnonzero(np.abs(k - root) >= min_span)
+    if not len(apart):
+        return None
+    far = apart[np.argmin(np.abs(k[apart] - root))]
+    i = int(np.flatnonzero(k == root)[0])
+    return float((f[far] - f[i])/((k[far] - root)*step))
+
+def solve(deficits, x0, x1, eps, upper=None, key=None, max_passes=12, cache_path=CACHE_FILE):
+    """The break-even cost on the grid of eps/QUANTA steps: the first grid cost where the deficit is
+    <= 0 with the one below it still > 0. deficits maps a (K,) array of costs to (K,) values
+    (payout - cost, positive below the break-even cost). Every candidate is a grid cost: the first
+    batch is x0, x1 (secant's starting points), or the grid pair around the warm start; each further
+    batch is the grid pair around a secant prediction (and the bracket's midpoint when the last batch
+    did not halve it), so the batch that lands on the crossing is also the one that confirms it. Costs stay in [0, upper]. `key` (dict of the run's inputs) enables
+    the warm-start cache. Raises ValueError when no crossing is found, like utils.secant."""
+    step = eps/QUANTA
+    top = None if upper is None else int(np.floor(upper/step))
+    min_span = 2*QUANTA
+    clip = lambda ks: [int(min(max(j, 0), top if top is not None else j)) for j in ks]
+    cached = warm_start(key, cache_path) if key is not None else None
+    if cached is not None:
+        g = int(np.ceil(cached['cost']/step - 1e-9))
+        batch = [g - 1, g]
+    else:
+        batch = [int(round(x0/step)), int(round(x1/step))]
+    seen, width = {}, np.inf
+    for n in range(max_passes):
+        todo = sorted(set(clip(batch)) - set(seen))
+        if todo:
+            seen.update(zip(todo, np.asarray(deficits(np.array(todo)*step), dtype=float)))
+        k = np.array(sorted(seen)); f = np.array([seen[j] for j in k])
+        cross = np.flatnonzero((f[:-1] > 0) & (f[1:] <= 0))
+        if len(cross) and k[cross[0] + 1] - k[cross[0]] == 1:
+            root = int(k[cross[0] + 1])
+            break
+        if k[0] == 0 and f[0] <= 0:
+            root = 0
+            break
+        if not len(cross) and (not todo or top is not None and k[-1] >= top and f[-1] > 0):
+            # no crossing, and the deficit is still positive at upper or the secant has stalled on
+            # costs already seen (the deficit turns up before reaching zero)
+            raise ValueError(f"No solution found: the deficit does not cross zero in [{k[0]*step:,.0f}, {k[-1]*step:,.0f}]"
+                             f" (smallest |deficit| {np.abs(f).min():,.0f} > {eps:,.0f})")
+        if n == 0 and cached is not None:
+            # the warm pair missed: step by the cached slope (a nearby input's deficit per unit cost),
+            # or start over from the cold pair if there is none
+            if cached['slope'] is None or cached['slope'] >= 0:
+                batch = [int(round(x0/step)), int(round(x1/step))]
+                continue
+            r = int(np.ceil(g - f[-1]/(cached['slope']*step)))
+        else:
+            lo, hi = (int(k[cross[0]]), int(k[cross[0] + 1])) if len(cross) else (None, None)
+            r = _prediction(k, f, lo, hi, min_span)
+            if lo is not None and 2*(hi - lo) > width:
+                # the last batch did not halve the bracket (the deficit jumps where a path's payout
+                # switches on, and a secant across the jump only shaves one end): add its midpoint
+                batch = [r - 1, r, (lo + hi + 1)//2]
+                width = hi - lo
+                continue
+            width = np.inf if lo is None else hi - lo
+        batch = [r - 1, r]
+    else:
+        raise ValueError(f"No solution found: no grid crossing after {max_passes} batches")
+    if key is not None:
+        remember(key, root*step, _slope(k, f, root, step, min_span), cache_path)
+    return root*step
@@ -0,0 +1,105 @@
+"""
+Chart-ready aggregates of simulated paths.
+
+The calculators used to ship every path of every series to the browser (pyrainy's mc_prices, the
+Monte Carlo script's all_paths_chart_data, all_sp500_paths, ...: paths x periods each), which the
+charts then thinned or averaged client-side. Charts need far less, so here a (paths, periods)
+matrix becomes
+
+    bands      per-period percentile fan (p5 ... p95) and mean
+    paths      a few representative paths: those ending at given quantiles of the final period
+    histogram  pre-binned terminal values
+
+each series holding at most max_points points. Bands share the x positions LTTB (largest
+triangle three buckets) picks on the median; each representative path is downsampled on its own,
+so spikes and turning points survive where uniform striding would drop them.
+
+    import chart_data
+    charts = chart_data.aggregate({'sp500': prices, 'reinvestment': reinvest}, terminal=final_values,
+                                  max_points=200)
+    charts['series']['sp500'] -> {'x': [...], 'bands': {'p5': [...], ..., 'mean': [...]},
+                                  'paths': [{'quantile': 0.05, 'path': 17, 'x': [...], 'y': [...]}, ...]}
+    charts['histogram'] -> {'edges': [...], 'counts': [...]}
+"""
+import numpy as np
+
+MAX_POINTS = 200
+PERCENTILES = (5, 25, 50, 75, 95)
+PATH_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+BINS = 30
+
+
+def lttb(x, y, n):
+    """Indices of at most n points of (x, y) chosen by largest-triangle-three-buckets; the first
+    and last points are always kept."""
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1][:max(n, 1)])
+    x, y = np.asarray(x, float), np.asarray(y, float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)     # n-2 buckets between the end points
+    chosen = [0]
+    for b in range(n - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nxt = slice(hi, edges[b + 2]) if b + 2 < len(edges) else slice(size - 1, size)
+        ax, ay = x[chosen[-1]], y[chosen[-1]]
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((ax - cx)*(y[lo:hi] - ay) - (ax - x[lo:hi])*(cy - ay))
+        chosen.append(lo + int(np.argmax(area)))
+    chosen.append(size - 1)
+    return np.asarray(chosen)
+
+
+def fan_bands(matrix, percentiles=PERCENTILES):
+    """{'p5': (periods,), ..., 'mean': (periods,)} of a (paths, periods) matrix."""
+    matrix = np.asarray(matrix, float)
+    bands = dict(zip((f'p{p:g}' for p in percentiles), np.percentile(matrix, percentiles, axis=0)))
+    bands['mean'] = matrix.mean(axis=0)
+    return bands
+
+
+def representative_paths(matrix, quantiles=PATH_QUANTILES):
+    """Row of the path at each quantile of the final period, ranked as PathCube.percentile_path."""
+    final = np.asarray(matrix)[:, -1]
+    order = np.argsort(final, kind='stable')
+    return [int(order[round(q*(len(final) - 1))]) for q in quantiles]
+
+
+def histogram(values, bins=BINS, edges=None):
+    """{'edges', 'counts'} of values (non-finite values dropped). Explicit edges (which may be +-inf,
+    output as None) count each bin as (lo, hi]; otherwise bins equal-width bins as np.histogram."""
+    values = np.asarray(values, float)
+    values = values[np.isfinite(values)]
+    if edges is not None:
+        edges = np.asarray(edges, float)
+        counts = np.diff(np.searchsorted(np.sort(values), edges, side='right'))
+    else:
+        counts, edges = np.histogram(values, bins)
+    return dict(edges=[None if np.isinf(e) else float(e) for e in edges], counts=counts.tolist())
+
+
+def series(matrix, x=None, max_points=MAX_POINTS, percentiles=PERCENTILES, quantiles=PATH_QUANTILES):
+    """Fan bands and representative paths of one (paths, periods) matrix, max_points each."""
+    matrix = np.asarray(matrix, float)
+    if matrix.ndim != 2 or matrix.size == 0:
+        return dict(x=[], bands={}, paths=[])
+    x = np.arange(matrix.shape[1]) if x is None else np.asarray(x)
+    bands = fan_bands(matrix, percentiles)
+    keep = lttb(x, bands[f'p{percentiles[len(percentiles)//2]:g}'], max_points)
+    paths = []
+    for q, row in zip(quantiles, representative_paths(matrix, quantiles)):
+        pick = lttb(x, matrix[row], max_points)
+        paths.append(dict(quantile=q, path=row, x=x[pick].tolist(), y=matrix[row, pick].tolist()))
+    return dict(x=x[keep].tolist(), bands={k: v[keep].tolist() for k, v in bands.items()}, paths=paths)
+
+
+def aggregate(matrices, terminal=None, x=None, max_points=MAX_POINTS, bins=BINS, percentiles=PERCENTILES,
+              quantiles=PATH_QUANTILES):
+    """{'max_points', 'series': {name: series(...)}, 'histogram'} for {name: (paths, periods)} and
+    the terminal values (when given)."""
+    charts = dict(max_points=max_points,
+                  series={name: series(m, x, max_points, percentiles, quantiles) for name, m in matrices.items()})
+    if terminal is not None:
+        charts['histogram'] = histogram(terminal, bins)
+    return charts
@@ -0,0 +1,83 @@
+"""
+Typed columnar side channel for large calculator outputs.
+
+The Monte Carlo script printed every path of every chart series as JSON floats (all_sp500_paths,
+all_loan_paths, ... : paths x periods each), several MB per request that Python formats digit by
+digit and Ruby parses back the same way. Here those arrays go to one binary file of raw
+little-endian columns, and the JSON output carries only a small manifest describing them:
+
+    {"columnar": {"format": "columnar-v1", "path": "/tmp/mc_1234.bin",
+                  "columns": [{"name": "all_sp500_paths", "dtype": "float32", "shape": [1000, 121],
+                               "offset": 0, "nbytes": 131072, "codec": "zlib"}, ...]}}
+
+Columns are C-ordered and start 8-byte aligned; each is deflated (zlib level 1) unless
+compress=False. float32=True halves float columns (7 significant digits, plenty for charts) and
+stores integer columns that fit as int32. A reader needs only zlib and unpacking: Ruby's
+ColumnarResult uses Zlib::Inflate and String#unpack ("e*", "E*", "l<*", "q<*"). Arrow IPC or
+NPZ would need pyarrow or a zip reader on the Rails side, and the app has neither.
+
+    import columnar
+    output = columnar.detach(output, ['all_sp500_paths', ...], '/tmp/mc_1234.bin', float32=True)
+    arrays = columnar.read(output['columnar'])           # {name: ndarray}, e.g. in tests
+"""
+import os
+import zlib
+import numpy as np
+
+FORMAT = 'columnar-v1'
+DTYPES = {'float32': '<f4', 'float64': '<f8', 'int32': '<i4', 'int64': '<i8'}
+ALIGN = 8
+
+
+def _column(value, float32):
+    a = np.asarray(value)
+    if a.dtype.kind in 'iub':
+        small = float32 and (a.size == 0 or (a.min() >= -2**31 and a.max() < 2**31))
+        return a.astype('<i4' if small else '<i8')
+    return a.astype('<f4' if float32 else '<f8')
+
+
+def write(path, arrays, float32=False, compress=True):
+    """Write {name: array-like} as columns to path (atomically); returns the manifest.
+    compress=True deflates each column (zlib level 1: chart series shrink ~3-4x for ~10ms/MB)."""
+    columns = []
+    offset = 0
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        for name, value in arrays.items():
+            a = np.ascontiguousarray(_column(value, float32))
+            dtype = next(k for k, v in DTYPES.items() if np.dtype(v) == a.dtype)
+            pad = -offset % ALIGN
+            f.write(b'\0'*pad)
+            offset += pad
+            data = zlib.compress(a.tobytes(), 1) if compress else a.tobytes()
+            f.write(data)
+            columns.append(dict(name=name, dtype=dtype, shape=list(a.shape), offset=offset, nbytes=len(data),
+                                codec='zlib' if compress else None))
+            offset += len(data)
+    os.replace(tmp, path)
+    return dict(format=FORMAT, path=path, columns=columns)
+
+
+def detach(output, names, path, float32=False, compress=True):
+    """output with the named entries moved to a columnar file at path and replaced by its
+    manifest under 'columnar'. Entries must be rectangular (equal-length rows)."""
+    arrays = {name: output[name] for name in names if name in output}
+    rest = {k: v for k, v in output.items() if k not in arrays}
+    rest['columnar'] = write(path, arrays, float32, compress)
+    return rest
+
+
+def read(manifest):
+    """{name: ndarray} of a manifest's columns."""
+    if manifest.get('format') != FORMAT:
+        raise ValueError(f"unknown columnar format {manifest.get('format')!r}")
+    with open(manifest['path'], 'rb') as f:
+        data = f.read()
+    arrays = {}
+    for c in manifest['columns']:
+        raw = data[c['offset']:c['offset'] + c['nbytes']]
+        if c.get('codec') == 'zlib':
+            raw = zlib.decompress(raw)
+        arrays[c['name']] = np.frombuffer(raw, DTYPES[c['dtype']]).reshape(c['shape'])
+    return arrays
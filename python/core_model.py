@@ -2,16 +2,40 @@ import pandas as pd
 import math
 from statistics import geometric_mean
 import numpy as np
-import numpy_financial as npf
 from utils import mean_sd, dollar, pcntdf, pcnt, secant
 
 
-def gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths, S0):
+# Seeded path streams: paths are drawn in blocks of PATH_BLOCK, each block from its own child of
+# the user seed (SeedSequence(seed).spawn(...)[block]), so any split of the paths into chunks or
+# workers draws exactly the same numbers. seed=None keeps the legacy global np.random stream.
+PATH_BLOCK = 256
+
+
+def path_normals(seed, first_path, total_paths, n):
+  """(total_paths, n) standard normals of paths first_path.. in the seed's block streams."""
+  out = np.empty((total_paths, n))
+  last = first_path + total_paths
+  for block in range(first_path // PATH_BLOCK, -(-last // PATH_BLOCK)):
+    lo = block * PATH_BLOCK
+    a, b = max(lo, first_path), min(lo + PATH_BLOCK, last)
+    rng = np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key = (block,))))
+    # rows are drawn in path order, so the block's first b-lo rows don't depend on where it ends
+    out[a - first_path:b - first_path] = rng.standard_normal(size = (b - lo, n))[a - lo:]
+  return out
+
+
+def gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths, S0, seed = None, first_path = 0):
   dt = 1.0/120
   N = round(loan_duration/dt)
   price_paths = []
 
-  for pathn in range(0,total_paths):
+  if seed is not None:
+    ts = np.linspace(0, loan_duration, N)
+    W = np.cumsum(path_normals(seed, first_path, total_paths, N), axis = 1)*np.sqrt(dt)
+    S = S0*np.exp((equity_return-0.5*volatility**2)*ts + volatility*W)
+    return [(first_path + i, S[i]) for i in range(total_paths)]
+
+  for pathn in range(first_path, first_path + total_paths):
     # https://stackoverflow.com/a/13203189
     ts = np.linspace(0, loan_duration, N)
     W = np.random.standard_normal(size = N)
@@ -22,7 +46,92 @@ def gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths,
   return price_paths
 
 
-def single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+# single_mortgage reads one price per quarter: paths that hold only those prices are consumed
+# with dt=OBSERVATION_DT (price_indices then step through them one by one)
+OBSERVATION_DT = 0.25
+
+
+def observation_schedule(loan_duration, dt = 1.0/120):
+  """Fine-grid indices of the prices single_mortgage reads from paths generated at step `dt`."""
+  total_periods = int(4 * loan_duration + 1)
+  return (np.arange(1, total_periods) * (1.0/(dt*4)) - 1).astype(int)
+
+
+def gen_observation_paths(loan_duration, equity_return, volatility, total_paths, S0,
+                          schedule = None, exact = False, grid_dt = 1.0/120, seed = None, first_path = 0):
+  # Simulates only the observation dates (default: the quarterly schedule single_mortgage reads
+  # from a gen_monte_carlo_paths grid); pass dt=OBSERVATION_DT to single_mortgage.
+  #   exact=False  exact GBM sampled straight on the observation times: same distribution,
+  #                one normal per observation instead of 30
+  #   exact=True   draws the same fine-grid increments as gen_monte_carlo_paths (same RNG
+  #                stream) and keeps only the observed prices, equal to indexing its paths up to
+  #                rounding: the increments are summed per observation interval, PATH_BLOCK paths
+  #                at a time, so no (total_paths, N) grid is held
+  # seed / first_path: paths first_path.. of the seeded block streams (see path_normals)
+  if schedule is None:
+    schedule = observation_schedule(loan_duration, grid_dt)
+  schedule = np.asarray(schedule)
+  if exact:
+    N = round(loan_duration/grid_dt)
+    ts = np.linspace(0, loan_duration, N)[schedule]
+    starts = np.r_[0, schedule[:-1] + 1]               # observation j adds fine steps starts[j]..schedule[j]
+    W = np.empty((total_paths, len(schedule)))
+    for a in range(0, total_paths, PATH_BLOCK):
+      b = min(a + PATH_BLOCK, total_paths)
+      Z = np.random.standard_normal(size = (b - a, N)) if seed is None else \
+          path_normals(seed, first_path + a, b - a, N)
+      W[a:b] = np.add.reduceat(Z[:, :schedule[-1] + 1], starts, axis = 1)
+    np.cumsum(W, axis = 1, out = W)
+    W *= np.sqrt(grid_dt)
+  else:
+    ts = (schedule + 1)*grid_dt                       # index i closes the (i+1)-th fine step
+    steps = np.diff(ts, prepend = 0.0)
+    Z = np.random.standard_normal(size = (total_paths, len(ts))) if seed is None else \
+        path_normals(seed, first_path, total_paths, len(ts))
+    W = np.cumsum(Z*np.sqrt(steps), axis = 1)
+  S = S0*np.exp((equity_return-0.5*volatility**2)*ts + volatility*W)
+  return [(first_path + i, S[i]) for i in range(total_paths)]
+
+
+COLUMNS = ["Path", "Period","Year", "Quarter", "SP500", "Interest", "Loan size",
+           "Units", "Reinvestment", "InterestDeficit","CapitalDeficit", "Surplus",
+           "Prob Holiday", "FunderEarned",
+           "AnnuityIncome", "HolidayQuarters", "Prob Subperform", "InterestPaid", "InterestPaidToFunder", 
+           "InterestRate", "UnitsSold", "CumUnitsSold", "InterestDeficitDelta", "UnitsToPool", "CumUnitsToPool","CumInterestPaid", "UnitsToPrincipal", "TotalUnitsSold","HedgeUnitsDelta"]
+FLOAT_COLUMNS = ["SP500", "Units", "InterestDeficit", "FunderEarned", "AnnuityIncome", "InterestPaid",
+                 "InterestPaidToFunder", "InterestRate", "UnitsSold", "CumUnitsSold", "InterestDeficitDelta",
+                 "UnitsToPool", "CumUnitsToPool", "CumInterestPaid", "UnitsToPrincipal", "TotalUnitsSold",
+                 "HedgeUnitsDelta"]
+# money columns reported in whole dollars, and the remaining integer / flag columns
+ROUNDED_COLUMNS = ["Interest", "Loan size", "Reinvestment", "CapitalDeficit", "Surplus"]
+INT_COLUMNS = ["Path", "Period", "Year", "Quarter", "HolidayQuarters"]
+BOOL_COLUMNS = ["Prob Holiday", "Prob Subperform"]
+
+
+def frame_from_columns(columns, round_output = True):
+  """Typed DataFrame from a float64 (len(COLUMNS), rows) buffer in COLUMNS order. Float columns are
+  views of the buffer; integer/flag columns are cast and money columns rounded, one pass each."""
+  data = {}
+  for name, values in zip(COLUMNS, columns):
+    if name in ROUNDED_COLUMNS and round_output:
+      values = np.round(values).astype(np.int64)
+    elif name in INT_COLUMNS:
+      values = values.astype(np.int64)
+    elif name in BOOL_COLUMNS:
+      values = values.astype(bool)
+    data[name] = values
+  return pd.DataFrame(data, columns=COLUMNS, copy=False)
+
+
+def round_columns(df):
+  """Whole-dollar presentation of a round_output=False frame: one vectorised pass per money column."""
+  out = df.copy(deep=False)
+  for name in ROUNDED_COLUMNS:
+    out[name] = np.round(df[name].to_numpy()).astype(np.int64)
+  return out
+
+
+def single_mortgage_scalar(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                     insurance_profit_margin,insurance_cost,
                     cash_rate_series,wholesale_lending_margin,additional_loan_margins,
                     holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
@@ -39,7 +148,8 @@ def single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income,
   
   expected_reinvestment = None
   if expected_reinvestment_ratio is not None:
-    expected_reinvestment = expected_reinvestment_ratio * initial_reinvestment
+    # (periods,) or, when insurance_cost is a per-path array, (periods, paths)
+    expected_reinvestment = np.multiply.outer(expected_reinvestment_ratio, initial_reinvestment)
   
   holiday_enter = initial_reinvestment* holiday_enter_fraction
   holiday_exit = initial_reinvestment*holiday_exit_fraction
@@ -230,43 +340,276 @@ def single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income,
     # Append the completed path data
     all_data.extend(data.tolist())
       
-  return pd.DataFrame(all_data, columns=["Path", "Period","Year", "Quarter", "SP500", "Interest", "Loan size",
-                                     "Units", "Reinvestment", "InterestDeficit","CapitalDeficit", "Surplus",
-                                     "Prob Holiday", "FunderEarned",
-                                     "AnnuityIncome", "HolidayQuarters", "Prob Subperform", "InterestPaid", "InterestPaidToFunder", 
-                                     "InterestRate", "UnitsSold", "CumUnitsSold", "InterestDeficitDelta", "UnitsToPool", "CumUnitsToPool","CumInterestPaid", "UnitsToPrincipal", "TotalUnitsSold","HedgeUnitsDelta"])
+  return pd.DataFrame(all_data, columns=COLUMNS)
+
+def single_mortgage_vectorized(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+                    insurance_profit_margin,insurance_cost,
+                    cash_rate_series,wholesale_lending_margin,additional_loan_margins,
+                    holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
+                    price_paths, S0, dt, year_offset=0, max_superpay_factor = 1.0, 
+                    superpay_start_factor = 1.0, enable_pool = False, insured_units = 0, 
+                    expected_reinvestment_ratio = None, piProgressiveRepayment = False, hedged = False, 
+                    hedging_max_loss = 0, hedging_cap = 1000, hedging_cost_pa=0, round_output = True,
+                    as_cube = False):
+  # Same model as single_mortgage_scalar, stepping over quarters only: per-path state lives in
+  # (paths,) arrays and every branch is a mask. Each value is computed with the same operations in
+  # the same order as the scalar loop, so the frame is identical for the same price_paths.
+  # as_cube=True returns the same values as a PathCube of (paths, periods) arrays, skipping the frame.
+  # insurance_cost may be a (paths,) array: one candidate cost per path, so a batch of costs runs as
+  # one pass over tiled paths (calibration.py).
+  is_cash_rate_list = isinstance(cash_rate_series, list)
+  avg_cash_rate = geometric_mean(cash_rate_series) if is_cash_rate_list else cash_rate_series
+  initial_reinvestment = total_loan*reinvest_fraction - \
+     insurance_profit_margin* insurance_cost/ pow(1 + avg_cash_rate, loan_duration)
+
+  expected_reinvestment = None
+  if expected_reinvestment_ratio is not None:
+    # (periods,) or, when insurance_cost is a per-path array, (periods, paths)
+    expected_reinvestment = np.multiply.outer(expected_reinvestment_ratio, initial_reinvestment)
+
+  holiday_enter = initial_reinvestment* holiday_enter_fraction
+  holiday_exit = initial_reinvestment*holiday_exit_fraction
+
+  quarter_div = 0.25
+  dt_quarter_inv = 1.0/(dt*4)
+  annual_income_quarter = annual_income * quarter_div
+  annuity_duration_quarters = int(annuity_duration * 4)
+  total_periods = int(4 * loan_duration + 1)
+
+  path_ids = np.array([pathn for (pathn, S) in price_paths], dtype=np.int64)
+  n = len(path_ids)
+  price_indices = (np.arange(1, total_periods) * dt_quarter_inv - 1).astype(int)
+  # (periods-1, paths): one contiguous row of prices per quarter
+  prices = np.array([S[price_indices] for (pathn, S) in price_paths]).reshape(n, total_periods-1).T.copy()
+  if is_cash_rate_list:
+    cash_rates = np.array([cash_rate_series[idx] for idx in price_indices])
+  else:
+    cash_rates = np.full(total_periods-1, cash_rate_series)
+  loan_interest_rates = cash_rates + wholesale_lending_margin + additional_loan_margins
+
+  # every float column lives in one (columns, paths, periods) block that becomes the frame's
+  # float storage without a copy; the loop fills one period column of each per quarter
+  block = np.zeros((len(FLOAT_COLUMNS), n, total_periods))
+  (sp500, units, deficit, funder_col, annuity_col, paid_col, paid_funder_col, rate_col, sold_col,
+   cum_sold_col, delta_col, pool_col, cum_pool_col, cum_paid_col, principal_col, total_sold,
+   hedge_col) = block
+  holiday_col = np.zeros((n, total_periods), dtype=bool)
+  hq_col = np.zeros((n, total_periods), dtype=np.int64)
+  loan_sizes = np.zeros(total_periods)
+  annuities = np.zeros(total_periods)
+  interest_dues = np.zeros(total_periods)
+
+  holdings = np.full(n, initial_reinvestment / S0)
+  init_units_to_principal = 0.0
+  loan_size = total_loan * reinvest_fraction + annual_income_quarter
+  if piProgressiveRepayment:
+    init_units_to_principal = annual_income_quarter / S0
+    loan_size -= annual_income_quarter
+    holdings -= init_units_to_principal
+
+  in_holiday = np.full(n, holiday_enter_fraction > 1)
+  holiday_quarters = np.zeros(n, dtype=np.int64)
+  deferred = np.zeros(n)
+  zeros = np.zeros(n)
+
+  sp500[:, 0] = S0
+  units[:, 0] = holdings
+  loan_sizes[0] = loan_size
+  holiday_col[:, 0] = in_holiday
+  annuities[0] = annual_income_quarter
+  principal_col[:, 0] = init_units_to_principal
+
+  last_yearly_hedge_price = np.full(n, float(S0))
+  last_5yearly_hedge_price = np.full(n, float(S0))
+
+  for t in range(1, total_periods):
+    s = prices[t-1]
+    cash_rate = cash_rates[t-1]
+    loan_interest_rate = loan_interest_rates[t-1]
+    interest_due = loan_size * loan_interest_rate * quarter_div
+    funder_due = loan_size * (wholesale_lending_margin + cash_rate) * quarter_div
+
+    interest_due_per_share = interest_due / s
+    holdings_value = holdings * s
+
+    # the four holiday transitions; a pooled path (holdings at or below the insured units) has
+    # its interest met from the pool instead of selling or deferring
+    exiting = in_holiday & (holdings_value > holiday_exit)
+    entering = ~in_holiday & (holdings_value < holiday_enter)
+    paying = ~in_holiday & ~entering
+    pays = exiting | paying
+    defer = in_holiday ^ exiting | entering
+    if enable_pool:
+      pooled = holdings <= insured_units
+      units_to_pool = np.where(pooled, -interest_due_per_share, 0.0)
+      sell = pays & ~pooled
+      defer &= ~pooled
+    else:
+      units_to_pool = zeros
+      sell = pays
+
+    units_sold_now = np.where(sell, interest_due_per_share, 0.0)
+    holdings = holdings - units_sold_now
+    deferred_delta = np.where(defer, interest_due, 0.0)
+    deferred = deferred + deferred_delta
+    holiday_quarters = np.where(pays, 0, holiday_quarters + defer)
+    interest_paid = np.where(pays, interest_due, 0.0)
+    interest_paid_to_funder = np.where(pays, funder_due, 0.0)
+    in_holiday = in_holiday & ~exiting | entering & defer
+
+    superpay = paying & (holdings_value > holiday_exit * superpay_start_factor) & (deferred > 0) & (holdings > insured_units)
+    if superpay.any():
+      surplus_pay = np.minimum(max_superpay_factor * interest_due, deferred[superpay])
+      surplus_pay_per_share = surplus_pay / s[superpay]
+      holdings[superpay] -= surplus_pay_per_share
+      deferred[superpay] -= surplus_pay
+      deferred_delta[superpay] -= surplus_pay
+      units_sold_now[superpay] += surplus_pay_per_share
+      interest_paid[superpay] += surplus_pay
+      interest_paid_to_funder[superpay] += surplus_pay * (wholesale_lending_margin + cash_rate) / loan_interest_rate
+
+    if enable_pool and expected_reinvestment is not None:
+      expected = np.broadcast_to(expected_reinvestment[t], (n,))
+      excess = ~in_holiday & (deferred < 1) & (holdings_value > expected) & (holdings > insured_units)
+      if excess.any():
+        excess_units = (holdings_value[excess] - expected[excess]) / s[excess]
+        holdings[excess] -= excess_units
+        units_to_pool = units_to_pool.copy()
+        units_to_pool[excess] = excess_units
+
+    if hedged and t & 3 == 0:
+      holdings = holdings - holdings * hedging_cost_pa
+      year_move = (s - last_yearly_hedge_price) / last_yearly_hedge_price
+      buy = year_move < -hedging_max_loss
+      buy_units = ((last_yearly_hedge_price[buy] / s[buy]) * (1 - hedging_max_loss) - 1) * holdings[buy]
+      hedge_col[buy, t] = buy_units
+      holdings[buy] += buy_units
+      last_yearly_hedge_price = s
+    if hedged and t % 20 == 0:
+      adj_holds = holdings * (last_5yearly_hedge_price / s) * (1 + hedging_cap * 5)
+      cap = holdings > adj_holds
+      sell_units = holdings[cap] - adj_holds[cap]
+      hedge_col[cap, t] -= sell_units
+      holdings[cap] -= sell_units
+      last_5yearly_hedge_price = s
+
+    sp500[:, t] = s
+    units[:, t] = holdings
+    deficit[:, t] = deferred
+    holiday_col[:, t] = in_holiday
+    hq_col[:, t] = holiday_quarters
+    paid_col[:, t] = interest_paid
+    paid_funder_col[:, t] = interest_paid_to_funder
+    sold_col[:, t] = units_sold_now
+    delta_col[:, t] = deferred_delta
+    pool_col[:, t] = units_to_pool
+    interest_dues[t] = interest_due
+    loan_sizes[t] = loan_size
+
+    if t < annuity_duration_quarters:
+      annuities[t] = annual_income_quarter
+      if piProgressiveRepayment:
+        units_to_principal = annual_income_quarter / s
+        principal_col[:, t] = units_to_principal
+        holdings = holdings - units_to_principal
+      else:
+        loan_size += annual_income_quarter
+
+  # derived columns in one pass each, with the scalar loop's operation order
+  # running totals: cumsum adds period by period from the opening 0, exactly as the scalar loop
+  np.cumsum(pool_col, axis=1, out=cum_pool_col)
+  np.cumsum(paid_funder_col, axis=1, out=funder_col)
+  np.cumsum(sold_col, axis=1, out=cum_sold_col)
+  np.cumsum(paid_col, axis=1, out=cum_paid_col)
+  annuity_col[:] = annuities
+  rate_col[:, 1:] = loan_interest_rates
+  np.add(sold_col, principal_col, out=total_sold)
+  total_sold[:, 0] = 0                                  # the opening row reports no units sold
+  reinvestment = units * sp500
+  capital_deficit = np.maximum(loan_sizes - reinvestment, 0)
+  surplus = reinvestment - loan_sizes - deficit + cum_pool_col * sp500
+  loan_shown = loan_sizes.copy()
+  loan_shown[0] = total_loan * reinvest_fraction        # opening row shows the loan before Y1 income
+  # round_output=False keeps the money columns as raw float64 (round_columns() rounds them later)
+  money = (lambda a: np.round(a).astype(np.int64)) if round_output else (lambda a: a)
+
+  periods = np.arange(total_periods, dtype=np.int64)
+  years = np.where(periods > 0, ((periods - 1) >> 2) + 1, 0) + year_offset
+  quarters = np.where(periods > 0, periods - ((periods - 1) >> 2) * 4, 0)
+  if as_cube:
+    from path_cube import PathCube
+    per_period = lambda a: np.broadcast_to(a, (n, total_periods))
+    fields = dict(zip(FLOAT_COLUMNS, block))
+    fields.update({
+      "Period": per_period(periods), "Year": per_period(years), "Quarter": per_period(quarters),
+      "Interest": per_period(money(interest_dues)), "Loan size": per_period(money(loan_shown)),
+      "Reinvestment": money(reinvestment), "CapitalDeficit": money(capital_deficit), "Surplus": money(surplus),
+      "Prob Holiday": holiday_col, "HolidayQuarters": hq_col,
+      "Prob Subperform": hq_col >= subperform_loan_threshold_quarters})
+    return PathCube({name: fields[name] for name in COLUMNS if name != "Path"}, path_ids)
+  per_period = lambda a: np.tile(a, n)
+  df = pd.DataFrame(block.reshape(len(FLOAT_COLUMNS), -1).T, columns=FLOAT_COLUMNS, copy=False)
+  other = {
+    "Path": np.repeat(path_ids, total_periods), "Period": per_period(periods),
+    "Year": per_period(years), "Quarter": per_period(quarters),
+    "Interest": per_period(money(interest_dues)), "Loan size": per_period(money(loan_shown)),
+    "Reinvestment": money(reinvestment).ravel(), "CapitalDeficit": money(capital_deficit).ravel(),
+    "Surplus": money(surplus).ravel(),
+    "Prob Holiday": holiday_col.ravel(), "HolidayQuarters": hq_col.ravel(),
+    "Prob Subperform": (hq_col >= subperform_loan_threshold_quarters).ravel()}
+  for i, name in enumerate(COLUMNS):
+    if name in other:
+      df.insert(i, name, other[name])
+  return df
+
+# the vectorised engine is the default; the scalar loop stays as the reference implementation
+single_mortgage = single_mortgage_vectorized
+
+def lender_profit(dfend, total_loan, lender_profit_share = 0.5):
+  """Funder's end-of-term profit share per path, from final-period values (PathCube.at)."""
+  lender_pool_profit = (dfend["CumUnitsToPool"].clip(0, None)*lender_profit_share) * dfend['SP500']
+  return (lender_profit_share*(dfend["Reinvestment"] - total_loan - dfend['InterestDeficit']) + lender_pool_profit).clip(0, None)
+
+
+def funder_cashflows(cube, total_loan, reinvest_fraction, annual_income, loan_duration):
+  """(paths, periods) funder cashflows of each path: the per-path form of main_outputs_table's
+  mean cashflow vector (npcf). irr.batch_irr of it gives the per-path funder IRR distribution."""
+  dfend = cube.at(loan_duration*4)
+  flows = cube['InterestPaidToFunder'] - cube['AnnuityIncome']
+  flows[:, 0] -= total_loan * reinvest_fraction + annual_income/4 # initial loan
+  flows[:, -1] += lender_profit(dfend, total_loan) + total_loan + dfend['InterestDeficit']
+  return flows
+
 
 def main_outputs_table(df,total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                     insurance_profit_margin,insurance_cost, total_paths, loan_type, cash_rate, 
                     at_risk_captital_fraction,house_value, final_home_value, hedged=False):
-  dfend = df[df['Period']==loan_duration*4]
+  # df is a single_mortgage frame, a PathCube or a PathSummary (final-period values, per-path totals
+  # and per-period means are all it reads)
+  from path_cube import PathCube, PathSummary
+  cube = df if isinstance(df, (PathCube, PathSummary)) else PathCube.from_frame(df)
+  dfend = cube.at(loan_duration*4)
   borrower_profit_share = 0.3
   lender_profit_share = 0.5
   at_risk_capital = (final_home_value- house_value)*at_risk_captital_fraction
 
-
-  worse_pathn = dfend.sort_values('SP500').iloc[round(0.02*total_paths)]['Path']
-  bad_pathn = dfend.sort_values('SP500').iloc[round(0.25*total_paths)]['Path']
-  good_pathn = dfend.sort_values('SP500').iloc[round(0.75*total_paths)]['Path']
-  median_pathn = dfend.sort_values('SP500').iloc[round(0.50*total_paths)]['Path']
-  worse_end_ix = df[(df['Path']==worse_pathn) & (df['Period']==loan_duration*4)].index[0]
-  bad_end_ix = df[(df['Path']==bad_pathn) & (df['Period']==loan_duration*4)].index[0]
-  good_end_ix = df[(df['Path']==good_pathn) & (df['Period']==loan_duration*4)].index[0]
-  median_end_ix = df[(df['Path']==median_pathn) & (df['Period']==loan_duration*4)].index[0]
+  # cube rows of the paths at the 2/25/50/75% ranks of the final index level
+  worse_end_ix, bad_end_ix, median_end_ix, good_end_ix = [
+    cube.path_index(cube.rank_path('SP500', round(q*total_paths), loan_duration*4)) for q in (0.02, 0.25, 0.50, 0.75)]
 
   scheme_profit = (dfend['Reinvestment'] - total_loan - dfend['InterestDeficit'] ).clip(0,None)
   scheme_profit_to_borrower = scheme_profit*borrower_profit_share
   repay_hybrid = (annuity_duration*annual_income - scheme_profit_to_borrower).clip(0,None) if loan_type == "Hybrid" else 0.0
-  repayment_amount =  dfend['Reinvestment'].map(lambda x: annuity_duration*annual_income) \
+  repayment_amount =  np.full(cube.n_paths, annuity_duration*annual_income) \
       if loan_type == "Interest only" \
       else repay_hybrid if loan_type == "Hybrid" \
-      else dfend['Reinvestment'].map(lambda x: 0.0)
+      else np.zeros(cube.n_paths)
 
   def mean_dollar(dfv):
-    worse_v = dfv.loc[worse_end_ix]
-    bad_v = dfv.loc[bad_end_ix]
-    good_v = dfv.loc[good_end_ix]
-    median_v = dfv.loc[median_end_ix]
+    worse_v = dfv[worse_end_ix]
+    bad_v = dfv[bad_end_ix]
+    good_v = dfv[good_end_ix]
+    median_v = dfv[median_end_ix]
     return [f'${round(dfv.mean()):,}',
             #f'${round(dfv.quantile(0.25)):,}-${round(dfv.quantile(0.75)):,}',
             f'${round(worse_v):,}',
@@ -274,37 +617,37 @@ def main_outputs_table(df,total_loan, reinvest_fraction, loan_duration, annual_i
             f'${round(median_v):,}',
             f'${round(good_v):,}', ]
   def mean_units(dfv):
-    worse_v = dfv.loc[worse_end_ix]
-    bad_v = dfv.loc[bad_end_ix]
-    good_v = dfv.loc[good_end_ix]
-    median_v = dfv.loc[median_end_ix]
+    worse_v = dfv[worse_end_ix]
+    bad_v = dfv[bad_end_ix]
+    good_v = dfv[good_end_ix]
+    median_v = dfv[median_end_ix]
     return [f'{round(dfv.mean()):,}',
             #f'${round(dfv.quantile(0.25)):,}-${round(dfv.quantile(0.75)):,}',
             f'{round(worse_v):,}',
             f'{round(bad_v):,}',
             f'{round(median_v):,}',
             f'{round(good_v):,}', ]
-  lender_pool_profit = (dfend["CumUnitsToPool"].clip(0, None)*lender_profit_share) * dfend['SP500']
-  lender_profit_share_amt = (lender_profit_share*(dfend["Reinvestment"] - total_loan - dfend['InterestDeficit']) + lender_pool_profit).clip(0, None)
+  lender_profit_share_amt = lender_profit(dfend, total_loan, lender_profit_share)
 
 
   net_fund_pos=dfend['FunderEarned'] + lender_profit_share_amt
   initial_reinvest = total_loan*reinvest_fraction - insurance_profit_margin*insurance_cost/ pow(1 + cash_rate, loan_duration)
 
-  nholidays = df['Prob Holiday'].sum()
-  nholidays_good_path = df[(df['Path']==good_pathn)]['Prob Holiday'].sum()
-  nholidays_bad_path = df[(df['Path']==bad_pathn)]['Prob Holiday'].sum()
-  nholidays_worse_path = df[(df['Path']==worse_pathn)]['Prob Holiday'].sum()
-  nholidays_median_path = df[(df['Path']==median_pathn)]['Prob Holiday'].sum()
+  holidays = cube.path_totals('Prob Holiday')      # holiday quarters per path
+  nholidays = holidays.sum()
+  nholidays_good_path = holidays[good_end_ix]
+  nholidays_bad_path = holidays[bad_end_ix]
+  nholidays_worse_path = holidays[worse_end_ix]
+  nholidays_median_path = holidays[median_end_ix]
 
   discount_lender_profit_share = lender_profit_share_amt /pow(1 + cash_rate, loan_duration)
   net_fund_pos_val = net_fund_pos.mean()
   avg_loan_size = (total_loan + total_loan * reinvest_fraction + annual_income/4)/2
 
-  means = df.groupby('Period').mean()
-  npcf = (means['InterestPaidToFunder']-means['AnnuityIncome']).iloc[:].values
+  npcf = cube.mean('InterestPaidToFunder')-cube.mean('AnnuityIncome')
   npcf[0] -= total_loan * reinvest_fraction + annual_income/4 # initial loan
   npcf[-1] += lender_profit_share_amt.mean()+total_loan+dfend['InterestDeficit'].mean()
+  import numpy_financial as npf     # only the outputs table needs it
   irr = npf.irr(npcf)
 
   outdfs = []
@@ -336,7 +679,7 @@ def main_outputs_table(df,total_loan, reinvest_fraction, loan_duration, annual_i
   outdfs.append(["Funder XIRR", "", pcnt(irr), "", "", "", ""])
   #outdfs.append(["Funder IRR", "", pcntdf(irr), "", "", "",""])
   outdfs.append(["Number of Holidays", "", round(nholidays/total_paths), nholidays_worse_path, nholidays_bad_path, nholidays_median_path, nholidays_good_path])
-  outdfs.append(["%Quarters on Holiday", "",pcnt(df['Prob Holiday'].mean()), "", "", "", ""])
+  outdfs.append(["%Quarters on Holiday", "",pcnt(nholidays/(cube.n_paths*cube.n_periods)), "", "", "", ""])
 
   outdf = pd.DataFrame(outdfs, columns = ["Quantity", "Formula", "Expected value", "Worse path value", "Bad path value", "Median path value", "Good path value"])
   return outdf
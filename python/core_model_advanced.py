@@ -2,7 +2,6 @@ import pandas as pd
 import math
 from statistics import geometric_mean
 import numpy as np
-import numpy_financial as npf
 from utils import mean_sd, dollar, pcntdf, pcnt, secant
 
 
@@ -305,6 +304,7 @@ def main_outputs_table(df,total_loan, reinvest_fraction, loan_duration, annual_i
   npcf = (means['InterestPaidToFunder']-means['AnnuityIncome']).iloc[:].values
   npcf[0] -= total_loan * reinvest_fraction + annual_income/4 # initial loan
   npcf[-1] += lender_profit_share_amt.mean()+total_loan+dfend['InterestDeficit'].mean()
+  import numpy_financial as npf     # only the outputs table needs it
   irr = npf.irr(npcf)
 
   outdfs = []
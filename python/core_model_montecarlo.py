@@ -2,22 +2,27 @@ import pandas as pd
 import math
 from statistics import geometric_mean
 import numpy as np
-import numpy_financial as npf
 from utils import mean_sd, dollar, pcntdf, pcnt, secant
-from multiprocessing import Pool, cpu_count
+from core_model import (COLUMNS, frame_from_columns, gen_observation_paths, observation_schedule, OBSERVATION_DT,
+                        PATH_BLOCK, path_normals)
+from multiprocessing import Pool, cpu_count, shared_memory
 import warnings
 warnings.filterwarnings('ignore')
 
 
-def gen_monte_carlo_paths_vectorized(loan_duration, equity_return, volatility, total_paths, S0):
+def gen_monte_carlo_paths_vectorized(loan_duration, equity_return, volatility, total_paths, S0, seed=None, first_path=0):
     """
     Vectorized Monte Carlo path generation - processes all paths simultaneously
+    seed / first_path: paths first_path.. of the seeded block streams (core_model.path_normals)
     """
     dt = 1.0/120
     N = round(loan_duration/dt)
     
     # Generate all random numbers at once
-    random_matrix = np.random.standard_normal((total_paths, N))
+    if seed is None:
+        random_matrix = np.random.standard_normal((total_paths, N))
+    else:
+        random_matrix = path_normals(seed, first_path, total_paths, N)
     
     # Vectorized path generation
     ts = np.linspace(0, loan_duration, N)
@@ -29,10 +34,34 @@ def gen_monte_carlo_paths_vectorized(loan_duration, equity_return, volatility, t
     S_all = S0 * np.exp(X)  # All paths at once
     
     # Convert to original format for compatibility
-    price_paths = [(i, S_all[i]) for i in range(total_paths)]
+    price_paths = [(first_path + i, S_all[i]) for i in range(total_paths)]
     return price_paths
 
 
+def _path_chunk(task):
+    args, kwargs = task
+    return gen_observation_paths(*args, **kwargs)
+
+
+def gen_observation_paths_parallel(loan_duration, equity_return, volatility, total_paths, S0, seed,
+                                   schedule=None, exact=False, grid_dt=1.0/120, processes=None):
+    """
+    gen_observation_paths(..., seed=seed) with the paths split across worker processes.
+    Chunks follow the PATH_BLOCK seed streams, so the paths are the same for any worker count.
+    """
+    blocks = -(-total_paths // PATH_BLOCK)
+    processes = min(processes or cpu_count(), blocks)
+    kwargs = dict(schedule=schedule, exact=exact, grid_dt=grid_dt, seed=seed)
+    if processes <= 1:
+        return gen_observation_paths(loan_duration, equity_return, volatility, total_paths, S0, **kwargs)
+    bounds = np.minimum(np.linspace(0, blocks, processes + 1).astype(int) * PATH_BLOCK, total_paths)
+    tasks = [((loan_duration, equity_return, volatility, hi - lo, S0), dict(kwargs, first_path=lo))
+             for lo, hi in zip(bounds[:-1], bounds[1:])]
+    with Pool(processes=processes) as pool:
+        chunks = pool.map(_path_chunk, tasks)
+    return [path for chunk in chunks for path in chunk]
+
+
 def single_mortgage_batch(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                          insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin, 
                          additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction, 
@@ -54,26 +83,26 @@ def single_mortgage_batch(total_loan, reinvest_fraction, loan_duration, annual_i
                                     hedging_cap, hedging_cost_pa)
 
 
-def process_single_path(args):
+def _parallel_chunk(task):
     """
-    Worker function for parallel processing of individual paths
+    Worker for single_mortgage_parallel: attaches the shared price and output blocks and writes the
+    rows of paths lo..hi-1 in place. Only the block names, chunk bounds and model arguments are pickled.
     """
-    (path_data, total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
-     insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
-     additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
-     subperform_loan_threshold_quarters, S0, dt, year_offset, max_superpay_factor,
-     superpay_start_factor, enable_pool, insured_units, expected_reinvestment_ratio,
-     piProgressiveRepayment, hedged, hedging_max_loss, hedging_cap, hedging_cost_pa) = args
-    
-    # Process single path using optimized single-threaded function
-    result = single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
-                                      insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
-                                      additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
-                                      subperform_loan_threshold_quarters, [path_data], S0, dt, year_offset,
-                                      max_superpay_factor, superpay_start_factor, enable_pool, insured_units,
-                                      expected_reinvestment_ratio, piProgressiveRepayment, hedged, hedging_max_loss,
-                                      hedging_cap, hedging_cost_pa)
-    return result
+    prices_name, out_name, num_paths, total_periods, lo, hi, path_ids, model_args = task
+    prices_shm = shared_memory.SharedMemory(name=prices_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        prices = np.ndarray((num_paths, total_periods - 1), dtype=np.float64, buffer=prices_shm.buf)
+        out = np.ndarray((len(COLUMNS), num_paths * total_periods), dtype=np.float64, buffer=out_shm.buf)
+        chunk = [(pathn, prices[lo + i]) for i, pathn in enumerate(path_ids)]
+        args = list(model_args)
+        args[13] = chunk   # price_paths
+        _fill_rows(out, lo * total_periods, *args, prices_observed=True)
+        del prices, out, chunk, args
+    finally:
+        prices_shm.close()
+        out_shm.close()
+    return hi - lo
 
 
 def single_mortgage_parallel(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
@@ -82,38 +111,47 @@ def single_mortgage_parallel(total_loan, reinvest_fraction, loan_duration, annua
                             subperform_loan_threshold_quarters, price_paths, S0, dt, year_offset=0,
                             max_superpay_factor=1.0, superpay_start_factor=1.0, enable_pool=False,
                             insured_units=0, expected_reinvestment_ratio=None, piProgressiveRepayment=False,
-                            hedged=False, hedging_max_loss=0, hedging_cap=1000, hedging_cost_pa=0):
+                            hedged=False, hedging_max_loss=0, hedging_cap=1000, hedging_cost_pa=0,
+                            round_output=True, processes=None, min_chunk=250):
     """
-    Parallel processing version using multiprocessing
+    Parallel processing version using multiprocessing and shared memory.
+    The quarterly prices the model reads go into one shared (paths, quarters) matrix and each
+    worker takes a contiguous chunk of paths (at least min_chunk), writing its rows straight into a
+    shared (columns, rows) output buffer, so nothing per path is pickled or returned.
+    Same rows as single_mortgage_optimized.
     """
-    # Prepare arguments for each path
-    path_args = []
-    for path_data in price_paths:
-        args = (path_data, total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
-                insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
-                additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
-                subperform_loan_threshold_quarters, S0, dt, year_offset, max_superpay_factor,
-                superpay_start_factor, enable_pool, insured_units, expected_reinvestment_ratio,
-                piProgressiveRepayment, hedged, hedging_max_loss, hedging_cap, hedging_cost_pa)
-        path_args.append(args)
-    
-    # Use multiprocessing to process paths in parallel
-    num_processes = min(cpu_count(), len(price_paths))
-    with Pool(processes=num_processes) as pool:
-        results = pool.map(process_single_path, path_args)
-    
-    # Combine results
-    all_data = []
-    for result_df in results:
-        all_data.extend(result_df.values.tolist())
-    
-    return pd.DataFrame(all_data, columns=["Path", "Period","Year", "Quarter", "SP500", "Interest", "Loan size",
-                                          "Units", "Reinvestment", "InterestDeficit","CapitalDeficit", "Surplus",
-                                          "Prob Holiday", "FunderEarned", "AnnuityIncome", "HolidayQuarters", 
-                                          "Prob Subperform", "InterestPaid", "InterestPaidToFunder", "InterestRate", 
-                                          "UnitsSold", "CumUnitsSold", "InterestDeficitDelta", "UnitsToPool", 
-                                          "CumUnitsToPool","CumInterestPaid", "UnitsToPrincipal", "TotalUnitsSold",
-                                          "HedgeUnitsDelta"])
+    model_args = (total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+                  insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
+                  additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
+                  subperform_loan_threshold_quarters, None, S0, dt, year_offset, max_superpay_factor,
+                  superpay_start_factor, enable_pool, insured_units, expected_reinvestment_ratio,
+                  piProgressiveRepayment, hedged, hedging_max_loss, hedging_cap, hedging_cost_pa)
+    num_paths = len(price_paths)
+    total_periods = int(4 * loan_duration + 1)
+    processes = min(processes or cpu_count(), max(num_paths // min_chunk, 1))
+    if processes <= 1:
+        return single_mortgage_optimized(*model_args[:13], price_paths, *model_args[14:], round_output=round_output)
+
+    price_indices = (np.arange(1, total_periods) * (1.0/(dt*4)) - 1).astype(int)
+    path_ids = [pathn for (pathn, S) in price_paths]
+    prices_shm = shared_memory.SharedMemory(create=True, size=num_paths * (total_periods - 1) * 8)
+    out_shm = shared_memory.SharedMemory(create=True, size=len(COLUMNS) * num_paths * total_periods * 8)
+    try:
+        prices = np.ndarray((num_paths, total_periods - 1), dtype=np.float64, buffer=prices_shm.buf)
+        for i, (pathn, S) in enumerate(price_paths):
+            prices[i] = np.take(S, price_indices)
+        bounds = np.linspace(0, num_paths, processes + 1).astype(int)
+        tasks = [(prices_shm.name, out_shm.name, num_paths, total_periods, lo, hi, path_ids[lo:hi], model_args)
+                 for lo, hi in zip(bounds[:-1], bounds[1:])]
+        with Pool(processes=processes) as pool:
+            pool.map(_parallel_chunk, tasks)
+        out = np.ndarray((len(COLUMNS), num_paths * total_periods), dtype=np.float64, buffer=out_shm.buf)
+        all_data = out.copy()
+        del prices, out
+    finally:
+        prices_shm.close(); prices_shm.unlink()
+        out_shm.close(); out_shm.unlink()
+    return frame_from_columns(all_data, round_output)
 
 
 def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
@@ -122,9 +160,37 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
                              subperform_loan_threshold_quarters, price_paths, S0, dt, year_offset=0,
                              max_superpay_factor=1.0, superpay_start_factor=1.0, enable_pool=False,
                              insured_units=0, expected_reinvestment_ratio=None, piProgressiveRepayment=False,
-                             hedged=False, hedging_max_loss=0, hedging_cap=1000, hedging_cost_pa=0):
+                             hedged=False, hedging_max_loss=0, hedging_cap=1000, hedging_cost_pa=0,
+                             round_output=True):
+    """
+    Highly optimized single-threaded version with memory pre-allocation and vectorization.
+    Rows go into one typed float64 (columns, rows) buffer; the frame is built from typed column
+    views, with integer/flag columns cast and money columns rounded in one pass each.
+    """
+    # Pre-allocate one typed buffer for all paths: a column per output field
+    all_data = np.zeros((len(COLUMNS), len(price_paths) * int(4 * loan_duration + 1)))
+    _fill_rows(all_data, 0, total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+               insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
+               additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
+               subperform_loan_threshold_quarters, price_paths, S0, dt, year_offset,
+               max_superpay_factor, superpay_start_factor, enable_pool, insured_units,
+               expected_reinvestment_ratio, piProgressiveRepayment, hedged, hedging_max_loss,
+               hedging_cap, hedging_cost_pa)
+    return frame_from_columns(all_data, round_output)
+
+
+def _fill_rows(all_data, row_idx, total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+               insurance_profit_margin, insurance_cost, cash_rate_series, wholesale_lending_margin,
+               additional_loan_margins, holiday_enter_fraction, holiday_exit_fraction,
+               subperform_loan_threshold_quarters, price_paths, S0, dt, year_offset=0,
+               max_superpay_factor=1.0, superpay_start_factor=1.0, enable_pool=False,
+               insured_units=0, expected_reinvestment_ratio=None, piProgressiveRepayment=False,
+               hedged=False, hedging_max_loss=0, hedging_cap=1000, hedging_cost_pa=0,
+               prices_observed=False):
     """
-    Highly optimized single-threaded version with memory pre-allocation and vectorization
+    Writes the rows of every path in price_paths into all_data[:, row_idx:], a (len(COLUMNS), rows)
+    float64 buffer. prices_observed=True means each S already holds only the quarterly prices
+    the model reads (S[price_indices]), as in single_mortgage_parallel's shared price matrix.
     """
     # Pre-calculate constants
     is_cash_rate_list = isinstance(cash_rate_series, list)
@@ -146,12 +212,6 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
     annuity_duration_quarters = int(annuity_duration * 4)
     total_periods = int(4 * loan_duration + 1)
     
-    # Pre-allocate massive result array for all paths
-    num_paths = len(price_paths)
-    total_rows = num_paths * total_periods
-    all_data = np.zeros((total_rows, 29), dtype=object)
-    row_idx = 0
-    
     for (pathn, S) in price_paths:
         # Initialize path variables
         holdings = initial_reinvestment / S0
@@ -173,10 +233,10 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
 
         # Initialize first row
         holdings_s0 = holdings * S0
-        all_data[row_idx] = [pathn, 0, year_offset, 0, S0, 0, round(total_loan * reinvest_fraction), holdings, round(holdings_s0),
-                            round(0), round(max(loan_size - holdings_s0, 0)), round(holdings_s0 - loan_size - deferred), 
-                            in_holiday, 0, annual_income_quarter, 0, False, 0, 0, 0, 0, 0, 0, 0, 0, 0, 
-                            init_units_to_principal, 0, 0]
+        all_data[:, row_idx] = (pathn, 0, year_offset, 0, S0, 0, total_loan * reinvest_fraction, holdings, holdings_s0,
+                                0, max(loan_size - holdings_s0, 0), holdings_s0 - loan_size - deferred,
+                                in_holiday, 0, annual_income_quarter, 0, False, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                                init_units_to_principal, 0, 0)
         row_idx += 1
 
         last_yearly_hedge_price = S0
@@ -187,11 +247,11 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
             price_indices = (np.arange(1, total_periods) * dt_quarter_inv - 1).astype(int)
             # Vectorized array access
             cash_rates = np.take(cash_rate_series, price_indices)
-            prices = np.take(S, price_indices)
+            prices = S if prices_observed else np.take(S, price_indices)
         else:
             cash_rates = np.full(total_periods-1, cash_rate_series)
             price_indices = (np.arange(1, total_periods) * dt_quarter_inv - 1).astype(int)
-            prices = np.take(S, price_indices)
+            prices = S if prices_observed else np.take(S, price_indices)
         
         # Pre-calculate loan interest rates
         loan_interest_rates = cash_rates + wholesale_lending_margin + additional_loan_margins
@@ -310,13 +370,13 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
             holdings_value = holdings * s
             
             # Store in pre-allocated array
-            all_data[row_idx] = [pathn, t, year_offset+year, quarter, s, round(interest_due), round(loan_size), 
-                                holdings, round(holdings_value), deferred, round(max(loan_size - holdings_value, 0)), 
-                                round(holdings_value - loan_size - deferred + cum_units_to_pool * s), in_holiday, 
+            all_data[:, row_idx] = (pathn, t, year_offset+year, quarter, s, interest_due, loan_size,
+                                holdings, holdings_value, deferred, max(loan_size - holdings_value, 0),
+                                holdings_value - loan_size - deferred + cum_units_to_pool * s, in_holiday, 
                                 funder_earned, yearly_annuity_income, holiday_quarters, subperform, interest_paid, 
                                 interest_paid_to_funder, loan_interest_rate, units_sold_now, cummlative_units_sold, 
                                 deferred_delta, units_to_pool, cum_units_to_pool, cum_interest_paid, units_to_principal, 
-                                units_sold_now+units_to_principal, hedge_units_delta]
+                                units_sold_now+units_to_principal, hedge_units_delta)
             row_idx += 1
             
             if t < annuity_duration_quarters:
@@ -324,14 +384,6 @@ def single_mortgage_optimized(total_loan, reinvest_fraction, loan_duration, annu
                     holdings -= units_to_principal
                 else:
                     loan_size += annual_income_quarter
-    
-    return pd.DataFrame(all_data, columns=["Path", "Period","Year", "Quarter", "SP500", "Interest", "Loan size",
-                                          "Units", "Reinvestment", "InterestDeficit","CapitalDeficit", "Surplus",
-                                          "Prob Holiday", "FunderEarned", "AnnuityIncome", "HolidayQuarters", 
-                                          "Prob Subperform", "InterestPaid", "InterestPaidToFunder", "InterestRate", 
-                                          "UnitsSold", "CumUnitsSold", "InterestDeficitDelta", "UnitsToPool", 
-                                          "CumUnitsToPool","CumInterestPaid", "UnitsToPrincipal", "TotalUnitsSold",
-                                          "HedgeUnitsDelta"])
 
 
 # Alias for backward compatibility
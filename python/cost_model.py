@@ -0,0 +1,188 @@
+"""
+Calibrated cost model for interactive Monte Carlo runs.
+
+The calculator used to run a fixed total_paths (1000) whatever the loan duration, hedging mode
+or box it ran on, so latency swung from under a second to tens of seconds. Here the two engines
+are timed on a small grid of micro-benchmarks and a linear model in paths x periods x features
+is fitted per engine:
+
+  single_mortgage  the Monte Carlo calculator's request: monte_carlo.run (paths, engine, per-period
+                   statistics, chart aggregates)
+                     ms ~ c0 + P*Q*(c1 + c2*hedged + c3*pi)                            (Q = quarters)
+  v14d             epm_engine_v14d.run (annual, vectorised)
+                     ms ~ c0 + c1*P*(T+1)
+
+plan() then inverts the model: the largest path count whose predicted time fits time_budget_ms.
+The Monte Carlo SE of the reported mean is std/sqrt(paths), so callers report it alongside.
+Budgets cover the run itself, not interpreter start-up and imports (~1s for pandas).
+
+    import cost_model as cm
+    cm.calibrate()                                   # offline, once per box, saved to cost_model.json
+    cm.plan(2000, periods=121, hedged=True)          # {'n_paths': .., 'predicted_ms': .., ...}
+    r = cm.run_v14d(time_budget_ms=500)              # engine run sized to the budget, r['se'] in pp
+
+The committed cost_model.json is a fallback measured on one development box (its "host"), so
+time_budget_ms works out of the box; run `python3 cost_model.py` on the serving box to replace it
+with that box's timings.
+"""
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COST_FILE = os.path.join(HERE, 'cost_model.json')
+
+KINDS = ('single_mortgage', 'v14d')
+FEATURES = ('hedged', 'pi')
+
+# micro-benchmark grids: (paths, years, hedged, pi) and (paths, tenure)
+MORTGAGE_GRID = [(p, y, h, pi) for p in (100, 500, 2000) for y in (10, 30)
+                 for h, pi in ((False, False), (True, False), (False, True))] + [(1000, 20, True, True)]
+ENGINE_GRID = [(p, y) for p in (5_000, 20_000, 50_000) for y in (15, 30)]
+
+_MODEL = None
+
+def _terms(kind, n_paths, periods, hedged=False, pi=False):
+    P, Q = float(n_paths), float(periods)
+    if kind == 'single_mortgage':
+        return [1.0, P*Q, P*Q*hedged, P*Q*pi]
+    if kind == 'v14d':
+        return [1.0, P*Q]
+    raise ValueError(f"unknown cost model kind {kind!r} (use one of {KINDS})")
+
+def _best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn()
+        best = min(best, (time.perf_counter() - t0)*1000)
+    return best
+
+def _mortgage_case(n_paths, years, hedged, pi):
+    import monte_carlo
+    params = dict(house_value=1_500_000, loan_duration=years, annuity_duration=min(10, years), loan_to_value=0.8,
+                  annual_income=20_000, equity_return=0.08, volatility=0.15, cash_rate=0.03, total_paths=n_paths,
+                  wholesale_lending_margin=0.02, additional_loan_margins=0.0, holiday_enter_fraction=0.7,
+                  holiday_exit_fraction=0.9, subperform_loan_threshold_quarters=6, insurance_cost_pa=0.0,
+                  hedged=hedged, hedging_max_loss=0.2, hedging_cap=0.4, hedging_cost_pa=0.005,
+                  loan_type='Principal+Interest' if pi else 'Interest only')
+    return lambda: monte_carlo.run(params)
+
+def _engine_case(n_paths, tenure):
+    if os.path.dirname(HERE) not in sys.path:
+        sys.path.append(os.path.dirname(HERE))
+    import epm_engine_v14d as e
+    return lambda: e.run(dict(tenure=tenure), n_paths=n_paths, seed=1)
+
+def _fit(kind, rows, ms):
+    X = np.array([_terms(kind, *r) for r in rows]); y = np.array(ms)
+    coef = np.linalg.lstsq(X, y, rcond=None)[0]
+    # a negative cost, fixed or marginal, is benchmark noise, not a speed-up: refit without it (a
+    # negative intercept would promise small runs in less than no time)
+    neg = [i for i in range(len(coef)) if coef[i] < 0]
+    if neg:
+        keep = [i for i in range(len(coef)) if i not in neg]
+        coef = np.zeros(len(coef)); coef[keep] = np.linalg.lstsq(X[:, keep], y, rcond=None)[0]
+    pred = X @ coef
+    r2 = float(1 - np.sum((y - pred)**2)/np.sum((y - y.mean())**2)) if len(y) > 1 else 1.0
+    return dict(coef=coef.tolist(), r2=r2, n_benchmarks=len(rows))
+
+def calibrate(kinds=KINDS, repeat=1, save=True, path=COST_FILE, verbose=False):
+    """Time the micro-benchmark grids, fit one cost model per engine and (optionally) save it."""
+    model = dict(host=platform.node(), python=platform.python_version(),
+                 calibrated=datetime.now().isoformat(timespec='seconds'), kinds={})
+    for kind in kinds:
+        if kind == 'single_mortgage':
+            rows, ms = [], []
+            for p, y, h, pi in MORTGAGE_GRID:
+                rows.append((p, 4*y + 1, h, pi))
+                ms.append(_best_ms(_mortgage_case(p, y, h, pi), repeat))
+        elif kind == 'v14d':
+            rows, ms = [], []
+            for p, y in ENGINE_GRID:
+                rows.append((p, y + 1))
+                ms.append(_best_ms(_engine_case(p, y), repeat))
+        else:
+            raise ValueError(f"unknown cost model kind {kind!r} (use one of {KINDS})")
+        model['kinds'][kind] = _fit(kind, rows, ms)
+        if verbose:
+            k = model['kinds'][kind]
+            print(f"{kind:16} {len(rows)} benchmarks  R2={k['r2']:.3f}  coef={['%.3g' % c for c in k['coef']]}")
+    if save:
+        with open(path, 'w') as f:
+            json.dump(model, f, indent=2)
+    global _MODEL
+    _MODEL = model
+    return model
+
+def load(path=COST_FILE):
+    """The saved cost model (this box's calibration, or the committed fallback). Never calibrates:
+    FileNotFoundError if there is none (the calculator then keeps its total_paths)."""
+    global _MODEL
+    if _MODEL is None:
+        try:
+            with open(path) as f:
+                _MODEL = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"no cost model at {path}; calibrate it offline with python3 cost_model.py") from None
+    return _MODEL
+
+def predict_ms(n_paths, periods, kind='single_mortgage', model=None, **features):
+    """Predicted wall time (ms) of one run: periods = quarters + 1 (single_mortgage) or tenure + 1 (v14d)."""
+    model = model if model is not None else load()
+    if kind not in model['kinds']:
+        raise ValueError(f"cost model has no calibration for {kind!r}; run calibrate(kinds=[{kind!r}])")
+    return float(np.dot(model['kinds'][kind]['coef'], _terms(kind, n_paths, periods, **features)))
+
+def plan(time_budget_ms, periods, kind='single_mortgage', min_paths=100, max_paths=100_000,
+         model=None, **features):
+    """Largest path count in [min_paths, max_paths] whose predicted time fits time_budget_ms.
+    Never goes below min_paths (over_budget=True flags that the floor itself does not fit)."""
+    if time_budget_ms <= 0:
+        raise ValueError(f"time_budget_ms must be positive, got {time_budget_ms}")
+    cost = lambda n: predict_ms(n, periods, kind, model, **features)
+    lo, hi = min_paths, max_paths
+    if cost(hi) <= time_budget_ms:
+        lo = hi
+    elif cost(lo) <= time_budget_ms:
+        # predicted time is increasing in paths, so bisect for the last affordable count
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            if cost(mid) <= time_budget_ms: lo = mid
+            else: hi = mid
+    return dict(n_paths=lo, predicted_ms=round(cost(lo), 1), time_budget_ms=time_budget_ms,
+                over_budget=cost(lo) > time_budget_ms, kind=kind)
+
+def standard_error(values):
+    """Monte Carlo SE of the mean of `values` (one per path)."""
+    v = np.asarray(values, dtype=float)
+    return float(v.std(ddof=1)/np.sqrt(len(v))) if len(v) > 1 else float('nan')
+
+def run_v14d(params=None, time_budget_ms=1000, seed=42, min_paths=1_000, max_paths=1_000_000):
+    """epm_engine_v14d.run sized to a time budget; the result carries the plan under 'budget'
+    (r['se'] is already the PoD standard error in pp)."""
+    if os.path.dirname(HERE) not in sys.path:
+        sys.path.append(os.path.dirname(HERE))
+    import epm_engine_v14d as e
+    tenure = (params or {}).get('tenure', e.DEFAULTS['tenure'])
+    budget = plan(time_budget_ms, tenure + 1, 'v14d', min_paths, max_paths)
+    r = e.run(params, n_paths=budget['n_paths'], seed=seed)
+    r['budget'] = budget
+    return r
+
+if __name__ == '__main__':
+    t0 = time.perf_counter()
+    m = calibrate(verbose=True)
+    print(f"calibrated in {time.perf_counter()-t0:.1f}s -> {COST_FILE}")
+    for years, hedged in ((10, False), (30, False), (30, True)):
+        for budget in (500, 2000, 5000):
+            b = plan(budget, 4*years + 1, hedged=hedged)
+            print(f"  single_mortgage {years}y hedged={hedged!s:5} budget {budget:>5}ms -> {b['n_paths']:>6} paths "
+                  f"(predicted {b['predicted_ms']:.0f}ms)")
+    for budget in (250, 1000):
+        t0 = time.perf_counter(); r = run_v14d(time_budget_ms=budget)
+        print(f"  v14d budget {budget}ms -> {r['budget']['n_paths']:,} paths  PoD={r['pod']}% (SE {r['se']}pp)  "
+              f"predicted {r['budget']['predicted_ms']:.0f}ms, actual {(time.perf_counter()-t0)*1000:.0f}ms")
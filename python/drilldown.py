@@ -0,0 +1,187 @@
+"""
+Retained calculator runs, drilled into one path ledger at a time.
+
+pyrainy.py serialised pathdf and accounts_table for the chosen percentile path on every request, and
+the Monte Carlo template the full rows of its first five paths, whether or not anyone opened those
+tables. Here a run's PathCube is kept server-side under an id, and a path's ledger (every field per
+period) or accounts table is built only when asked for: by path id, by rank or percentile of a
+field at a period, optionally cut to a period range.
+
+Retaining is opt-in (pyrainy's and the Monte Carlo calculator's lazy_tables input). A run keeps
+only LEDGER_FIELDS, the ledger's and accounts table's columns, with the label fields (Period, Year,
+Quarter: the same on every path) as one row. Runs live in an in-process LRU (MEMORY_RUNS, for the
+worker that made them) and as compressed .npz files in RUNS_DIR, so any calc_worker process can
+answer; the directory is pruned to DISK_BYTES, oldest first. A pruned or unknown id is a
+LookupError: the client reruns the calculation.
+
+    import drilldown
+    run_id = drilldown.retain(cube)                   # None if the cube is over RETAIN_BYTES
+    drilldown.ledger(run_id, percentile=0.25, field='SP500', periods=(0, 40), table='accounts')
+      -> {'run': run_id, 'path': 137, 'periods': [0, 40], 'accounts_table': {column: [...]}}
+
+    python3 drilldown.py <run_id> [--path N | --rank N | --percentile Q] [--field SP500]
+                         [--period T] [--from T] [--to T] [--table ledger|accounts|both]
+"""
+import argparse
+import collections
+import json
+import os
+import secrets
+import numpy as np
+
+from core_model import accounts_table
+from path_cube import PathCube
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUNS_DIR = os.path.join(HERE, 'drilldown_runs')
+MEMORY_RUNS = 4
+DISK_BYTES = 1024*2**20
+RETAIN_BYTES = 256*2**20          # larger runs (e.g. 10k paths x 30 years) are not retained
+TABLES = ('ledger', 'accounts', 'both')
+LABELS = ('Period', 'Year', 'Quarter')
+# the path table's columns (index.html, the Monte Carlo path rows) and what accounts_table reads
+LEDGER_FIELDS = LABELS + ('SP500', 'Interest', 'Loan size', 'Units', 'Reinvestment', 'InterestDeficit',
+                          'CapitalDeficit', 'Surplus', 'FunderEarned', 'AnnuityIncome', 'InterestPaid',
+                          'InterestPaidToFunder', 'InterestRate', 'UnitsSold', 'CumUnitsSold',
+                          'InterestDeficitDelta', 'CumUnitsToPool', 'CumInterestPaid', 'UnitsToPrincipal',
+                          'TotalUnitsSold', 'HedgeUnitsDelta')
+
+_runs = collections.OrderedDict()        # run id -> PathCube, most recently used last
+
+
+def _remember(run_id, cube):
+    _runs[run_id] = cube
+    _runs.move_to_end(run_id)
+    while len(_runs) > MEMORY_RUNS:
+        _runs.popitem(last=False)
+
+
+def retain(cube, runs_dir=RUNS_DIR):
+    """Keep a PathCube for drill-down; returns its run id, or None when it is too large to keep."""
+    if not isinstance(cube, PathCube):
+        return None
+    fields = {k: v for k, v in cube.fields.items() if k in LEDGER_FIELDS}
+    if sum(v.nbytes for v in fields.values()) > RETAIN_BYTES:
+        return None
+    run_id = secrets.token_hex(8)
+    _remember(run_id, PathCube(fields, cube.path_ids))
+    try:
+        os.makedirs(runs_dir, exist_ok=True)
+        path = os.path.join(runs_dir, f'{run_id}.npz')
+        tmp = f'{path}.{os.getpid()}.npz'
+        arrays = {f'label/{k}' if k in LABELS else f'field/{k}': v[0] if k in LABELS else v
+                  for k, v in fields.items()}
+        np.savez_compressed(tmp, path_ids=cube.path_ids, **arrays)
+        os.replace(tmp, path)
+        _prune(runs_dir)
+    except OSError:
+        pass                                   # still answerable by this process
+    return run_id
+
+
+def _prune(runs_dir):
+    entries = []
+    for f in os.listdir(runs_dir):
+        if f.endswith('.npz') and f.count('.') == 1:
+            st = os.stat(os.path.join(runs_dir, f))
+            entries.append((st.st_mtime, st.st_size, f))
+    total = sum(size for _, size, _ in entries)
+    for _, size, f in sorted(entries):
+        if total <= DISK_BYTES:
+            break
+        os.remove(os.path.join(runs_dir, f))
+        total -= size
+
+
+def load(run_id, runs_dir=RUNS_DIR):
+    """The retained PathCube of run_id; LookupError if it is unknown or has been pruned."""
+    if run_id in _runs:
+        _runs.move_to_end(run_id)
+        return _runs[run_id]
+    if not run_id or not all(c in '0123456789abcdef' for c in run_id):
+        raise LookupError(f"unknown run {run_id!r}")
+    try:
+        with np.load(os.path.join(runs_dir, f'{run_id}.npz'), allow_pickle=False) as arrays:
+            path_ids = arrays['path_ids']
+            fields = {}
+            for k in arrays.files:
+                kind, _, name = k.partition('/')
+                if kind == 'label':
+                    fields[name] = np.broadcast_to(arrays[k], (len(path_ids), len(arrays[k])))
+                elif kind == 'field':
+                    fields[name] = arrays[k]
+            cube = PathCube(fields, path_ids)
+    except (OSError, ValueError, KeyError):
+        raise LookupError(f"run {run_id!r} is no longer retained; rerun the calculation") from None
+    _remember(run_id, cube)
+    return cube
+
+
+def select_path(cube, path=None, rank=None, percentile=None, field='SP500', period=-1):
+    """Path id by id, or by the rank / percentile (0-1) of field at period (pyrainy's path table)."""
+    if path is not None:
+        if int(path) not in cube.path_ids:
+            raise LookupError(f"the run has no path {path}")
+        return int(path)
+    if percentile is not None:
+        rank = round(float(percentile)*cube.n_paths)
+    if rank is None:
+        raise ValueError("select a path by path, rank or percentile")
+    return int(cube.rank_path(field, min(max(int(rank), 0), cube.n_paths - 1), period))
+
+
+def ledger(run_id, path=None, rank=None, percentile=None, field='SP500', period=-1, periods=None,
+           table='ledger', runs_dir=RUNS_DIR):
+    """{'run', 'path', 'periods', 'pathdf' and / or 'accounts_table'} of one path of a retained run.
+    periods=(first, last) keeps those Period values (inclusive)."""
+    if table not in TABLES:
+        raise ValueError(f"unknown table {table!r} (use one of {TABLES})")
+    cube = load(run_id, runs_dir)
+    pathn = select_path(cube, path, rank, percentile, field, period)
+    pathdf = cube.path_frame(pathn)
+    if periods is not None:
+        first, last = periods
+        pathdf = pathdf[pathdf['Period'].between(first, last)]
+    result = dict(run=run_id, path=pathn, periods=[int(pathdf['Period'].iloc[0]), int(pathdf['Period'].iloc[-1])]
+                  if len(pathdf) else [])
+    if table in ('ledger', 'both'):
+        result['pathdf'] = pathdf.to_dict('list')
+    if table in ('accounts', 'both'):
+        result['accounts_table'] = accounts_table(pathdf).to_dict('list')
+    return result
+
+
+def request(selection):
+    """ledger() of a JSON request {"run", "path" | "rank" | "percentile", "field", "period",
+    "from", "to", "table"} (calc_worker's 'ledger' op)."""
+    periods = None
+    if selection.get('from') is not None or selection.get('to') is not None:
+        periods = (selection.get('from', 0), selection.get('to', float('inf')))
+    return ledger(selection.get('run'), selection.get('path'), selection.get('rank'), selection.get('percentile'),
+                  selection.get('field', 'SP500'), selection.get('period', -1), periods,
+                  selection.get('table', 'ledger'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('run')
+    parser.add_argument('--path', type=int)
+    parser.add_argument('--rank', type=int)
+    parser.add_argument('--percentile', type=float)
+    parser.add_argument('--field', default='SP500')
+    parser.add_argument('--period', type=int, default=-1)
+    parser.add_argument('--from', dest='from_', type=int)
+    parser.add_argument('--to', type=int)
+    parser.add_argument('--table', choices=TABLES, default='ledger')
+    args = parser.parse_args(argv)
+    selection = dict(run=args.run, path=args.path, rank=args.rank, percentile=args.percentile, field=args.field,
+                     period=args.period, table=args.table)
+    selection.update((k, v) for k, v in (('from', args.from_), ('to', args.to)) if v is not None)
+    try:
+        print(json.dumps(request(selection), default=lambda o: o.item()))
+    except (LookupError, ValueError) as e:
+        parser.exit(1, f"{e}\n")
+
+
+if __name__ == '__main__':
+    main()
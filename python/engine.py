@@ -0,0 +1,208 @@
+"""
+One single_mortgage front-end over the interchangeable engines.
+
+The calculator scripts each imported whichever engine someone hard-coded (core_model,
+core_model_advanced, core_model_montecarlo, ...). They all implement the same quarterly model,
+so here they sit behind one call with the core_model signature, as named backends:
+
+  scalar   core_model.single_mortgage_scalar         reference loop, one insurance cost per run
+  loop     core_model_montecarlo.single_mortgage_optimized   typed row loop, cheapest below ~20 paths
+  numpy    core_model.single_mortgage_vectorized     quarters-only over (paths,) arrays, every feature
+  rust     monte_carlo_engine.single_mortgage_rust   end-of-term values only (optional build of
+           python/rust_monte_carlo); hedging but no pool, PI repayment, cash-rate series or superpay
+
+backend='auto' picks the fastest available backend that supports the run's features for its path
+count (select_backend); rust comes last, after the scalar reference, so it runs only when asked for
+by name until its conformance is established. test_backends.py runs every backend on shared price
+paths and checks them against the scalar reference.
+
+    import engine
+    df = engine.single_mortgage(total_loan, ..., price_paths, S0, dt, ...)          # frame (auto)
+    cube = engine.single_mortgage(..., as_cube=True, backend='numpy')                 # PathCube
+    end = engine.end_of_term(...)     # {'Reinvestment', 'InterestDeficit', 'HolidayQuarters'} per path
+"""
+import inspect
+import numpy as np
+
+# Features a run can use; a backend declares the subset it implements
+FEATURES = ('pool', 'hedged', 'pi', 'cash_series', 'superpay', 'per_path_cost', 'unrounded')
+SMALL_PATHS = 20          # below this the row loop beats numpy's per-quarter overhead
+END_FIELDS = ('Reinvestment', 'InterestDeficit', 'HolidayQuarters')
+
+_SIGNATURE = None
+
+
+def _reference():
+    from core_model import single_mortgage_scalar
+    return single_mortgage_scalar
+
+
+def bind_parameters(*args, **kwargs):
+    """single_mortgage arguments as a dict of every model parameter, defaults filled in."""
+    global _SIGNATURE
+    if _SIGNATURE is None:
+        _SIGNATURE = inspect.signature(_reference())
+    bound = _SIGNATURE.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def run_features(params, round_output=True):
+    """Set of FEATURES a bound parameter dict (and output rounding) uses."""
+    used = set()
+    if params['enable_pool']:
+        used.add('pool')
+    if params['hedged']:
+        used.add('hedged')
+    if params['piProgressiveRepayment']:
+        used.add('pi')
+    if isinstance(params['cash_rate_series'], list):
+        used.add('cash_series')
+    if params['max_superpay_factor'] != 1.0 or params['superpay_start_factor'] != 1.0:
+        used.add('superpay')
+    if np.ndim(params['insurance_cost']) > 0:
+        used.add('per_path_cost')
+    if not round_output:
+        used.add('unrounded')
+    return used
+
+
+class Backend:
+    """One engine: the features it implements, whether it can run here, and how to call it.
+    Every backend has end_of_term; those with frames=True (FrameBackend) also have frame."""
+    frames = False
+
+    def __init__(self, name, features, module=None):
+        self.name = name
+        self.features = frozenset(features)
+        self.module = module        # optional extension module; None if always importable
+
+    def available(self):
+        if self.module is None:
+            return True
+        try:
+            __import__(self.module)
+        except ImportError:
+            return False
+        return True
+
+    def supports(self, features, output='frame'):
+        return set(features) <= self.features and (output != 'frame' or self.frames)
+
+
+class FrameBackend(Backend):
+    """A backend with the long-frame output; end-of-term values are read off its final period."""
+    frames = True
+
+    def end_of_term(self, params):
+        """{field: (paths,) values} at the final period, from the frame backend."""
+        cube = self.frame(params, round_output='unrounded' in self.features, as_cube=True)
+        end = cube.at(-1)
+        return {name: np.asarray(end[name], dtype=float) for name in END_FIELDS}
+
+
+class ScalarBackend(FrameBackend):
+    def frame(self, params, round_output=True, as_cube=False):
+        df = _reference()(**params)
+        return _as_cube(df) if as_cube else df
+
+
+class LoopBackend(FrameBackend):
+    def frame(self, params, round_output=True, as_cube=False):
+        from core_model_montecarlo import single_mortgage_optimized
+        df = single_mortgage_optimized(**params, round_output=round_output)
+        return _as_cube(df) if as_cube else df
+
+
+class NumpyBackend(FrameBackend):
+    def frame(self, params, round_output=True, as_cube=False):
+        from core_model import single_mortgage_vectorized
+        return single_mortgage_vectorized(**params, round_output=round_output, as_cube=as_cube)
+
+
+class RustBackend(Backend):
+    def end_of_term(self, params):
+        import monte_carlo_engine
+        from core_model import observation_schedule
+        p = params
+        if p['loan_duration'] != int(p['loan_duration']) or p['annuity_duration'] != int(p['annuity_duration']):
+            raise ValueError("the rust backend needs whole-year loan and annuity durations")
+        # the extension reads month index 30*t - 1 of a 1/120 grid and the final price last: each
+        # observed quarterly price repeated 30 times gives it exactly the prices the model reads at dt
+        schedule = observation_schedule(p['loan_duration'], p['dt'])
+        grid = [np.repeat(np.take(S, schedule), 30).tolist() for (pathn, S) in p['price_paths']]
+        costs = np.broadcast_to(np.asarray(p['insurance_cost'], dtype=float), (len(grid),))
+        end = {name: np.zeros(len(grid)) for name in END_FIELDS}
+        # one call per distinct insurance cost (a tile_paths batch has a handful)
+        for cost in np.unique(costs):
+            rows = np.flatnonzero(costs == cost)
+            results = monte_carlo_engine.single_mortgage_rust(
+                p['total_loan'], p['reinvest_fraction'], int(p['loan_duration']), p['annual_income'],
+                int(p['annuity_duration']), p['insurance_profit_margin'], float(cost), p['cash_rate_series'],
+                p['wholesale_lending_margin'], p['additional_loan_margins'], p['holiday_enter_fraction'],
+                p['holiday_exit_fraction'], int(p['subperform_loan_threshold_quarters']),
+                [grid[i] for i in rows], p['S0'], False, bool(p['hedged']), p['hedging_max_loss'],
+                p['hedging_cap'], p['hedging_cost_pa'])
+            end['Reinvestment'][rows] = [r.reinvestment for r in results]
+            end['InterestDeficit'][rows] = [r.interest_deficit for r in results]
+            end['HolidayQuarters'][rows] = [r.quarters_in_holiday for r in results]
+        return end
+
+
+def _as_cube(df):
+    from path_cube import PathCube
+    return PathCube.from_frame(df)
+
+
+ALL = frozenset(FEATURES)
+BACKENDS = {
+    'scalar': ScalarBackend('scalar', ALL - {'per_path_cost', 'unrounded'}),
+    'loop': LoopBackend('loop', ALL - {'per_path_cost'}),
+    'numpy': NumpyBackend('numpy', ALL),
+    'rust': RustBackend('rust', {'hedged', 'per_path_cost'}, module='monte_carlo_engine'),
+}
+
+
+def available_backends():
+    """Names of the backends that can run in this interpreter."""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def select_backend(num_paths, features=(), output='frame'):
+    """Fastest available backend for a run of num_paths using `features` (see FEATURES).
+    The unverified rust engine is tried last, so 'auto' reaches it only if nothing else can run."""
+    order = ['loop', 'numpy'] if num_paths < SMALL_PATHS else ['numpy', 'loop']
+    for name in order + ['scalar', 'rust']:
+        backend = BACKENDS[name]
+        if backend.supports(features, output) and backend.available():
+            return name
+    raise ValueError(f"no backend supports features {sorted(features)} with {output} output")
+
+
+def _backend(name, params, features, output):
+    if name == 'auto':
+        name = select_backend(len(params['price_paths']), features, output)
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r} (use one of {sorted(BACKENDS)} or 'auto')")
+    backend = BACKENDS[name]
+    if not backend.supports(features, output):
+        missing = sorted(set(features) - backend.features) or [f'{output} output']
+        raise ValueError(f"backend {name!r} does not support {', '.join(missing)}")
+    if not backend.available():
+        raise ImportError(f"backend {name!r} needs the {backend.module} extension (python/rust_monte_carlo/build.sh)")
+    return backend
+
+
+def single_mortgage(*args, backend='auto', round_output=True, as_cube=False, **kwargs):
+    """core_model.single_mortgage on the chosen backend: the long frame, or a PathCube with as_cube=True."""
+    params = bind_parameters(*args, **kwargs)
+    features = run_features(params, round_output)
+    return _backend(backend, params, features, 'frame').frame(params, round_output, as_cube)
+
+
+def end_of_term(*args, backend='auto', **kwargs):
+    """{'Reinvestment', 'InterestDeficit', 'HolidayQuarters'}: (paths,) float arrays at the final
+    period, in price_paths order. Frame backends report Reinvestment unrounded where they can."""
+    params = bind_parameters(*args, **kwargs)
+    features = run_features(params)
+    return _backend(backend, params, features, 'end').end_of_term(params)
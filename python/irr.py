@@ -0,0 +1,137 @@
+"""
+IRR / XIRR of many cashflow rows at once.
+
+main_outputs_table reports one npf.irr of the mean cashflow vector; npf.irr finds the roots of a
+degree-(periods-1) polynomial per call, far too slow for a per-path distribution. Here every row of
+an (n_paths, n_periods) matrix is solved together:
+
+  1. rows whose nonzero cashflows never change sign have no IRR (nan)
+  2. vectorised Newton from `guess`, NPV and slope by one Horner pass in v = 1/(1+r) per iteration
+  3. rows that did not converge, or with several sign changes (up to that many roots, Descartes),
+     are bracketed on a rate grid walking out from 0 on both sides and bisected; like npf.irr the
+     root closest to zero is returned (rows the grid cannot bracket fall back to np.roots)
+
+    import irr
+    rates = irr.batch_irr(cashflows)                        # (paths,) per-period rates, nan: no root
+    rates, changes = irr.batch_irr(cashflows, full_output=True)   # changes > 1: several roots possible
+    annual = irr.batch_xirr(cashflows, times)               # times in years, (periods,) shared by rows
+"""
+import numpy as np
+
+GRID = 48                 # bracketing rates on each side of zero
+MAX_RATE = 100.0          # bracketing covers rates in (-1, MAX_RATE]
+MIN_LOG_GROWTH = -30.0    # and further down to log(1 + r) = -30 (1 + r ~ 1e-13): XIRR annual rates
+
+
+def _npv_slope(flows, rates, times=None):
+    # NPV of each column of a (periods, rows) matrix at its own rate, and dNPV/drate
+    with np.errstate(over='ignore', invalid='ignore'):
+        if times is None:
+            v = 1/(1 + rates)
+            p = flows[-1].copy()
+            d = np.zeros_like(p)
+            for t in range(len(flows) - 2, -1, -1):
+                d *= v; d += p
+                p *= v; p += flows[t]
+            return p, -d*v*v
+        discount = np.exp(-np.multiply.outer(times, np.log1p(rates)))*flows
+        return discount.sum(axis=0), -(times @ discount)/(1 + rates)
+
+def _npv(flows, rates, times=None):
+    return _npv_slope(flows, rates, times)[0]
+
+def sign_changes(cashflows):
+    """(rows,) number of sign changes between successive nonzero cashflows."""
+    s = np.sign(cashflows)
+    last = np.maximum.accumulate(np.where(s != 0, np.arange(s.shape[1]), 0), axis=1)
+    s = np.take_along_axis(s, last, axis=1)
+    return ((s[:, 1:]*s[:, :-1]) < 0).sum(axis=1)
+
+def _newton(flows, guess, tol, max_iter, times):
+    # converged rates of the columns of flows (nan elsewhere)
+    n = flows.shape[1]
+    r = np.full(n, float(guess))
+    out = np.full(n, np.nan)
+    rows = np.arange(n)                       # column of each still-active rate
+    for _ in range(max_iter):
+        if not len(rows):
+            break
+        f, df = _npv_slope(flows, r, times)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new = r - f/df
+        new = np.maximum(new, (r - 1)/2)          # at most halfway to -1
+        done = np.abs(new - r) <= tol*(1 + np.abs(new))
+        ok = np.isfinite(new)
+        out[rows[done & ok]] = new[done & ok]
+        keep = ~done & ok
+        if not keep.all():
+            rows, r, flows = rows[keep], new[keep], flows[:, keep]
+        else:
+            r = new
+    return out
+
+def _bisect(flows, lo, hi, tol, times):
+    flo = _npv(flows, lo, times)
+    for _ in range(200):
+        mid = (lo + hi)/2
+        if np.all(hi - lo <= tol*(1 + np.abs(mid))):
+            break
+        fm = _npv(flows, mid, times)
+        left = np.sign(fm) == np.sign(flo)
+        lo, flo = np.where(left, mid, lo), np.where(left, fm, flo)
+        hi = np.where(left, hi, mid)
+    return (lo + hi)/2
+
+def _first_crossing(flows, grid, tol, times):
+    # root in the first grid interval (walking along `grid`) where the NPV changes sign, or nan;
+    # near r = -1 the discount factors overflow and those intervals are skipped
+    n = flows.shape[1]
+    f = np.column_stack([_npv(flows, np.full(n, g), times) for g in grid])
+    finite = np.isfinite(f[:, 1:]) & np.isfinite(f[:, :-1])
+    cross = finite & ((np.sign(f[:, 1:]) != np.sign(f[:, :-1])) | (f[:, :-1] == 0))
+    found = cross.any(axis=1)
+    k = cross.argmax(axis=1)
+    out = np.full(n, np.nan)
+    if found.any():
+        rows = np.flatnonzero(found)
+        a, b = grid[k[rows]], grid[k[rows] + 1]
+        out[rows] = _bisect(flows[:, rows], np.minimum(a, b), np.maximum(a, b), tol, times)
+    return out
+
+def batch_irr(cashflows, guess=0.0, tol=1e-10, max_iter=50, full_output=False, times=None):
+    """(rows,) IRR of each row of a (rows, periods) cashflow matrix: the per-period rate r > -1
+    with sum_t c_t (1+r)^-t = 0 (t = 0, 1, ... or `times`), closest to zero when there are several,
+    nan when there is none. full_output=True also returns each row's number of cashflow sign
+    changes (an upper bound on the number of roots)."""
+    cashflows = np.atleast_2d(np.asarray(cashflows, dtype=float))
+    if times is not None:
+        times = np.asarray(times, dtype=float)
+    changes = sign_changes(cashflows)
+    flows = np.ascontiguousarray(cashflows.T)     # (periods, rows): each period's flows contiguous
+    rates = np.full(len(cashflows), np.nan)
+    single = np.flatnonzero(changes == 1)
+    rates[single] = _newton(flows if len(single) == len(rates) else flows[:, single], guess, tol, max_iter, times)
+    retry = np.flatnonzero((changes > 1) | ((changes == 1) & np.isnan(rates)))
+    if len(retry):
+        up = np.concatenate([[0.0], np.geomspace(1e-4, MAX_RATE, GRID)])
+        # per-period roots near -1 are far closer to -1 as annual (XIRR) rates: past 1 - 1e-6 the
+        # grid continues in log(1 + r)
+        down = np.concatenate([[0.0], -np.geomspace(1e-4, 1 - 1e-6, GRID),
+                               np.expm1(np.linspace(np.log(1e-6), MIN_LOG_GROWTH, GRID//4)[1:])])
+        pos = _first_crossing(flows[:, retry], up, tol, times)
+        neg = _first_crossing(flows[:, retry], down, tol, times)
+        rates[retry] = np.where(np.isnan(pos) | (np.abs(neg) < np.abs(pos)), neg, pos)
+        if times is None:
+            # roots the grid cannot separate (pairs within one interval, or past the overflow near
+            # r = -1): the polynomial roots of those few rows, as npf.irr
+            for i in retry[np.isnan(rates[retry])]:
+                v = np.roots(cashflows[i, ::-1])
+                v = v[(v.imag == 0) & (v.real > 0)].real
+                if len(v):
+                    rates[i] = (1/v - 1)[np.argmin(np.abs(1/v - 1))]
+    return (rates, changes) if full_output else rates
+
+def batch_xirr(cashflows, times, guess=0.1, tol=1e-10, max_iter=50, full_output=False):
+    """Annual IRR of each row with cashflows at `times` (years from the first flow, shared by
+    every row), e.g. times = np.arange(periods)/4 for quarterly flows."""
+    return batch_irr(cashflows, guess, tol, max_iter, full_output, times)
@@ -0,0 +1,283 @@
+"""
+Asynchronous job server for long calculator runs.
+
+optimise.py (Nelder-Mead over full calibrations) and relations.py (a 5x5 grid of calibrated
+runs) take minutes; run inline they hold a web request thread the whole time and report progress
+only as stderr prints. Here they are jobs: submitted over a Unix socket, queued by priority class,
+run in child processes forked from a server that has already imported the engines
+(calc_worker.preload), and streamed back as structured events while they run.
+
+  priority   'interactive' jobs (single pyrainy / book runs) always start before queued 'batch'
+             jobs, and batch jobs never take the last slot, so an interactive run never waits
+             behind optimisations (with a single slot, batch jobs use it)
+  progress   scripts call utils.progress(**event) (optimise: evaluations and best objective so far;
+             relations: grid cells done and each finished cell); watchers get each event and
+             status reports the latest as the job's partial result
+  cancel     drops a queued job, or kills a running job's process
+  cache      a request result_cache has seen is done on submit; finished runs are stored there
+
+Protocol: one JSON object per line each way.
+
+    {"op": "submit", "kind": "optimise", "input": {...}, "priority": "batch", "watch": false}
+        -> {"job": "j1", "state": "queued", "cached": false, "position": 0}
+           (watch=true: then the job's events, as watch)
+    {"op": "watch", "job": "j1"}   -> {"job", "event": "progress", ...} ... {"job", "event": "done",
+                                      "state": "done" | "failed" | "cancelled", "result" | "error"}
+    {"op": "status", "job": "j1"}  -> {"job", "state", "kind", "priority", "partial", "result", ...}
+    {"op": "cancel", "job": "j1"}  -> {"job", "state": "cancelled"}
+    {"op": "list"}                 -> {"jobs": [status without results, ...]}
+
+    python3 job_server.py --socket /tmp/calc-jobs.sock [--slots N]
+"""
+import argparse
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import calc_worker
+import result_cache
+
+KINDS = result_cache.SCRIPTS
+PRIORITIES = {'interactive': 0, 'batch': 1}
+TERMINAL = ('done', 'failed', 'cancelled')
+MAX_FINISHED = 200        # finished jobs kept for status / watch
+
+
+def _json(obj):
+    # numpy scalars and arrays in progress events and results
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"not JSON serialisable: {type(obj).__name__}")
+
+
+def _child(kind, input, conn):
+    # job process: run the script as calc_worker would, with progress events sent up the pipe
+    import utils
+    utils.PROGRESS_HOOK = lambda event: conn.send(('progress', event))
+    source, filename = calc_worker.request_source({'file': KINDS[kind]})
+    output, error = calc_worker.run_script(source, filename, json.dumps(input))
+    line = result_cache.json_line(output)
+    if error is None and line is not None:
+        conn.send(('result', line))
+    else:
+        conn.send(('error', error or 'no JSON output', output[-4000:]))
+    conn.close()
+
+
+class Job:
+    def __init__(self, seq, kind, input, priority):
+        self.id = f'j{seq}'
+        self.seq = seq
+        self.kind = kind
+        self.input = input
+        self.priority = priority
+        self.state = 'queued'
+        self.partial = None         # latest progress event
+        self.result = None
+        self.error = None
+        self.output = None          # tail of the script's output when it failed
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.process = None
+        self.cached = False         # answered from result_cache without running
+        self.watchers = []          # asyncio.Queue per watching connection
+
+    def status(self, full=True):
+        status = dict(job=self.id, state=self.state, kind=self.kind, priority=self.priority,
+                      cached=self.cached, partial=self.partial, submitted=self.submitted, started=self.started,
+                      finished=self.finished)
+        if full:
+            status.update(result=self.result, error=self.error, output=self.output)
+        return status
+
+    def publish(self, event):
+        for queue in self.watchers:
+            queue.put_nowait(event)
+
+
+class JobServer:
+    def __init__(self, slots=None):
+        self.slots = slots or os.cpu_count() or 1
+        self.batch_slots = max(1, self.slots - 1)
+        self.jobs = {}
+        self.queue = []             # heap of (priority, seq, job id)
+        self.running = set()
+        self.ids = itertools.count(1)
+        self.context = multiprocessing.get_context(
+            'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+
+    # -- jobs
+
+    def submit(self, kind, input, priority='batch'):
+        if kind not in KINDS:
+            raise ValueError(f"unknown job kind {kind!r} (use one of {sorted(KINDS)})")
+        if priority not in PRIORITIES:
+            raise ValueError(f"unknown priority {priority!r} (use one of {sorted(PRIORITIES)})")
+        seq = next(self.ids)
+        job = Job(seq, kind, input, priority)
+        self.jobs[job.id] = job
+        stored = result_cache.lookup(kind, input)
+        if stored is not None:
+            job.cached = True
+            self._finish(job, 'done', result=json.loads(stored))
+            return job
+        heapq.heappush(self.queue, self._entry(job))
+        self._dispatch()
+        return job
+
+    @staticmethod
+    def _entry(job):
+        return (PRIORITIES[job.priority], job.seq, job.id)
+
+    def position(self, job):
+        """Queued jobs that start before this queued job."""
+        return sum(1 for entry in self.queue if entry < self._entry(job))
+
+    def cancel(self, job):
+        if job.state == 'queued':
+            self.queue.remove(self._entry(job))
+            heapq.heapify(self.queue)
+            self._finish(job, 'cancelled')
+        elif job.state == 'running':
+            job.state = 'cancelling'
+            job.process.kill()      # the pipe closes and _collect finishes the job
+        return job
+
+    def _batch_running(self):
+        return sum(1 for id in self.running if self.jobs[id].priority != 'interactive')
+
+    def _dispatch(self):
+        while self.queue and len(self.running) < self.slots:
+            priority, seq, id = self.queue[0]
+            if self.jobs[id].priority != 'interactive' and self._batch_running() >= self.batch_slots:
+                break               # the remaining queue is batch: the last slot stays free
+            heapq.heappop(self.queue)
+            self._start(self.jobs[id])
+
+    def _start(self, job):
+        receive, send = self.context.Pipe(duplex=False)
+        job.process = self.context.Process(target=_child, args=(job.kind, job.input, send), daemon=True)
+        job.process.start()
+        send.close()
+        job.state, job.started = 'running', time.time()
+        self.running.add(job.id)
+        job.publish(dict(job=job.id, event='state', state='running'))
+        asyncio.get_running_loop().add_reader(receive.fileno(), self._collect, job, receive)
+
+    def _collect(self, job, conn):
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            conn.close()
+            job.process.join()
+            if job.state == 'cancelling':
+                self._finish(job, 'cancelled')
+            elif job.state == 'running':
+                self._finish(job, 'failed', error=f"job process exited ({job.process.exitcode})")
+            return
+        if message[0] == 'progress':
+            job.partial = message[1]
+            job.publish(dict(message[1], job=job.id, event='progress'))
+        elif message[0] == 'result':
+            result_cache.store(job.kind, job.input, message[1])
+            self._finish(job, 'done', result=json.loads(message[1]))
+        else:
+            self._finish(job, 'failed', error=message[1], output=message[2])
+
+    def _finish(self, job, state, result=None, error=None, output=None):
+        job.state, job.finished = state, time.time()
+        job.result, job.error, job.output = result, error, output
+        self.running.discard(job.id)
+        event = dict(job=job.id, event='done', state=state)
+        event.update({'result': result} if state == 'done' else {'error': error})
+        job.publish(event)
+        finished = [j for j in self.jobs.values() if j.state in TERMINAL]
+        for old in finished[:-MAX_FINISHED]:
+            del self.jobs[old.id]
+        self._dispatch()
+
+    # -- connections
+
+    async def _watch(self, job, writer):
+        if job.state in TERMINAL:
+            event = dict(job=job.id, event='done', state=job.state)
+            event.update({'result': job.result} if job.state == 'done' else {'error': job.error})
+            await self._send(writer, event)
+            return
+        queue = asyncio.Queue()
+        job.watchers.append(queue)
+        try:
+            if job.partial is not None:
+                await self._send(writer, dict(job.partial, job=job.id, event='progress'))
+            while True:
+                event = await queue.get()
+                await self._send(writer, event)
+                if event['event'] == 'done':
+                    break
+        finally:
+            job.watchers.remove(queue)
+
+    async def _send(self, writer, message):
+        writer.write((json.dumps(message, default=_json) + '\n').encode())
+        await writer.drain()
+
+    async def _handle(self, request, writer):
+        op = request.get('op')
+        if op == 'submit':
+            job = self.submit(request['kind'], request.get('input', {}), request.get('priority', 'batch'))
+            await self._send(writer, dict(job=job.id, state=job.state, cached=job.cached,
+                                          position=self.position(job) if job.state == 'queued' else 0))
+            if request.get('watch'):
+                await self._watch(job, writer)
+        elif op == 'list':
+            await self._send(writer, dict(jobs=[j.status(full=False) for j in self.jobs.values()]))
+        elif op in ('watch', 'status', 'cancel'):
+            job = self.jobs.get(request.get('job'))
+            if job is None:
+                raise ValueError(f"unknown job {request.get('job')!r}")
+            if op == 'watch':
+                await self._watch(job, writer)
+            elif op == 'status':
+                await self._send(writer, job.status())
+            else:
+                await self._send(writer, dict(job=job.id, state=self.cancel(job).state))
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+    async def connection(self, reader, writer):
+        with contextlib.closing(writer):
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    await self._handle(json.loads(line), writer)
+                except (ValueError, KeyError) as e:
+                    await self._send(writer, dict(error=str(e)))
+                except ConnectionError:
+                    break
+
+    async def serve(self, path):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.connection, path, limit=2**26)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--socket', default='/tmp/calc-jobs.sock')
+    parser.add_argument('--slots', type=int, help='concurrent jobs (default: CPUs)')
+    args = parser.parse_args(argv)
+    calc_worker.preload()
+    asyncio.run(JobServer(args.slots).serve(args.socket))
+
+
+if __name__ == '__main__':
+    main()
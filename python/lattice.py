@@ -0,0 +1,324 @@
+"""
+Precomputed calculator outputs on the slider lattice.
+
+index.html's inputs move in fixed steps (house_value 1,000, annual_income 500, equity_return 0.25,
+the holiday fractions 0.05, ...) and most requests sit at or near the form defaults. `lattice.py
+build` runs pyrainy.py over a grid of slider positions around a base input, in parallel, and keeps
+the outputs as one indexed store: the grid's axes, each node's numeric output values as a row of a
+(nodes, values) float64 array (memory-mapped, so a lookup reads one row), its strings (the formatted
+headline table) as a row of a unicode array, and the output's shape once.
+
+A request whose other inputs equal the base and whose grid inputs all sit on nodes is answered from
+its node, as pyrainy.py printed it plus "lattice": {"interpolated": false, "nodes": 1}. With
+"lattice_interpolate": true, a request between nodes is answered by multilinear interpolation of the
+nodes around it ("interpolated": true): numbers are blended, formatted amounts in the headline table
+are re-rendered from the blend, other strings are the nearest node's. Anything else - an input off
+the grid, a failed node, or a lattice built by another engine version (result_cache.engine_version)
+- is left to a live run.
+
+    import lattice
+    output = lattice.lookup('pyrainy', input)        # JSON line, or None
+
+    python3 lattice.py build pyrainy [--base input.json] [--axis house_value=1400000:1600000:50000 ...]
+                                     [--workers N]
+    python3 lattice.py pyrainy < input.json          # the stored answer, or exit status 1
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import time
+import numpy as np
+
+import result_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(HERE, 'lattice')
+
+# index.html's form defaults
+BASE = {
+    'pyrainy': dict(house_value=1500000, loan_duration=30, annuity_duration=10, loan_type='Interest only',
+                    principal_repayment=False, loan_to_value=80, annual_income=30000, at_risk_captital_fraction=0,
+                    equity_return=10.8, volatility=15, total_paths=1000, random_seed=0, cash_rate=3.85,
+                    insurer_profit_margin=50, hedged=False, hedging_cost_pa=0.5, hedging_max_loss=10, hedging_cap=20,
+                    wholesale_lending_margin=2, additional_loan_margins=1.25, holiday_enter_fraction=0.9,
+                    holiday_exit_fraction=1.458, subperform_loan_threshold_quarters=12, max_superpay_factor=1.261,
+                    superpay_start_factor=1.5, enable_pool=False, path_table_type='Mean'),
+}
+# (first, last, step) of each grid input around the base: steps are multiples of the slider steps
+AXES = {
+    'pyrainy': dict(house_value=(1300000, 1700000, 50000), annual_income=(25000, 35000, 2500),
+                    equity_return=(10.3, 11.3, 0.25), volatility=(13, 17, 1)),
+}
+# inputs pyrainy.py reads with input.get(): a request that leaves them out is the same request
+OPTIONAL = {
+    'pyrainy': dict(annual_house_price_appreciation=4, insurer_profit_margin=50.0, hedging_max_loss=10,
+                    hedging_cap=20, hedging_cost_pa=1.4, incremental=False, chart_max_points=200, raw_paths=False,
+                    lazy_tables=False),
+}
+CONTROLS = ('lattice_interpolate',)      # lookup options, not calculator inputs
+TOLERANCE = 1e-9                          # in steps: how close to a node counts as on it
+
+_stores = {}                              # store path -> (mtime_ns, Lattice)
+
+
+class Lattice:
+    """One kind's stored grid: meta (kind, engine_version, base, axes, shapes) and the node arrays."""
+
+    def __init__(self, meta, numbers, strings, shape):
+        self.meta, self.numbers, self.strings, self.shape = meta, numbers, strings, shape
+        self.axes = {name: tuple(spec) for name, spec in meta['axes'].items()}
+        self.sizes = tuple(_size(spec) for spec in self.axes.values())
+
+    def rest(self, input):
+        """input without its grid inputs, lookup options and defaulted optional inputs."""
+        optional = OPTIONAL.get(self.meta['kind'], {})
+        return {k: v for k, v in input.items()
+                if k not in self.axes and k not in CONTROLS and not (k in optional and v == optional[k])}
+
+    def corners(self, input, interpolate=False):
+        """[(node index, weight)] of the nodes input is answered from, or None when it is off the grid."""
+        per_axis = []
+        for name, (first, last, step) in self.axes.items():
+            value = input.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return None
+            position = (value - first)/step
+            k = round(position)
+            if abs(position - k) <= TOLERANCE and 0 <= k < _size((first, last, step)):
+                per_axis.append([(k, 1.0)])
+            elif interpolate and 0 <= position <= _size((first, last, step)) - 1:
+                k = math.floor(position)
+                per_axis.append([(k, 1 - (position - k)), (k + 1, position - k)])
+            else:
+                return None
+        corners = []
+        for combo in itertools.product(*per_axis):
+            index = int(np.ravel_multi_index([k for k, _ in combo], self.sizes))
+            corners.append((index, math.prod(w for _, w in combo)))
+        return corners
+
+    def answer(self, corners):
+        """Output dict of the blend of the corner nodes, or None if one failed or their shapes differ."""
+        shapes = {int(self.shape[i]) for i, _ in corners}
+        if len(shapes) != 1 or -1 in shapes:
+            return None
+        shape = self.meta['shapes'][shapes.pop()]
+        if len(corners) == 1:
+            i = corners[0][0]
+            return _fill(shape, iter(self.numbers[i].tolist()), iter(self.strings[i].tolist()))
+        rows, weights = [i for i, _ in corners], np.array([w for _, w in corners])
+        numbers = weights @ np.asarray(self.numbers[rows])
+        nearest = rows[int(np.argmax(weights))]
+        bools = iter(self.numbers[nearest].tolist())
+        strings = [_blend_strings(column, weights) for column in zip(*self.strings[rows].tolist())]
+        return _fill(shape, iter(numbers.tolist()), iter(strings), bools)
+
+
+def _size(spec):
+    first, last, step = spec
+    return int(round((last - first)/step)) + 1
+
+
+def _values(spec):
+    first, _, step = spec
+    return [round(first + k*step, 10) for k in range(_size(spec))]
+
+
+def _flatten(value, numbers, strings):
+    # value's shape with its leaves taken out in order: numbers (and bools) into numbers as floats,
+    # strings into strings; leaves become 'f', 'i', 'b' or 's', None stays
+    if isinstance(value, dict):
+        return {k: _flatten(v, numbers, strings) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_flatten(v, numbers, strings) for v in value]
+    if isinstance(value, str):
+        strings.append(value)
+        return 's'
+    if isinstance(value, (bool, int, float)):
+        numbers.append(float(value))
+        return 'b' if isinstance(value, bool) else 'i' if isinstance(value, int) else 'f'
+    return value
+
+
+def _fill(shape, numbers, strings, bools=None):
+    # _flatten undone; interpolated answers take ints rounded and bools from the nearest node
+    if isinstance(shape, dict):
+        return {k: _fill(v, numbers, strings, bools) for k, v in shape.items()}
+    if isinstance(shape, list):
+        return [_fill(v, numbers, strings, bools) for v in shape]
+    if shape in ('f', 'i', 'b'):
+        value = next(numbers)
+        if bools is not None:
+            flag = next(bools)
+            if shape == 'b':
+                return bool(flag)
+        return value if shape == 'f' else bool(value) if shape == 'b' else int(round(value))
+    if shape == 's':
+        return next(strings)
+    return shape
+
+
+_AMOUNT = re.compile(r'^(\$?)(-?)(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?(%?)$')     # utils.dollar / pcnt
+
+
+def _blend_strings(values, weights):
+    # one string leaf across the corners: unchanged when they agree, a re-rendered blend of formatted
+    # amounts ($1,234 / -2,102 / 7.9%), else the nearest corner's
+    if all(v == values[0] for v in values):
+        return values[0]
+    parsed = [_AMOUNT.match(v) for v in values]
+    if all(parsed) and len({(m.group(1), m.group(5)) for m in parsed}) == 1:
+        amounts = [float(f"{m.group(2)}{m.group(3).replace(',', '')}.{m.group(4) or 0}") for m in parsed]
+        decimals = max(len(m.group(4) or '') for m in parsed)
+        commas = ',' if any(',' in m.group(3) for m in parsed) else ''
+        x = round(float(np.dot(weights, amounts)), decimals)
+        sign = '-' if x < 0 else ''
+        return f"{parsed[0].group(1)}{sign}{abs(x):{commas}.{decimals}f}{parsed[0].group(5)}"
+    return values[int(np.argmax(weights))]
+
+
+def _store_path(kind, store_dir):
+    return os.path.join(store_dir, kind)
+
+
+def load(kind, store_dir=STORE_DIR):
+    """The kind's Lattice, or None if none has been built (or it is unreadable)."""
+    path = _store_path(kind, store_dir)
+    try:
+        mtime = os.stat(os.path.join(path, 'meta.json')).st_mtime_ns
+    except OSError:
+        return None
+    cached = _stores.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in ('numbers', 'strings', 'shape')]
+    except (OSError, ValueError):
+        return None
+    lattice = Lattice(meta, *arrays)
+    _stores[path] = (mtime, lattice)
+    return lattice
+
+
+def lookup(kind, input, store_dir=STORE_DIR):
+    """The kind's JSON output line for input from its lattice, or None: no current lattice, inputs
+    besides the grid's differ from its base, or input is off the grid (between nodes without
+    lattice_interpolate)."""
+    lattice = load(kind, store_dir)
+    if lattice is None or lattice.meta['engine_version'] != result_cache.engine_version(kind):
+        return None
+    if lattice.rest(input) != lattice.rest(lattice.meta['base']):
+        return None
+    corners = lattice.corners(input, bool(input.get('lattice_interpolate', False)))
+    output = None if corners is None else lattice.answer(corners)
+    if output is None:
+        return None
+    output['lattice'] = dict(interpolated=len(corners) > 1, nodes=len(corners))
+    return json.dumps(output)
+
+
+def _evaluate(job):
+    # one node in a pool process (calc_worker.preload ran once per process): (index, output or None)
+    import calc_worker
+    index, kind, input = job
+    source, filename = calc_worker.request_source({'file': result_cache.SCRIPTS[kind]})
+    printed, error = calc_worker.run_script(source, filename, json.dumps(input))
+    line = result_cache.json_line(printed)
+    return index, None if error is not None or line is None else json.loads(line)
+
+
+def _preload():
+    import calc_worker
+    calc_worker.preload()
+
+
+def build(kind, base=None, axes=None, workers=None, store_dir=STORE_DIR, log=sys.stderr):
+    """Run the kind's script on every node of the grid and replace its stored lattice; returns the
+    number of nodes that failed."""
+    base = dict(BASE[kind] if base is None else base)
+    axes = dict(AXES[kind] if axes is None else axes)
+    grid = list(itertools.product(*(_values(spec) for spec in axes.values())))
+    jobs = [(i, kind, dict(base, **dict(zip(axes, node)))) for i, node in enumerate(grid)]
+    version = result_cache.engine_version(kind)
+    start = time.perf_counter()
+    shapes, shape_ids, rows = [], np.full(len(grid), -1, np.int16), [None]*len(grid)
+    context = multiprocessing.get_context('fork')
+    with context.Pool(workers or os.cpu_count() or 1, initializer=_preload) as pool:
+        for done, (i, output) in enumerate(pool.imap_unordered(_evaluate, jobs), 1):
+            if output is not None:
+                output.pop('lattice', None)
+                numbers, strings = [], []
+                shape = _flatten(output, numbers, strings)
+                if shape not in shapes:
+                    shapes.append(shape)
+                shape_ids[i], rows[i] = shapes.index(shape), (numbers, strings)
+            if log is not None and (done % 25 == 0 or done == len(jobs)):
+                print(f"lattice {kind}: {done}/{len(jobs)} nodes, {time.perf_counter() - start:.0f}s", file=log)
+    n_numbers = max((len(r[0]) for r in rows if r is not None), default=0)
+    n_strings = max((len(r[1]) for r in rows if r is not None), default=0)
+    numbers = np.full((len(grid), n_numbers), np.nan)
+    strings = np.full((len(grid), n_strings), '', dtype=f'<U{max((len(s) for r in rows if r for s in r[1]), default=1)}')
+    for i, row in enumerate(rows):
+        if row is not None:
+            numbers[i, :len(row[0])] = row[0]
+            strings[i, :len(row[1])] = row[1]
+    meta = dict(kind=kind, engine_version=version, base=base, axes={k: list(v) for k, v in axes.items()},
+                shapes=shapes, nodes=len(grid), failed=int((shape_ids < 0).sum()),
+                seconds=round(time.perf_counter() - start, 1))
+    path = _store_path(kind, store_dir)
+    tmp = f'{path}.{os.getpid()}'
+    os.makedirs(tmp)
+    for name, array in (('numbers', numbers), ('strings', strings), ('shape', shape_ids)):
+        np.save(os.path.join(tmp, f'{name}.npy'), array)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        os.replace(path, f'{tmp}.old')
+    os.replace(tmp, path)
+    shutil.rmtree(f'{tmp}.old', ignore_errors=True)
+    return meta['failed']
+
+
+def _axis(text):
+    name, _, spec = text.partition('=')
+    try:
+        first, last, step = (float(v) if '.' in v or 'e' in v else int(v) for v in spec.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text!r}: use name=first:last:step") from None
+    if step <= 0 or last < first:
+        raise argparse.ArgumentTypeError(f"{text!r}: use name=first:last:step")
+    return name, (first, last, step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('command', nargs='?', choices=('build',))
+    parser.add_argument('kind', choices=sorted(BASE))
+    parser.add_argument('--base', help='base input JSON file (default: the form defaults)')
+    parser.add_argument('--axis', type=_axis, action='append', help='grid input name=first:last:step (repeatable)')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        base = None
+        if args.base:
+            with open(args.base) as f:
+                base = json.load(f)
+        failed = build(args.kind, base, dict(args.axis) if args.axis else None, args.workers)
+        sys.exit(1 if failed else 0)
+    output = lookup(args.kind, json.loads(sys.stdin.read() or '{}'))
+    if output is None:
+        sys.exit(1)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Historical market series shared by the calculator scripts.
+
+Every calculator run parsed sp500tr.csv and FEDFUNDS2.csv again. The frames are read once per
+process here; in a long-lived calc_worker that is once per worker. Callers get a copy, so a
+script that edits its frame does not change the next run's data.
+
+    import market_data
+    sp500df = market_data.sp500()          # as pd.read_csv('sp500tr.csv', thousands=',')
+    fedfunds = market_data.fedfunds()      # as pd.read_csv('FEDFUNDS2.csv')
+"""
+import os
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FILES = {
+    'sp500': ('sp500tr.csv', dict(thousands=',')),
+    'fedfunds': ('FEDFUNDS2.csv', {}),
+}
+
+_FRAMES = {}
+
+
+def _frame(name):
+    if name not in _FRAMES:
+        filename, options = FILES[name]
+        _FRAMES[name] = pd.read_csv(os.path.join(HERE, filename), **options)
+    return _FRAMES[name].copy()
+
+
+def sp500():
+    """S&P 500 total return index, monthly (newest first), as the scripts read it."""
+    return _frame('sp500')
+
+
+def fedfunds():
+    """Effective federal funds rate in percent, monthly from February 1988."""
+    return _frame('fedfunds')
+
+
+def preload():
+    """Read every series now (calc_worker start-up)."""
+    for name in FILES:
+        _frame(name)
@@ -0,0 +1,197 @@
+"""
+The Rails Monte Carlo calculator, as an importable entry point.
+
+PythonMonteCarloService used to interpolate its parameters into a Python script per request and
+run that source (written to python/ruby_monte_carlo_<ts>_<rand>.py when it fell back to python3):
+every request compiled a fresh module and a fallback wrote and deleted a file on the hot path. Here
+the same calculation is one module, imported (and its bytecode cached) once, called with the
+service's parameters:
+
+    import monte_carlo
+    result = monte_carlo.run({'house_value': 1500000.0, 'loan_duration': 30, ...})
+      -> {'total_paths', 'run_id', 'mean_final_reinvestment', ..., 'charts', 'mean_path_data', ...}
+
+    python3 monte_carlo.py < params.json           # the result as one JSON line; progress on stderr
+
+Parameters are the service's, already converted (rates and loan_to_value as fractions); the output
+is the schema the generated script printed. calc_worker serves it as {"op": "call", "module":
+"monte_carlo", "params": {...}}.
+"""
+import json
+import sys
+import time
+import numpy as np
+
+from core_model import gen_observation_paths, observation_schedule, OBSERVATION_DT
+from engine import single_mortgage  # fastest available backend for the path count and features
+import chart_data
+import drilldown
+import period_stats
+
+DEFAULTS = dict(loan_type='Interest only', total_paths=1000, time_budget_ms=None, random_seed=0,
+                insurer_profit_margin=0.5, hedged=False, raw_paths=False, chart_max_points=200,
+                lazy_tables=False, columnar_path=None, columnar_float32=True)
+SUPERPAY_START_FACTOR = 1.0
+MAX_SUPERPAY_FACTOR = 1.0
+YEAR0 = 2000
+S0 = 100.0
+
+
+def _log(log, message):
+    if log is not None:
+        print(message, file=log)
+
+
+def run(params, log=None):
+    """The Monte Carlo result for the service's params; progress lines go to log when given.
+    With columnar_path and raw_paths the per-path series (all_*) are written there as typed binary
+    columns and the result keeps their manifest (columnar.py); otherwise columnar_path is unused."""
+    p = dict(DEFAULTS, **params)
+    loan_duration, annuity_duration = p['loan_duration'], p['annuity_duration']
+    annual_income = p['annual_income']
+    total_loan = p['house_value']*p['loan_to_value']
+    reinvest_fraction = 1 - (annuity_duration*annual_income)/total_loan
+    insurance_profit_margin = 1.0 + p['insurer_profit_margin']
+    hedged = p['hedged']
+    principal_and_interest = p['loan_type'] != 'Interest only'
+
+    total_paths = p['total_paths']
+    path_budget = None
+    if p['time_budget_ms']:
+        from cost_model import plan
+        try:
+            path_budget = plan(p['time_budget_ms'], loan_duration*4 + 1, hedged=hedged, pi=principal_and_interest)
+            total_paths = path_budget['n_paths']
+        except FileNotFoundError as e:
+            _log(log, f"{e}: running the requested {total_paths} paths")
+
+    dt = 1.0/12
+    n_steps = loan_duration*12
+
+    # only the prices single_mortgage reads at this dt are simulated, one normal each (the same GBM
+    # distribution as the full 1/120 grid); they are then read with OBSERVATION_DT. Paths are
+    # per-block child streams of the seed, independent of chunking
+    start_time = time.time()
+    price_paths = gen_observation_paths(loan_duration, p['equity_return'], p['volatility'], total_paths, S0,
+                                        schedule=observation_schedule(loan_duration, dt), seed=p['random_seed'])
+    path_generation_time = time.time() - start_time
+    _log(log, f"Generated {total_paths} paths in {path_generation_time:.3f} seconds")
+
+    insurance_cost = p['insurance_cost_pa']*total_loan*loan_duration
+
+    _log(log, f"Running Monte Carlo simulation with {total_paths} paths...")
+    start_time = time.time()
+    cube = single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+                           insurance_profit_margin, insurance_cost,
+                           [p['cash_rate']]*n_steps, p['wholesale_lending_margin'], p['additional_loan_margins'],
+                           p['holiday_enter_fraction'], p['holiday_exit_fraction'],
+                           p['subperform_loan_threshold_quarters'],
+                           price_paths, S0, OBSERVATION_DT, YEAR0 - 1, MAX_SUPERPAY_FACTOR, SUPERPAY_START_FACTOR,
+                           False, 0, None, principal_and_interest, hedged, p['hedging_max_loss'], p['hedging_cap'],
+                           p['hedging_cost_pa'], as_cube=True)
+    simulation_time = time.time() - start_time
+    _log(log, f"Simulation completed in {simulation_time:.3f} seconds")
+
+    # per-path series straight off the run's (paths, periods) arrays
+    max_period = loan_duration*4 - 1  # final reinvestment is read at this period (else the last)
+    final_column = np.flatnonzero(cube['Period'][0] == max_period)
+    final_values = cube['Reinvestment'][:, final_column[0] if len(final_column) else -1].tolist()
+
+    chart_series = {
+        'reinvestment': cube['Reinvestment'],
+        'sp500': cube['SP500'],
+        'loan': cube['Loan size'],
+        'interest_deficit': cube['InterestDeficit'],
+        'capital_deficit': cube['CapitalDeficit'],
+        'surplus': cube['Surplus'],
+        'units': cube['Units'],
+        'cumulative_annuity': np.cumsum(cube['AnnuityIncome'], axis=1),
+        'cumulative_interest_paid': cube['CumInterestPaid'],
+        'pooled_units': cube['CumUnitsToPool'],
+        'hedged_units': cube['HedgeUnitsDelta'],
+    }
+
+    # lazy_tables: the run stays server-side for on-demand path ledgers (drilldown.py) instead of the
+    # first few paths in full, which are then sent only with raw_paths
+    run_id = drilldown.retain(cube) if p['lazy_tables'] else None
+    raw_paths = p['raw_paths']
+    sample_paths = [{'path_id': int(path_id), 'pathdf': cube.path_frame(path_id).to_dict('list')}
+                    for path_id in cube.path_ids[:5]] if raw_paths or run_id is None else []
+    _log(log, f"Final values extracted: {len(final_values)} values")
+
+    # chart-ready aggregates: per-series fan bands and representative paths (LTTB-downsampled to
+    # chart_max_points), full-resolution mean paths, and the risk figures the page shows
+    charts = chart_data.aggregate(chart_series, terminal=final_values, max_points=p['chart_max_points'])
+    charts['mean_paths'] = {name: np.mean(paths, axis=0).tolist() if len(paths) else []
+                            for name, paths in chart_series.items()}
+    reinvestment_paths = np.asarray(chart_series['reinvestment'], dtype=float)
+    if reinvestment_paths.ndim == 2 and reinvestment_paths.shape[1] > 1:
+        initial, final = reinvestment_paths[:, 0], reinvestment_paths[:, -1]
+        returns = np.where(initial > 0, (final - initial)/np.where(initial > 0, initial, 1)*100, 0)
+        charts['return_histogram'] = chart_data.histogram(returns, edges=[-np.inf, -20, -10, 0, 10, 20, 30, np.inf])
+        charts['risk'] = {
+            'loss_probability': float(np.mean(final < initial)),
+            'var_5': float(np.sort(final)[int(len(final)*0.05)]),
+        }
+
+    # mean, median and percentile rows per period: one array reduction over every field
+    path_stats = period_stats.path_data(cube)
+    _log(log, f"Mean path data calculated: {len(path_stats['mean_path_data'])} periods")
+
+    percentiles = np.percentile(final_values, [2, 25, 50, 75, 98])
+    output = {
+        'total_paths': total_paths,
+        'run_id': run_id,
+        'mean_final_reinvestment': np.mean(final_values),
+        'std_final_reinvestment': np.std(final_values),
+        'standard_error': float(np.std(final_values, ddof=1)/np.sqrt(len(final_values)))
+                          if len(final_values) > 1 else None,
+        'path_budget': path_budget,
+        'percentile_2': percentiles[0],
+        'percentile_25': percentiles[1],
+        'percentile_50': percentiles[2],
+        'percentile_75': percentiles[3],
+        'percentile_98': percentiles[4],
+        'all_final_values': final_values,
+        'charts': charts,
+        'mean_path_data': path_stats['mean_path_data'],
+        'median_path_data': path_stats['median_path_data'],
+        'percentile_2_data': path_stats['percentile_2_data'],
+        'percentile_25_data': path_stats['percentile_25_data'],
+        'percentile_75_data': path_stats['percentile_75_data'],
+        'sample_paths': sample_paths,
+        'path_generation_time': path_generation_time,
+        'simulation_time': simulation_time,
+        'total_execution_time': path_generation_time + simulation_time,
+        'parameters': {name: p[name] for name in ('house_value', 'loan_duration', 'annuity_duration',
+                                                  'loan_to_value', 'annual_income', 'equity_return',
+                                                  'volatility', 'cash_rate')},
+    }
+    output['parameters']['total_paths'] = total_paths
+
+    # the full per-path series (all_paths_chart_data, all_sp500_paths, ...) only when asked for
+    if raw_paths:
+        output.update(('all_paths_chart_data' if name == 'reinvestment' else f'all_{name}_paths', paths.tolist())
+                      for name, paths in chart_series.items())
+
+    # per-path series (all_*) as typed binary columns; the JSON keeps a manifest of them. Without
+    # raw_paths only all_final_values is per path, and a file for one short column costs more than
+    # it saves: the result stays inline
+    if p['columnar_path'] and raw_paths:
+        import columnar
+        output = columnar.detach(output, [k for k in output if k.startswith('all_')], p['columnar_path'],
+                                 float32=p['columnar_float32'])
+    return output
+
+
+def dumps(result):
+    """The result as the JSON line the service parses (the frame is typed, so cells are numpy scalars)."""
+    return json.dumps(result, default=lambda o: o.item())
+
+
+def main():
+    print(dumps(run(json.loads(sys.stdin.read() or '{}'), log=sys.stderr)))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,10 @@ import sys
 import json
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import pprint
-import math
-import numpy_financial as npf
-from scipy.optimize import minimize
 from core_model import single_mortgage, gen_monte_carlo_paths, main_outputs_table
-from utils import mean_sd, dollar, pcntdf, pcnt, secant
+from utils import mean_sd, dollar, pcntdf, pcnt, progress
+import calibration
 
 input = json.loads(sys.stdin.read())
 output = {}
@@ -100,21 +96,24 @@ price_paths = gen_monte_carlo_paths(loan_duration, equity_return, volatility, to
 def get_df_for_hol_params(holiday_enter_fraction, holiday_exit_fraction, max_superpay_factor, superpay_start_factor, annual_income):
   reinvest_fraction = 1-(annuity_duration*annual_income)/total_loan
   repaymemt_amount_max = 0.0 if loan_type == "Principal+Interest"  else annual_income* annuity_duration
-  def simulate_with_insurance(insurance_cost):
+  def simulate_with_insurance(insurance_cost, paths = price_paths, as_cube = False):
     return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                       insurance_profit_margin,insurance_cost,
                       cash_rate,wholesale_lending_margin,additional_loan_margins,
                       holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                      price_paths, S0, dt, 0, max_superpay_factor, superpay_start_factor )
+                      paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, as_cube=as_cube)
     
-  def insurance_deficit(insurance_cost):
-    df = simulate_with_insurance(insurance_cost)
-    dfend = df[df['Period']==loan_duration*4]
-    insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-    #print("insurance deficit", insurance_payout - insurance_cost)
-    return insurance_payout - insurance_cost
-
-  insurance_secant = secant(insurance_deficit,50000,100000,1000)
+  def insurance_deficit(insurance_costs):
+    paths, cost = calibration.tile_paths(price_paths, insurance_costs)
+    dfend = simulate_with_insurance(cost, paths, as_cube=True).at(loan_duration*4)
+    insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+    #print("insurance deficit", insurance_payout - insurance_costs)
+    return insurance_payout - insurance_costs
+
+  insurance_secant = calibration.solve(insurance_deficit,50000,100000,1000,
+    upper=calibration.max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin, cash_rate, loan_duration),
+    key=dict(input, script='optimise', holiday_enter_fraction=holiday_enter_fraction, holiday_exit_fraction=holiday_exit_fraction,
+               max_superpay_factor=max_superpay_factor, superpay_start_factor=superpay_start_factor, annual_income=annual_income))
 
   df = simulate_with_insurance(insurance_secant)
   return (df, insurance_secant)
@@ -127,7 +126,7 @@ insurance_upper_limit = input['insurance_upper_limit']/100
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
-def objective_function(hols):
+def evaluate_objective(hols):
   eprint("Eval objective with hols", hols[0], hols[1])
   try:
     (df, insurance) = get_df_for_hol_params(hols[0], hols[0]+hols[1], hols[2], hols[3], hols[4])
@@ -165,6 +164,19 @@ def objective_function(hols):
     eprint("Exception!")
     return 1000
 
+best = dict(objective=None, x=None)
+evaluations = 0
+
+def objective_function(hols):
+  global evaluations
+  value = evaluate_objective(hols)
+  evaluations += 1
+  if best['objective'] is None or value < best['objective']:
+    best.update(objective=value, x=list(hols))
+  progress(stage='optimise', evaluations=evaluations, maxfev=input['maxfev'], objective=value,
+           best_objective=best['objective'], best_x=best['x'])
+  return value
+
 bounds = [
   (holiday_enter_fraction_from, holiday_enter_fraction_to),
   (holiday_exit_fraction_delta_from, holiday_exit_fraction_delta_to), 
@@ -175,6 +187,7 @@ bounds = [
 
 midbounds = [(lo+hi)/2 for (lo,hi) in bounds]
 
+from scipy.optimize import minimize  # imported here: scipy.optimize alone costs ~0.6s of start-up
 result = minimize(objective_function, midbounds, method='nelder-mead', bounds=bounds, options={
     'maxfev':input["maxfev"],
     #'initial_simplex': [[1.3, 0.4], [1.4, 0.4], [1.3, 0.5]],    
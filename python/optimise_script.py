@@ -9,7 +9,8 @@ import math
 import numpy_financial as npf
 from scipy.optimize import minimize
 from core_model import single_mortgage, gen_monte_carlo_paths, main_outputs_table
-from utils import mean_sd, dollar, pcntdf, pcnt, secant
+from utils import mean_sd, dollar, pcntdf, pcnt
+import calibration
 import random
 
 outfnm = "optim_out.csv"
@@ -136,21 +137,25 @@ for loan_duration in [30,25,20, 15]:
       def get_df_for_hol_params(holiday_enter_fraction, holiday_exit_fraction, max_superpay_factor, superpay_start_factor, annual_income):
         reinvest_fraction = 1-(annuity_duration*annual_income)/total_loan
         repaymemt_amount_max = 0.0 if loan_type == "Principal+Interest"  else annual_income* annuity_duration
-        def simulate_with_insurance(insurance_cost):
+        def simulate_with_insurance(insurance_cost, paths = price_paths, as_cube = False):
           return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                             insurance_profit_margin,insurance_cost,
                             cash_rate,wholesale_lending_margin,additional_loan_margins,
                             holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                            price_paths, S0, dt, 0, max_superpay_factor, superpay_start_factor )
-
-        def insurance_deficit(insurance_cost):
-          df = simulate_with_insurance(insurance_cost)
-          dfend = df[df['Period']==loan_duration*4]
-          insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-          #print("insurance deficit", insurance_payout - insurance_cost)
-          return insurance_payout - insurance_cost
-
-        insurance_secant = secant(insurance_deficit,50000,100000,1000)
+                            paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, as_cube=as_cube)
+
+        def insurance_deficit(insurance_costs):
+          paths, cost = calibration.tile_paths(price_paths, insurance_costs)
+          dfend = simulate_with_insurance(cost, paths, as_cube=True).at(loan_duration*4)
+          insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+          #print("insurance deficit", insurance_payout - insurance_costs)
+          return insurance_payout - insurance_costs
+
+        insurance_secant = calibration.solve(insurance_deficit,50000,100000,1000,
+          upper=calibration.max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin, cash_rate, loan_duration),
+          key=dict(script='optimise_script', loan_duration=loan_duration, annuity_duration=annuity_duration, loan_type=loan_type,
+                   holiday_enter_fraction=holiday_enter_fraction, holiday_exit_fraction=holiday_exit_fraction,
+                   max_superpay_factor=max_superpay_factor, superpay_start_factor=superpay_start_factor, annual_income=annual_income))
 
         df = simulate_with_insurance(insurance_secant)
         return (df, insurance_secant)
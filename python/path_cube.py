@@ -0,0 +1,193 @@
+"""
+PathCube: single_mortgage output as (paths x periods) arrays, one per field.
+
+The long DataFrame (one row per path-quarter) makes every per-path or per-period question a
+scan: df[df['Path']==p] is O(rows) per path and each groupby('Period') re-sorts the frame.
+A cube stores each field as a contiguous (paths, periods) array, so
+
+    cube['Surplus'][p]             one path                       O(1) slice
+    cube.at(t)['Reinvestment']     one period across paths        O(1) slice
+    cube.mean('Units')             per-period means               one reduction
+    cube.quantiles('Reinvestment', [0.02, 0.25, 0.5, 0.75])   per-period bands in one call
+    cube.percentile_path('SP500', 0.25)    path at a rank of the final period (argpartition)
+    cube.to_frame()                the legacy long frame, built on demand
+
+    cube = single_mortgage(..., as_cube=True)     # or PathCube.from_frame(df)
+
+PathSummary keeps what the calculator reports from a cube (per-period sums, every path's final
+values and per-path totals, the first paths' prices) and merges with the summary of further
+paths, so a stored run grows without re-simulating the paths it already has (run_store.py).
+"""
+import numpy as np
+import pandas as pd
+from core_model import COLUMNS
+
+
+def period_mean(values):
+  """Per-period mean of a (paths, periods) array. Summed along contiguous period rows so numpy
+  uses pairwise summation, which tracks groupby('Period').mean() far closer than a column scan."""
+  return np.ascontiguousarray(values.T).mean(axis = 1)
+
+
+class PathCube:
+  def __init__(self, fields, path_ids = None):
+    self.fields = dict(fields)
+    first = next(iter(self.fields.values()))
+    self.n_paths, self.n_periods = first.shape
+    self.path_ids = np.arange(self.n_paths) if path_ids is None else np.asarray(path_ids)
+
+  @classmethod
+  def from_frame(cls, df):
+    """Cube from a long single_mortgage frame (every path has the same periods)."""
+    if not df['Path'].is_monotonic_increasing:
+      df = df.sort_values(['Path', 'Period'], kind = 'stable')
+    path_ids, counts = np.unique(df['Path'].to_numpy(), return_counts = True)
+    if len(counts) == 0 or (counts != counts[0]).any():
+      raise ValueError("every path must have the same number of periods to form a cube")
+    shape = (len(path_ids), int(counts[0]))
+    fields = {name: df[name].to_numpy().reshape(shape) for name in df.columns if name != 'Path'}
+    return cls(fields, path_ids)
+
+  def __getitem__(self, name):
+    return self.fields[name]
+
+  def __contains__(self, name):
+    return name in self.fields
+
+  def path_index(self, pathn):
+    """Row of the cube holding path id `pathn`."""
+    if 0 <= pathn < len(self.path_ids) and self.path_ids[pathn] == pathn:
+      return pathn
+    return int(np.flatnonzero(self.path_ids == pathn)[0])
+
+  def at(self, period = -1):
+    """{field: (paths,) values} at one period (default: the final one)."""
+    return {name: values[:, period] for name, values in self.fields.items()}
+
+  def path(self, pathn):
+    """{field: (periods,) values} of one path id."""
+    i = self.path_index(pathn)
+    return {name: values[i] for name, values in self.fields.items()}
+
+  def mean(self, name):
+    """Per-period mean of a field across paths."""
+    return period_mean(self.fields[name])
+
+  def path_totals(self, name):
+    """(paths,) sum of a field over each path's periods."""
+    return self.fields[name].sum(axis = 1)
+
+  def quantiles(self, name, qs):
+    """(len(qs), periods) per-period quantile bands of a field, in one pass."""
+    return np.quantile(self.fields[name], qs, axis = 0)
+
+  def rank_path(self, name, rank, period = -1):
+    """Path id holding the `rank`-th smallest value of a field at a period (argpartition, no sort)."""
+    values = self.fields[name][:, period]
+    return self.path_ids[np.argpartition(values, rank)[rank]]
+
+  def percentile_path(self, name, q, period = -1):
+    """Path id at quantile q of a field at a period, ranked like sort_values(...).iloc[round(q*n)]."""
+    return self.rank_path(name, round(q*self.n_paths), period)
+
+  def mean_frame(self):
+    """Per-period means of every field, indexed by Period (as df.groupby('Period').mean())."""
+    periods = self.fields['Period'][0] if 'Period' in self.fields else np.arange(self.n_periods)
+    data = {'Path': np.full(self.n_periods, self.path_ids.mean())}
+    data.update((name, period_mean(values)) for name, values in self.fields.items() if name != 'Period')
+    columns = [c for c in COLUMNS if c in data and c != 'Period'] + [c for c in data if c not in COLUMNS]
+    return pd.DataFrame(data, index = pd.Index(periods, name = 'Period'), columns = columns)
+
+  def path_frame(self, pathn):
+    """Legacy long-frame rows of one path id."""
+    i = self.path_index(pathn)
+    data = {'Path': np.full(self.n_periods, self.path_ids[i])}
+    data.update((name, values[i]) for name, values in self.fields.items())
+    columns = [c for c in COLUMNS if c in data] + [c for c in data if c not in COLUMNS]
+    return pd.DataFrame(data, index = np.arange(i*self.n_periods, (i+1)*self.n_periods), columns = columns)
+
+  def to_frame(self):
+    """The legacy long frame (one row per path-period), built on demand."""
+    data = {'Path': np.repeat(self.path_ids, self.n_periods)}
+    data.update((name, values.ravel()) for name, values in self.fields.items())
+    columns = [c for c in COLUMNS if c in data] + [c for c in data if c not in COLUMNS]
+    return pd.DataFrame(data, columns = columns)
+
+
+class PathSummary:
+  """Mergeable per-period sums, final-period values and per-path totals of a run's paths."""
+  TOTALS = ('Prob Holiday',)
+  HEAD = 100                    # paths whose full price series are kept (the calculator's chart)
+
+  def __init__(self, sums, end, totals, head, path_ids):
+    self.sums, self.end, self.totals, self.head = dict(sums), dict(end), dict(totals), dict(head)
+    self.path_ids = np.asarray(path_ids)
+    self.n_paths = len(self.path_ids)
+    self.n_periods = len(next(iter(self.sums.values())))
+
+  @classmethod
+  def from_cube(cls, cube):
+    return cls({name: values.sum(axis = 0) for name, values in cube.fields.items()},
+               cube.at(-1),
+               {name: cube.path_totals(name) for name in cls.TOTALS if name in cube},
+               {'SP500': cube['SP500'][:cls.HEAD]},
+               cube.path_ids)
+
+  def merge(self, other):
+    """Summary of this run's paths followed by other's."""
+    cat = lambda a, b: {name: np.concatenate([a[name], b[name]]) for name in a}
+    return PathSummary({name: self.sums[name] + other.sums[name] for name in self.sums},
+                       cat(self.end, other.end), cat(self.totals, other.totals),
+                       {name: np.concatenate([self.head[name], other.head[name]])[:self.HEAD] for name in self.head},
+                       np.concatenate([self.path_ids, other.path_ids]))
+
+  def __getitem__(self, name):
+    return self.head[name]
+
+  def __contains__(self, name):
+    return name in self.sums
+
+  def path_index(self, pathn):
+    return PathCube.path_index(self, pathn)
+
+  def at(self, period = -1):
+    """{field: (paths,) values} at the final period (the only one kept)."""
+    if period not in (-1, self.n_periods - 1):
+      raise ValueError(f"a PathSummary keeps only the final period ({self.n_periods - 1}), not {period}")
+    return self.end
+
+  def mean(self, name):
+    return self.sums[name]/self.n_paths
+
+  def path_totals(self, name):
+    return self.totals[name]
+
+  def rank_path(self, name, rank, period = -1):
+    values = self.at(period)[name]
+    return self.path_ids[np.argpartition(values, rank)[rank]]
+
+  def percentile_path(self, name, q, period = -1):
+    return self.rank_path(name, round(q*self.n_paths), period)
+
+  def mean_frame(self):
+    periods = self.mean('Period') if 'Period' in self.sums else np.arange(self.n_periods)
+    data = {'Path': np.full(self.n_periods, self.path_ids.mean())}
+    data.update((name, self.mean(name)) for name in self.sums if name != 'Period')
+    columns = [c for c in COLUMNS if c in data and c != 'Period'] + [c for c in data if c not in COLUMNS]
+    return pd.DataFrame(data, index = pd.Index(periods, name = 'Period'), columns = columns)
+
+  def arrays(self):
+    """Flat {key: array} for np.savez."""
+    out = {'path_ids': self.path_ids}
+    for part in ('sums', 'end', 'totals', 'head'):
+      out.update((f'{part}/{name}', values) for name, values in getattr(self, part).items())
+    return out
+
+  @classmethod
+  def from_arrays(cls, arrays):
+    parts = {part: {} for part in ('sums', 'end', 'totals', 'head')}
+    for key in arrays:
+      if '/' in key:
+        part, name = key.split('/', 1)
+        parts[part][name] = arrays[key]
+    return cls(path_ids = arrays['path_ids'], **parts)
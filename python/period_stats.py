@@ -0,0 +1,54 @@
+"""
+Per-period statistics of a Monte Carlo run, as the Rails calculator reads them.
+
+The Rails Monte Carlo template built these by walking every path of the long frame, copying each
+row's fields one path_data.iloc[i][field] at a time into per-period lists, then taking np.mean and
+np.percentile of every list: some 16 pandas scalar reads per path-period. Here they come from the
+(paths, periods) arrays of a PathCube with one reduction per statistic over all fields at once:
+
+    import period_stats
+    stats = period_stats.period_stats(cube)    # {'mean': {field: (periods,)}, 'p2': {...}, ..., 'p98': {...}}
+    output.update(period_stats.path_data(cube, stats))
+      # mean_path_data, median_path_data, percentile_{2,25,75,98}_data: one dict per period
+
+Means are PathCube's pairwise per-period means, equal to np.mean over each period's values.
+"""
+import numpy as np
+from path_cube import period_mean
+
+LABELS = ('Period', 'Year', 'Quarter')     # the same on every path: taken from the first
+FIELDS = ('SP500', 'Interest', 'Loan size', 'Units', 'Reinvestment', 'InterestDeficit', 'CapitalDeficit',
+          'Surplus', 'FunderEarned', 'AnnuityIncome', 'CumInterestPaid', 'CumUnitsToPool', 'HedgeUnitsDelta')
+PERCENTILES = (2, 25, 50, 75, 98)
+BAND_FIELD = 'Reinvestment'                # the field the percentile rows rank
+
+
+def period_stats(cube, fields=FIELDS, percentiles=PERCENTILES):
+    """{'mean': {field: (periods,)}, 'p<q>': {field: (periods,)} per percentile} over the cube's paths."""
+    fields = [f for f in fields if f in cube]
+    stack = np.stack([np.asarray(cube[f], float) for f in fields])      # (fields, paths, periods)
+    bands = np.percentile(stack, percentiles, axis=1)                  # (percentiles, fields, periods)
+    stats = {'mean': {f: period_mean(stack[i]) for i, f in enumerate(fields)}}
+    stats.update((f'p{q:g}', dict(zip(fields, band))) for q, band in zip(percentiles, bands))
+    return stats
+
+
+def _rows(columns):
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(columns[n].tolist() for n in names))]
+
+
+def path_data(cube, stats=None):
+    """The template's per-period rows: mean_path_data has every field's mean; median_path_data and
+    percentile_{2,25,75,98}_data are the BAND_FIELD band - its percentile next to the means of the
+    fields before it, the row layout the Rails path table has always received."""
+    stats = stats or period_stats(cube)
+    labels = {name: cube[name][0] for name in LABELS if name in cube}
+    mean = dict(labels, **stats['mean'])
+    band = list(mean)[:list(mean).index(BAND_FIELD)] if BAND_FIELD in mean else list(mean)
+    output = {'mean_path_data': _rows(mean)}
+    for key, q in (('median_path_data', 'p50'), ('percentile_2_data', 'p2'), ('percentile_25_data', 'p25'),
+                   ('percentile_75_data', 'p75'), ('percentile_98_data', 'p98')):
+        if q in stats and BAND_FIELD in stats[q]:
+            output[key] = _rows(dict({n: mean[n] for n in band}, **{BAND_FIELD: stats[q][BAND_FIELD]}))
+    return output
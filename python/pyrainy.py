@@ -2,13 +2,14 @@ import sys
 import json
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import pprint
-import math
-import numpy_financial as npf
-from core_model import single_mortgage, gen_monte_carlo_paths, main_outputs_table, accounts_table
-from utils import mean_sd, dollar, pcntdf, pcnt, secant
+from core_model import single_mortgage, gen_observation_paths, OBSERVATION_DT, main_outputs_table, accounts_table
+from utils import mean_sd, dollar, pcntdf, pcnt
+from path_cube import PathSummary
+import calibration
+import chart_data
+import drilldown
+import run_store
 
 input = json.loads(sys.stdin.read())
 output = {}
@@ -77,8 +78,6 @@ hedging_max_loss = input.get('hedging_max_loss', 10)/100
 hedging_cap = input.get('hedging_cap', 20)/100
 hedging_cost_pa = input.get('hedging_cost_pa', 1.4)/100
 
-np.random.seed(input['random_seed'])
-
 final_home_value = house_value * pow(1+annual_house_price_appreciation, loan_duration)
 
 at_risk_capital = (final_home_value- house_value)*at_risk_captital_fraction
@@ -91,12 +90,30 @@ borrower_profit_share = 0.3
 
 #annual_income = total_loan * (1-reinvest_fraction) / loan_duration
 repaymemt_amount_max = 0.0 if loan_type == "Principal+Interest"  else annual_income* annuity_duration
-dt = 1.0/120
-
-N = round(loan_duration/dt)
-
-
-price_paths = gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths, S0)
+# only the quarterly prices single_mortgage reads are simulated, one normal each (the same GBM
+# distribution as a 1/120 gen_monte_carlo_paths grid, without drawing its 30 steps a quarter);
+# paths come from per-block streams of the user seed, so they do not depend on chunking
+dt = OBSERVATION_DT
+
+# incremental=True: a stored run with the same inputs and at most total_paths paths is extended
+# with paths first_path.. only, at its calibrated cost (run_store.py)
+incremental = input.get('incremental', False)
+run_key = {k: v for k, v in input.items() if k not in ('path_table_type', 'total_paths', 'incremental')}
+stored = run_store.load(run_key) if incremental else None
+if stored is not None and stored[0].n_paths > total_paths:
+  stored = None
+first_path = 0 if stored is None else stored[0].n_paths
+
+def observation_paths(n_paths, first_path):
+  return gen_observation_paths(loan_duration, equity_return, volatility, n_paths, S0,
+                               seed=input['random_seed'], first_path=first_path)
+
+price_paths = observation_paths(total_paths - first_path, first_path)
+
+# break-even insurance costs are warm-started from earlier runs with nearby inputs
+calibration_key = {k: v for k, v in input.items() if k not in ('path_table_type', 'random_seed')}
+max_insurance_cost = calibration.max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin,
+                                                    cash_rate, loan_duration)
 
 insured_units = 0
 expected_mean_reinvestment = None
@@ -106,100 +123,128 @@ def get_pool_parameters():
   global insurance_secant
   global expected_mean_reinvestment
   global insured_units
-  def simulate_with_insurance1(insurance_cost):
+  def simulate_with_insurance1(insurance_cost, paths = price_paths):
     return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                       insurance_profit_margin,insurance_cost,
                       cash_rate,wholesale_lending_margin,additional_loan_margins,
                       holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                      price_paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, enable_pool, 0, None, principal_repayment)
+                      paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, enable_pool, 0, None, principal_repayment,
+                      as_cube=True)
     
-  def insurance_deficit1(insurance_cost):
-    df = simulate_with_insurance1(insurance_cost)
-    dfend = df[df['Period']==loan_duration*4]
-    insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-    #print("insurance deficit", insurance_payout - insurance_cost)
-    return insurance_payout - insurance_cost
+  def insurance_deficit1(insurance_costs):
+    paths, cost = calibration.tile_paths(price_paths, insurance_costs)
+    dfend = simulate_with_insurance1(cost, paths).at(loan_duration*4)
+    insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+    #print("insurance deficit", insurance_payout - insurance_costs)
+    return insurance_payout - insurance_costs
 
-  insurance_secant1 = secant(insurance_deficit1,10000,50000,250)
+  insurance_secant1 = calibration.solve(insurance_deficit1,10000,50000,250, upper=max_insurance_cost,
+                                        key=dict(calibration_key, stage='pool'))
 
 
-  df = simulate_with_insurance1(insurance_secant1)
+  cube = simulate_with_insurance1(insurance_secant1)
 
-  initial_units = df.at[0, 'Units'].mean()
-  final_units = df.at[len(df.index)-1, 'Units'].mean()
+  initial_units = cube['Units'][0, 0]
+  final_units = cube['Units'][-1, -1]
   insured_units = final_units
   insurance_secant = insurance_secant1
-  mean_reinvest = df.groupby('Period')['Reinvestment'].mean().iloc[:].values
+  mean_reinvest = cube.mean('Reinvestment')
   initial_reinvest = total_loan*reinvest_fraction - insurance_profit_margin*insurance_secant/ pow(1 + cash_rate, loan_duration)
   expected_mean_reinvestment = mean_reinvest/initial_reinvest
 
-def simulate_with_insurance(insurance_cost):
+def simulate_with_insurance(insurance_cost, paths = price_paths):
   return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                     insurance_profit_margin,insurance_cost,
                     cash_rate,wholesale_lending_margin,additional_loan_margins,
                     holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                    price_paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, 
-                    enable_pool,insured_units, expected_mean_reinvestment, principal_repayment, hedged, hedging_max_loss,hedging_cap, hedging_cost_pa )
+                    paths, S0, dt, 0, max_superpay_factor, superpay_start_factor, 
+                    enable_pool,insured_units, expected_mean_reinvestment, principal_repayment, hedged, hedging_max_loss,hedging_cap, hedging_cost_pa,
+                    as_cube=True)
   
-def insurance_deficit(insurance_cost):
-  df = simulate_with_insurance(insurance_cost)
-  dfend = df[df['Period']==loan_duration*4]
-  insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-  #print("insurance deficit", insurance_payout - insurance_cost)
-  return insurance_payout - insurance_cost
-if hedged:
+def insurance_deficit(insurance_costs):
+  paths, cost = calibration.tile_paths(price_paths, insurance_costs)
+  dfend = simulate_with_insurance(cost, paths).at(loan_duration*4)
+  insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+  #print("insurance deficit", insurance_payout - insurance_costs)
+  return insurance_payout - insurance_costs
+if stored is not None:
+  cube, meta = stored
+  insurance_secant, insured_units = meta['insurance_cost'], meta['insured_units']
+  if meta['expected_mean_reinvestment'] is not None:
+    expected_mean_reinvestment = np.array(meta['expected_mean_reinvestment'])
+  if price_paths:
+    cube = cube.merge(PathSummary.from_cube(simulate_with_insurance(insurance_secant)))
+  output["incremental"] = {"stored_paths": first_path, "new_paths": total_paths - first_path,
+                           "calibration_residual": None if hedged else run_store.calibration_residual(
+                               cube, insurance_secant, total_loan, repaymemt_amount_max, at_risk_capital)}
+elif hedged:
   insurance_secant = 0.0
-  df = simulate_with_insurance(0.0)
+  cube = simulate_with_insurance(0.0)
 else:
   if enable_pool:
     get_pool_parameters()
   else: 
-    insurance_secant = secant(insurance_deficit,10000,50000,250)
+    insurance_secant = calibration.solve(insurance_deficit,10000,50000,250, upper=max_insurance_cost,
+                                         key=calibration_key)
   if insurance_secant is None:
     raise Exception("secant is none")
-  df = simulate_with_insurance(insurance_secant)
-
-dfend = df[df['Period']==loan_duration*4]
-worse_pathn = dfend.sort_values('SP500').iloc[round(0.02*total_paths)]['Path']
-bad_pathn = dfend.sort_values('SP500').iloc[round(0.25*total_paths)]['Path']
-good_pathn = dfend.sort_values('SP500').iloc[round(0.75*total_paths)]['Path']
-median_pathn = dfend.sort_values('SP500').iloc[round(0.50*total_paths)]['Path']
-worse_end_ix = df[(df['Path']==worse_pathn) & (df['Period']==loan_duration*4)].index[0]
-bad_end_ix = df[(df['Path']==bad_pathn) & (df['Period']==loan_duration*4)].index[0]
-good_end_ix = df[(df['Path']==good_pathn) & (df['Period']==loan_duration*4)].index[0]
-median_end_ix = df[(df['Path']==median_pathn) & (df['Period']==loan_duration*4)].index[0]
+  cube = simulate_with_insurance(insurance_secant)
 
 #'negative reinvestment account {0:.2f}'.format(initial_reinvest) if initial_reinvest<0 else outdf
 
-outdf = main_outputs_table(df,total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
+if incremental:
+  run_store.save(run_key, cube if isinstance(cube, PathSummary) else PathSummary.from_cube(cube),
+                 dict(insurance_cost=insurance_secant, insured_units=insured_units,
+                      expected_mean_reinvestment=None if expected_mean_reinvestment is None
+                      else list(expected_mean_reinvestment)))
+
+outdf = main_outputs_table(cube,total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                     insurance_profit_margin,insurance_secant, total_paths, loan_type, cash_rate,
                     at_risk_captital_fraction, house_value, final_home_value, hedged)
 
 output["outdf"]  =outdf.to_dict('list')
-periods_list = list(df.groupby('Period')['Period'].mean().iloc[:].values)
-output["mean_period"] = periods_list
-output["mean_units"] = list(df.groupby('Period')['Units'].mean().iloc[:].values)
-output["mean_surplus"] = list(df.groupby('Period')['Surplus'].mean().iloc[:].values)
-output["pool_units"] = list(df.groupby('Period')['CumUnitsToPool'].mean().iloc[:].values)
-output["mean_hedged_units"] = list((df.groupby('Period')['Units'].mean()-insured_units).iloc[:].values)
-output["mean_reinvest"] = list(df.groupby('Period')['Reinvestment'].mean().iloc[:].values)
-output["mean_loan"] = list(df.groupby('Period')['Loan size'].mean().iloc[:].values)
-output["mean_deficit"] = list(df.groupby('Period')['InterestDeficit'].mean().iloc[:].values)
-output["mean_insured_units"] = list((df.groupby('Period')['Units'].mean()*0+insured_units).iloc[:].values)
-output["mean_cumanninc"] = list(df.groupby('Period')['AnnuityIncome'].mean().cumsum().iloc[:].values)
-output["mean_cumintraccr"] = list(df.groupby('Period')['Interest'].mean().cumsum().iloc[:].values)
-output["mean_cumintpaid"] = list(df.groupby('Period')['InterestPaid'].mean().cumsum().iloc[:].values)
+# per-period means straight off the (paths, periods) arrays, no groupby
+mean_units = cube.mean('Units')
+output["mean_period"] = list(cube.mean('Period'))
+output["mean_units"] = list(mean_units)
+output["mean_surplus"] = list(cube.mean('Surplus'))
+output["pool_units"] = list(cube.mean('CumUnitsToPool'))
+output["mean_hedged_units"] = list(mean_units-insured_units)
+output["mean_reinvest"] = list(cube.mean('Reinvestment'))
+output["mean_loan"] = list(cube.mean('Loan size'))
+output["mean_deficit"] = list(cube.mean('InterestDeficit'))
+output["mean_insured_units"] = list(mean_units*0+insured_units)
+output["mean_cumanninc"] = list(cube.mean('AnnuityIncome').cumsum())
+output["mean_cumintraccr"] = list(cube.mean('Interest').cumsum())
+output["mean_cumintpaid"] = list(cube.mean('InterestPaid').cumsum())
 
 table_type = input["path_table_type"]
 
-mc_prices = []
-for pathn in range(0,100):
-  mc_prices.append(list(df[df['Path']==pathn]['SP500'].values))
+# chart aggregates: S&P 500 fan bands and representative paths (LTTB, at most chart_max_points
+# each) and the final reinvestment histogram. A PathSummary (incremental run) keeps only its
+# first paths' prices, so its bands are over those
+prices = cube['SP500']
+output["charts"] = chart_data.aggregate({'SP500': prices}, terminal=cube.at(-1)['Reinvestment'],
+                                        x=output["mean_period"], max_points=input.get('chart_max_points', 200))
+
+# mc_prices (drawn against mean_period): the representative paths at full resolution, or the
+# first 100 raw paths with raw_paths; an empty list for each remaining trace
+if input.get('raw_paths', False):
+  mc_prices = prices[:100].tolist()
+else:
+  mc_prices = [prices[i].tolist() for i in chart_data.representative_paths(prices)]
+mc_prices += [[] for _ in range(100 - len(mc_prices))]
 output["mc_prices"] = mc_prices
 
+# lazy_tables: the run is kept server-side and a path's ledger / accounts table is fetched on
+# demand by run_id (drilldown.py) rather than serialised here
+run_id = drilldown.retain(cube) if input.get('lazy_tables', False) else None
+output["run_id"] = run_id
+
 if table_type == "Mean":
-  output["accounts_table"] = accounts_table(df.groupby('Period').mean()).to_dict('list')
-  output["pathdf"]  = df.groupby('Period').mean().to_dict('list')
+  means = cube.mean_frame()
+  output["accounts_table"] = accounts_table(means).to_dict('list')
+  output["pathdf"]  = means.to_dict('list')
   #output["mean_units"] = list(df.groupby('Period')['Units'].mean().iloc[:].values)
   #output["mean_reinvest"] = list(df.groupby('Period')['Reinvestment'].mean().iloc[:].values)
   #output["mean_loan"] = list(df.groupby('Period')['Loan size'].mean().iloc[:].values)
@@ -210,10 +255,17 @@ else:
                0.25 if table_type== "25% percentile" else 0.75
 
   rankn = round(total_paths * percentile)
-  pathn = dfend.sort_values('SP500').iloc[rankn]['Path']
-  pathdf = df[df['Path']==pathn]
-  output["accounts_table"] = accounts_table(pathdf).to_dict('list')
-  output["pathdf"]= pathdf.to_dict('list')
+  pathn = cube.rank_path('SP500', rankn, loan_duration*4)
+  if isinstance(cube, PathSummary):
+    # a stored run keeps no per-path rows: re-simulate just this path from its seed stream
+    pathdf = simulate_with_insurance(insurance_secant, observation_paths(1, pathn)).path_frame(pathn)
+  else:
+    pathdf = cube.path_frame(pathn)
+  if run_id is None:
+    output["accounts_table"] = accounts_table(pathdf).to_dict('list')
+    output["pathdf"]= pathdf.to_dict('list')
+  else:
+    output["path_table"] = {"run": run_id, "path": int(pathn)}
   output["mean_units"] = (pathdf['Units'].iloc[:].values).tolist()
   output["mean_reinvest"] = (pathdf['Reinvestment'].iloc[:].values).tolist()
   output["mean_loan"] = (pathdf['Loan size'].iloc[:].values).tolist()
@@ -2,13 +2,10 @@ import sys
 import json
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import pprint
-import math
-import numpy_financial as npf
 from core_model import single_mortgage, gen_monte_carlo_paths
-from utils import mean_sd, dollar, pcntdf, pcnt, secant
+from utils import mean_sd, dollar, pcntdf, pcnt, progress
+import calibration
 
 input = json.loads(sys.stdin.read())
 output = {}
@@ -89,40 +86,46 @@ dt = 1.0/120
 N = round(loan_duration/dt)
 
 
+# seeded (as optimise.py) so a grid is reproducible and result_cache can serve repeats
+np.random.seed(input.get('random_seed', 0))
 price_paths = gen_monte_carlo_paths(loan_duration, equity_return, volatility, total_paths, S0)
 
 def get_df_for_hol_params(holiday_enter_fraction, holiday_exit_fraction):
 
-  def simulate_with_insurance(insurance_cost):
+  def simulate_with_insurance(insurance_cost, paths = price_paths, as_cube = False):
     return single_mortgage(total_loan, reinvest_fraction, loan_duration, annual_income, annuity_duration,
                       insurance_profit_margin,insurance_cost,
                       cash_rate,wholesale_lending_margin,additional_loan_margins,
                       holiday_enter_fraction, holiday_exit_fraction, subperform_loan_threshold_quarters,
-                      price_paths, S0, dt)
+                      paths, S0, dt, as_cube=as_cube)
     
-  def insurance_deficit(insurance_cost):
-    df = simulate_with_insurance(insurance_cost)
-    dfend = df[df['Period']==loan_duration*4]
-    insurance_payout = (total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None).mean()
-    #print("insurance deficit", insurance_payout - insurance_cost)
-    return insurance_payout - insurance_cost
+  def insurance_deficit(insurance_costs):
+    paths, cost = calibration.tile_paths(price_paths, insurance_costs)
+    dfend = simulate_with_insurance(cost, paths, as_cube=True).at(loan_duration*4)
+    insurance_payout = calibration.candidate_means((total_loan + dfend['InterestDeficit'] - dfend["Reinvestment"] - repaymemt_amount_max - at_risk_capital).clip(0, None), len(insurance_costs))
+    #print("insurance deficit", insurance_payout - insurance_costs)
+    return insurance_payout - insurance_costs
 
-  insurance_secant = secant(insurance_deficit,50000,100000,500)
+  insurance_secant = calibration.solve(insurance_deficit,50000,100000,500,
+    upper=calibration.max_insurance_cost(total_loan, reinvest_fraction, insurance_profit_margin, cash_rate, loan_duration),
+    key=dict(input, script='relations', holiday_enter_fraction=holiday_enter_fraction, holiday_exit_fraction=holiday_exit_fraction))
 
   df = simulate_with_insurance(insurance_secant)
   return (df, insurance_secant)
 
 df_data = [] 
+cells_done = 0
 
 for enter in np.linspace(holiday_enter_fraction_from, holiday_enter_fraction_to, 5):
   for exitdelta in np.linspace(holiday_exit_fraction_delta_from, holiday_exit_fraction_delta_to, 5):
+    cell = None
     try:
       (df, insurance) = get_df_for_hol_params(enter, enter+exitdelta)
       dfend = df[df['Period']==loan_duration*4]
       lender_profit_share_amt = (lender_profit_share*(dfend["Reinvestment"] - total_loan - dfend['InterestDeficit'])).clip(0, None)
       roi = 100*(dfend['FunderEarned'].mean()+lender_profit_share_amt.mean() +dfend['InterestDeficit'].mean())/total_loan
 
-      df_data.append({
+      cell = {
         "enter": enter,
         "exitdelta": exitdelta,
         "frac": 100*df['Prob Holiday'].mean(),
@@ -131,9 +134,12 @@ for enter in np.linspace(holiday_enter_fraction_from, holiday_enter_fraction_to,
         "deficit": dfend['InterestDeficit'].mean(),
         "surplus": dfend['Surplus'].mean(),
         "profit_share": lender_profit_share_amt.mean(),
-      })
+      }
+      df_data.append(cell)
     except:
       pass
+    cells_done += 1
+    progress(stage='grid', cells_done=cells_done, cells_total=25, cell=cell)
 
 output['df'] = pd.DataFrame(df_data).to_dict('list')
 
@@ -0,0 +1,212 @@
+"""
+Memoised outputs of the stdin-JSON calculators.
+
+pyrainy.py, optimise.py, relations.py, book.py and single_real_data.py are deterministic given
+their input JSON (paths come from random_seed, or a fixed seed), yet the same request - the default
+form values above all - was recomputed on every view. Here a script's JSON output is stored under
+its canonical input (sorted keys) and the engine version: a hash of the script and of every model
+source and data file it reads, so editing the model retires old entries without an explicit flush.
+
+Two tiers, each bounded in bytes: an in-process LRU (hits cost a dict lookup in calc_worker and
+job_server) and a directory of JSON files shared by every process, least recently read pruned first.
+Failed runs are not stored, and incremental requests (pyrainy's incremental: true, whose output
+depends on the stored runs in run_store.py and which save their own run) are neither looked up nor
+stored.
+
+    import result_cache
+    output = result_cache.run('pyrainy', input)    # the JSON line pyrainy.py prints for input
+    result_cache.invalidate('pyrainy', input)      # one entry; invalidate('pyrainy') or invalidate()
+
+    python3 result_cache.py pyrainy < input.json   # as python3 pyrainy.py < input.json
+    python3 result_cache.py --invalidate [kind]
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, 'result_cache')
+MEMORY_BYTES = 64*2**20
+DISK_BYTES = 512*2**20
+
+SCRIPTS = {
+    'pyrainy': 'pyrainy.py',
+    'optimise': 'optimise.py',
+    'relations': 'relations.py',
+    'book': 'book.py',
+    'single_real_data': 'single_real_data.py',
+}
+# what the scripts' results depend on besides their own source and input
+ENGINE_FILES = ('core_model.py', 'core_model_advanced.py', 'core_model_montecarlo.py', 'engine.py',
+                'path_cube.py', 'calibration.py', 'run_store.py', 'drilldown.py', 'utils.py', 'market_data.py',
+                'chart_data.py', 'sp500tr.csv', 'FEDFUNDS2.csv')
+
+_memory = collections.OrderedDict()      # file name -> output text, most recently used last
+_memory_bytes = 0
+_hashes = {}                              # path -> (mtime_ns, size, sha1)
+
+
+def _file_hash(path):
+    st = os.stat(path)
+    seen = _hashes.get(path)
+    if seen is None or seen[:2] != (st.st_mtime_ns, st.st_size):
+        with open(path, 'rb') as f:
+            seen = _hashes[path] = (st.st_mtime_ns, st.st_size, hashlib.sha1(f.read()).hexdigest())
+    return seen[2]
+
+
+def engine_version(kind):
+    """Hash of the kind's script and the model sources and data it reads."""
+    h = hashlib.sha1()
+    for name in (SCRIPTS[kind],) + ENGINE_FILES:
+        h.update(name.encode())
+        h.update(_file_hash(os.path.join(HERE, name)).encode())
+    return h.hexdigest()[:16]
+
+
+def entry_name(kind, input):
+    """Cache file name of a request: kind, then a hash of its canonical input and engine version."""
+    if kind not in SCRIPTS:
+        raise ValueError(f"unknown calculator {kind!r} (use one of {sorted(SCRIPTS)})")
+    text = json.dumps(input, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(f'{engine_version(kind)}:{text}'.encode()).hexdigest()[:32]
+    return f'{kind}-{digest}.json'
+
+
+def _remember(name, output):
+    global _memory_bytes
+    if name in _memory:
+        _memory_bytes -= len(_memory.pop(name))
+    if len(output) > MEMORY_BYTES:
+        return
+    _memory[name] = output
+    _memory_bytes += len(output)
+    while _memory_bytes > MEMORY_BYTES:
+        _memory_bytes -= len(_memory.popitem(last=False)[1])
+
+
+def cacheable(input):
+    """False for requests whose output is not a function of their input alone (incremental runs)."""
+    return not input.get('incremental')
+
+
+def lookup(kind, input, cache_dir=CACHE_DIR):
+    """Stored output of this request, or None."""
+    if not cacheable(input):
+        return None
+    name = entry_name(kind, input)
+    if name in _memory:
+        _memory.move_to_end(name)
+        return _memory[name]
+    path = os.path.join(cache_dir, name)
+    try:
+        with open(path) as f:
+            output = f.read()
+        os.utime(path)                    # disk tier is pruned by last use
+    except OSError:
+        return None
+    _remember(name, output)
+    return output
+
+
+def store(kind, input, output, cache_dir=CACHE_DIR):
+    """Keep a successful run's JSON output (best effort on disk) and prune the disk tier. Outputs
+    that point at a retained run (run_id, drilldown.py) are not kept: the run may be pruned first."""
+    if not cacheable(input) or '"run_id"' in output and json.loads(output).get('run_id') is not None:
+        return
+    name = entry_name(kind, input)
+    _remember(name, output)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, name)
+        tmp = f'{path}.{os.getpid()}'
+        with open(tmp, 'w') as f:
+            f.write(output)
+        os.replace(tmp, path)
+        _prune(cache_dir)
+    except OSError:
+        pass
+
+
+def _prune(cache_dir):
+    entries = []
+    for f in os.listdir(cache_dir):
+        if f.endswith('.json'):
+            st = os.stat(os.path.join(cache_dir, f))
+            entries.append((st.st_mtime, st.st_size, f))
+    total = sum(size for _, size, _ in entries)
+    for _, size, f in sorted(entries):
+        if total <= DISK_BYTES:
+            break
+        os.remove(os.path.join(cache_dir, f))
+        total -= size
+
+
+def invalidate(kind=None, input=None, cache_dir=CACHE_DIR):
+    """Drop one request's entry, every entry of a kind, or (no arguments) everything."""
+    global _memory_bytes
+    if input is not None:
+        names = {entry_name(kind, input)}
+        match = names.__contains__
+    else:
+        match = lambda name: kind is None or name.startswith(f'{kind}-')
+    for name in [n for n in _memory if match(n)]:
+        _memory_bytes -= len(_memory.pop(name))
+    try:
+        files = os.listdir(cache_dir)
+    except OSError:
+        return
+    for f in files:
+        if f.endswith('.json') and match(f):
+            os.remove(os.path.join(cache_dir, f))
+
+
+def json_line(output):
+    """First line of a script's output that is a JSON object (what the callers parse), or None."""
+    return next((line for line in output.split('\n') if line.strip().startswith('{')), None)
+
+
+def run(kind, input, cache_dir=CACHE_DIR):
+    """The kind's script output for input: stored, answered from its precomputed lattice (lattice.py),
+    or run here (calc_worker.run_script) and stored when it succeeds. A failed run returns everything it printed, as the script would."""
+    output = lookup(kind, input, cache_dir)
+    if output is not None:
+        return output
+    import lattice
+    output = lattice.lookup(kind, input) if cacheable(input) else None
+    if output is not None:
+        return output
+    import calc_worker
+    source, filename = calc_worker.request_source({'file': SCRIPTS[kind]})
+    printed, error = calc_worker.run_script(source, filename, json.dumps(input))
+    line = json_line(printed)
+    if error is not None or line is None:
+        return printed
+    store(kind, input, line, cache_dir)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('kind', nargs='?', choices=sorted(SCRIPTS))
+    parser.add_argument('--invalidate', action='store_true', help='drop the stored entries of kind (or all)')
+    args = parser.parse_args(argv)
+    if args.invalidate:
+        invalidate(args.kind)
+    elif args.kind is None:
+        parser.error('kind is required')
+    else:
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        os.chdir(HERE)
+        output = run(args.kind, json.loads(sys.stdin.read() or '{}'))
+        print(output)
+        if json_line(output) is None:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
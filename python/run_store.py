@@ -0,0 +1,69 @@
+"""
+Stored calculator runs, grown path block by path block.
+
+Raising total_paths in the calculator used to regenerate and re-simulate every path. Paths are
+drawn from per-block streams of the user seed (core_model.path_normals), so paths 0..n-1 are the
+same whatever total_paths is: a run stores its PathSummary (per-period sums, final-period values,
+per-path totals) together with the calibrated parameters, and a later request for more paths with
+the same inputs simulates only paths n.. and merges their summary in.
+
+The calibrated insurance cost (and pool parameters) are kept from the stored run: the extended
+run is priced at that cost rather than recalibrated on all paths. calibration_residual() reports
+the break-even deficit of the merged paths at that cost.
+
+    stored = run_store.load(key)                  # (PathSummary, meta) or None
+    run_store.save(key, summary, meta)
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from path_cube import PathSummary
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(HERE, 'run_store')
+MAX_RUNS = 50             # most recently written runs kept
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def digest(key):
+    """File stem of a run: hash of its inputs (plain JSON, sorted keys)."""
+    text = json.dumps({k: _plain(v) for k, v in key.items()}, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:20]
+
+def load(key, store_dir=STORE_DIR):
+    """(PathSummary, meta) of the stored run with these inputs, or None."""
+    path = os.path.join(store_dir, digest(key) + '.npz')
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            summary = PathSummary.from_arrays({k: arrays[k] for k in arrays.files if k != 'meta'})
+    except (OSError, ValueError, KeyError):
+        return None
+    if meta.get('key') != json.loads(json.dumps({k: _plain(v) for k, v in key.items()})):
+        return None                                   # hash collision or stale format
+    return summary, meta
+
+def save(key, summary, meta, store_dir=STORE_DIR):
+    """Store a run (rewritten atomically; the store is best effort) and prune to MAX_RUNS."""
+    meta = dict({k: _plain(v) for k, v in meta.items()}, key={k: _plain(v) for k, v in key.items()})
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        path = os.path.join(store_dir, digest(key) + '.npz')
+        tmp = f'{path}.{os.getpid()}.npz'
+        np.savez(tmp, meta=np.array(json.dumps(meta)), **summary.arrays())
+        os.replace(tmp, path)
+        runs = sorted((os.path.getmtime(os.path.join(store_dir, f)), f)
+                      for f in os.listdir(store_dir) if f.endswith('.npz') and f.count('.') == 1)
+        for _, f in runs[:-MAX_RUNS]:
+            os.remove(os.path.join(store_dir, f))
+    except OSError:
+        pass
+
+def calibration_residual(summary, insurance_cost, total_loan, repayment, at_risk_capital):
+    """Mean insurance payout minus cost over all the summary's paths (calibration's deficit)."""
+    end = summary.at(-1)
+    payout = (total_loan + end['InterestDeficit'] - end['Reinvestment'] - repayment - at_risk_capital).clip(0, None)
+    return float(payout.mean() - insurance_cost)
@@ -2,11 +2,7 @@ import sys
 import json
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import pprint
-import math
-import numpy_financial as npf
 from core_model_advanced import single_mortgage, accounts_table
 from utils import mean_sd, dollar, pcntdf, pcnt, secant
 
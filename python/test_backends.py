@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import engine
+from core_model import gen_observation_paths, OBSERVATION_DT
+
+# Conformance tests for engine.py: every available backend runs each feature case on the same
+# price paths and is compared with the scalar reference, row for row (frames) and per path
+# (end-of-term values).
+
+np.random.seed(7)
+loan_duration = 20
+total_paths = 25
+S0 = 100.0
+price_paths = gen_observation_paths(loan_duration, 0.08, 0.18, total_paths, S0, exact=True)
+periods = 4*loan_duration + 1
+
+BASE = dict(total_loan=1_200_000, reinvest_fraction=0.625, loan_duration=loan_duration, annual_income=30_000,
+            annuity_duration=15, insurance_profit_margin=1.5, insurance_cost=30_000, cash_rate_series=0.0435,
+            wholesale_lending_margin=0.02, additional_loan_margins=0.015, holiday_enter_fraction=1.35,
+            holiday_exit_fraction=1.95, subperform_loan_threshold_quarters=6, price_paths=price_paths, S0=S0,
+            dt=OBSERVATION_DT, year_offset=1999)
+HEDGE = dict(hedged=True, hedging_max_loss=0.1, hedging_cap=0.2, hedging_cost_pa=0.014)
+CASES = {
+    'base': {},
+    'hedged': HEDGE,
+    'pi': dict(piProgressiveRepayment=True),
+    'cash_series': dict(cash_rate_series=list(0.03 + 0.02*np.sin(np.arange(periods)/7))),
+    'superpay': dict(max_superpay_factor=2.0, superpay_start_factor=1.2),
+    'pool': dict(enable_pool=True, insured_units=3000.0, expected_reinvestment_ratio=np.linspace(1.0, 2.5, periods)),
+    'per_path_cost': dict(insurance_cost=np.linspace(10_000, 60_000, total_paths)),
+    'pool+hedged+pi': dict(HEDGE, enable_pool=True, insured_units=3000.0, piProgressiveRepayment=True,
+                           expected_reinvestment_ratio=np.linspace(1.0, 2.5, periods)),
+}
+
+
+def max_diff(got, want):
+    return max(float(np.max(np.abs(np.asarray(got[c], dtype=float) - np.asarray(want[c], dtype=float)), initial=0.0))
+               for c in want)
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_backends_match_scalar(case):
+    params = dict(BASE, **CASES[case])
+    features = engine.run_features(engine.bind_parameters(**params))
+    if np.ndim(params['insurance_cost']):
+        # the reference takes one cost per run: path by path with that path's cost
+        reference = pd.concat([engine.single_mortgage(**dict(params, insurance_cost=cost, price_paths=[path]),
+                                                      backend='scalar')
+                               for cost, path in zip(params['insurance_cost'], price_paths)], ignore_index=True)
+    else:
+        reference = engine.single_mortgage(**params, backend='scalar')
+    ref_end = reference[reference['Period'] == periods - 1]
+    for name in engine.available_backends():
+        backend = engine.BACKENDS[name]
+        if name == 'scalar' or not backend.supports(features, 'end'):
+            continue
+        if backend.supports(features, 'frame'):
+            df = engine.single_mortgage(**params, backend=name)
+            assert max_diff(df, {c: reference[c] for c in reference.columns}) == 0.0, f'{name} frame'
+        end = engine.end_of_term(**params, backend=name)
+        # money columns of the reference are whole dollars
+        assert max_diff(end, {c: ref_end[c] for c in engine.END_FIELDS}) <= 0.5 + 1e-6, f'{name} end'
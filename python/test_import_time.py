@@ -0,0 +1,58 @@
+import ast
+import os
+import subprocess
+import sys
+import pytest
+
+# Import-time budget for the calculator entry points. Each script's header imports are run in a
+# fresh interpreter under `python -X importtime`; a script fails if it pulls in a library that only
+# some code paths need (plotting, optimisation, finance: imported where they are used) or if its
+# imports take longer than the budget.
+#
+#     IMPORT_BUDGET_MS=1000 python3 -m pytest test_import_time.py      (default budget 1500 ms)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ('pyrainy.py', 'optimise.py', 'relations.py', 'book.py', 'single_real_data.py',
+                'monte_carlo.py', 'calc_worker.py', 'job_server.py', 'zygote.py')
+LAZY = ('matplotlib', 'scipy', 'numpy_financial')
+BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 1500))
+
+
+def header_imports(path):
+    """The import statements a script runs before its first line of work."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    statements = []
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            if statements:
+                break
+            continue                        # module docstring
+        statements.append(ast.unparse(node))
+    return statements
+
+
+def import_profile(statements):
+    """(total ms, {module: cumulative ms}) of running the statements in a fresh interpreter."""
+    run = subprocess.run([sys.executable, '-X', 'importtime', '-c', '\n'.join(statements)], cwd=HERE,
+                         capture_output=True, text=True)
+    if run.returncode != 0:
+        raise RuntimeError(run.stderr.strip().splitlines()[-1])
+    modules, total = {}, 0.0
+    for line in run.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)/1000
+        if not name.startswith('  '):       # top level: its cumulative time covers its imports
+            total += int(cumulative)/1000
+    return total, modules
+
+
+@pytest.mark.parametrize('script', ENTRY_POINTS)
+def test_import_time(script):
+    total, modules = import_profile(header_imports(os.path.join(HERE, script)))
+    eager = sorted({name.split('.')[0] for name in modules} & set(LAZY))
+    slowest = sorted(((ms, name.strip()) for name, ms in modules.items() if '.' not in name.strip()), reverse=True)[:3]
+    assert not eager, f"eager: {', '.join(eager)}"
+    assert total <= BUDGET_MS, f"{total:.0f} ms > {BUDGET_MS:.0f} ms (slowest: {', '.join(f'{name} {ms:.0f}' for ms, name in slowest)})"
@@ -0,0 +1,60 @@
+import numpy as np
+import numpy_financial as npf
+import irr
+
+# Tests for irr.py: batch_irr and batch_xirr on random cashflow rows against npf.irr row by row,
+# for rows with one sign change (an outlay, then income) and with several (outlays later on), and
+# nan for rows of zeros or whose cashflows never change sign.
+
+PERIODS = 40
+TOL = 1e-8
+rng = np.random.default_rng(0)
+
+# one sign change: an outlay, then income
+SINGLE = rng.uniform(0, 1000, (300, PERIODS))
+SINGLE[:, 0] = -rng.uniform(5000, 40000, len(SINGLE))
+
+# several sign changes: outlays at random later periods too
+MULTI = rng.uniform(0, 1000, (300, PERIODS))
+MULTI[:, 0] = -rng.uniform(5000, 40000, len(MULTI))
+later = rng.random(MULTI.shape) < 0.1
+later[:, 0] = False
+MULTI[later] = -rng.uniform(1000, 20000, later.sum())
+
+# no IRR: all zeros, or cashflows that never change sign
+NONE = np.vstack([np.zeros(PERIODS), rng.uniform(0, 1000, PERIODS), -rng.uniform(0, 1000, PERIODS),
+                  np.r_[0.0, 0.0, rng.uniform(0, 1000, PERIODS - 2)]])
+
+TIMES = np.arange(PERIODS)/4                    # quarterly flows in years
+
+
+def assert_rates(got, want):
+    both_nan = np.isnan(got) & np.isnan(want)
+    error = np.abs(got - want)/(1 + np.abs(want))
+    bad = ~both_nan & ~(error <= TOL)
+    assert not bad.any(), f"{bad.sum()} of {len(want)} rows differ ({np.isnan(want).sum()} nan)"
+
+
+def test_single_sign_change():
+    assert_rates(irr.batch_irr(SINGLE), np.array([npf.irr(row) for row in SINGLE]))
+
+
+def test_multi_sign_change():
+    rates, changes = irr.batch_irr(MULTI, full_output=True)
+    assert (changes > 1).mean() > 0.9
+    assert_rates(rates, np.array([npf.irr(row) for row in MULTI]))
+
+
+def test_xirr_quarterly():
+    # (1 + annual) = (1 + quarterly)^4. Annual rates with 1 + r below exp(MIN_LOG_GROWTH) (~1e-13,
+    # often rounding to -1 itself) are outside what batch_xirr brackets
+    for flows in (SINGLE, MULTI):
+        want = (1 + np.array([npf.irr(row) for row in flows]))**4 - 1
+        with np.errstate(divide='ignore'):
+            want[np.log1p(want) < irr.MIN_LOG_GROWTH] = np.nan
+        assert_rates(irr.batch_xirr(flows, TIMES), want)
+
+
+def test_no_sign_change():
+    assert np.isnan(irr.batch_irr(NONE)).all()
+    assert np.isnan(irr.batch_xirr(NONE, TIMES)).all()
@@ -0,0 +1,78 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import lattice
+import result_cache
+
+# Tests for job_server.py: a two-slot server is started on a scratch socket and fed small pyrainy
+# jobs. Batch jobs must queue behind one running batch job (the last slot stays free), interactive
+# jobs must start before batch jobs queued earlier, and cancel must drop a queued job without
+# running it and kill a running one, reporting both as cancelled.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASE = dict(lattice.BASE['pyrainy'], total_paths=200)
+
+
+def job_input(seed, paths=200):
+    input = dict(BASE, random_seed=seed, total_paths=paths)
+    result_cache.invalidate('pyrainy', input)       # every job runs, none is answered from the cache
+    return input
+
+
+class Client:
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX)
+        self.socket.connect(path)
+        self.lines = self.socket.makefile('r')
+
+    def send(self, **request):
+        self.socket.sendall((json.dumps(request) + '\n').encode())
+        return json.loads(self.lines.readline())
+
+    def watch(self, job):
+        event = self.send(op='watch', job=job)
+        while event.get('event') != 'done':
+            event = json.loads(self.lines.readline())
+        return event
+
+
+def test_priorities_and_cancel():
+    inputs = [job_input(seed, paths) for seed, paths in ((101, 5000), (102, 200), (103, 200), (104, 200), (105, 200))]
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'jobs.sock')
+        server = subprocess.Popen([sys.executable, 'job_server.py', '--socket', path, '--slots', '2'], cwd=HERE)
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.1)
+            client = Client(path)
+            submit = lambda input, priority: client.send(op='submit', kind='pyrainy', input=input, priority=priority)
+
+            long_batch = submit(inputs[0], 'batch')
+            first = submit(inputs[1], 'interactive')
+            batch = [submit(inputs[2], 'batch'), submit(inputs[3], 'batch')]
+            late = submit(inputs[4], 'interactive')
+            assert long_batch['state'] == 'running'                  # first batch job runs
+            assert first['state'] == 'running'                       # interactive job takes the last slot
+            assert [job['position'] for job in batch] == [0, 1]      # batch jobs queue in order
+            assert all(job['state'] == 'queued' for job in batch)
+            assert late['state'] == 'queued' and late['position'] == 0   # interactive queues ahead of batch
+
+            assert client.send(op='cancel', job=batch[1]['job'])['state'] == 'cancelled'
+            assert client.send(op='cancel', job=long_batch['job'])['state'] == 'cancelling'
+            assert client.watch(long_batch['job'])['state'] == 'cancelled'
+
+            done = {job['job']: client.watch(job['job']) for job in (first, late, batch[0])}
+            assert all(event['state'] == 'done' for event in done.values()), \
+                [event.get('error') for event in done.values() if event['state'] != 'done']
+            status = {job['job']: client.send(op='status', job=job['job']) for job in (late, *batch)}
+            assert status[batch[1]['job']]['started'] is None        # cancelled queued job never started
+            assert status[late['job']]['started'] <= status[batch[0]['job']]['started']
+        finally:
+            server.kill()
+            server.wait()
+            for input in inputs:
+                result_cache.invalidate('pyrainy', input)
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import pytest
+import lattice
+
+# Tests for lattice.py: a small pyrainy lattice is built in a scratch directory, then an exact node
+# must come back as pyrainy.py prints it, a point between nodes only with lattice_interpolate (and
+# close to a live run there), and requests off the grid or with other inputs changed not at all.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASE = dict(lattice.BASE['pyrainy'], total_paths=200)
+AXES = dict(house_value=(1450000, 1550000, 50000), volatility=(14, 16, 1))
+NODE = dict(BASE, house_value=1550000, volatility=14)
+BETWEEN = dict(BASE, house_value=1525000, volatility=14.5)
+
+
+def live(input):
+    run = subprocess.run([sys.executable, 'pyrainy.py'], input=json.dumps(input), capture_output=True, text=True,
+                         cwd=HERE)
+    return json.loads(run.stdout.splitlines()[-1])
+
+
+@pytest.fixture(scope='module')
+def store():
+    with tempfile.TemporaryDirectory() as store:
+        assert lattice.build('pyrainy', BASE, AXES, workers=2, store_dir=store, log=None) == 0
+        yield store
+
+
+def lookup(input, store):
+    line = lattice.lookup('pyrainy', input, store)
+    return None if line is None else json.loads(line)
+
+
+def test_exact_node(store):
+    hit = lookup(NODE, store)
+    assert hit is not None and hit.pop('lattice') == dict(interpolated=False, nodes=1)
+    assert hit == live(NODE)
+    assert lookup(dict(NODE, lazy_tables=False, raw_paths=False), store) is not None   # defaults ignored
+
+
+def test_between_nodes(store):
+    assert lookup(BETWEEN, store) is None                    # a live run unless interpolation is asked for
+    blend = lookup(dict(BETWEEN, lattice_interpolate=True), store)
+    assert blend is not None and blend['lattice']['interpolated']
+    want = live(BETWEEN)
+    error = max(abs(a - b) for a, b in zip(blend['mean_reinvest'], want['mean_reinvest']))/max(map(abs, want['mean_reinvest']))
+    assert error < 0.05, f'mean_reinvest {error:.2%} off'
+
+
+def test_not_answered(store):
+    assert lookup(dict(BASE, house_value=1600000, lattice_interpolate=True), store) is None   # outside the grid
+    assert lookup(dict(NODE, cash_rate=4.0), store) is None
+    assert lookup(dict(NODE, path_table_type='Median'), store) is None
@@ -1,3 +1,6 @@
+import json
+import sys
+
 
 
 def mean_sd(df):
@@ -46,3 +49,14 @@ def secant(f, x0, x1, eps):
     if abs(f_x1) > eps:
           raise ValueError("No solution found")
     return x
+
+
+# Structured progress of a long run (optimiser evaluations, grid cells done). job_server.py sets
+# PROGRESS_HOOK in its job processes to stream events to clients; otherwise they go to stderr.
+PROGRESS_HOOK = None
+
+def progress(**event):
+  if PROGRESS_HOOK is not None:
+    PROGRESS_HOOK(event)
+  else:
+    print('progress', json.dumps(event, default=float), file=sys.stderr)
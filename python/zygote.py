@@ -0,0 +1,117 @@
+"""
+Pre-imported zygote that forks a ready calculator process per request.
+
+calc_worker.py keeps a few long-lived processes that run request after request; a spawned
+`python3 <script>` starts clean but pays interpreter start and the engine imports every time.
+The zygote sits in between: it imports the engines and reads the market data once
+(calc_worker.preload), then forks a child for each connection. The child starts with everything
+already imported (copy-on-write, a few ms), serves that one request exactly as calc_worker would,
+and exits, so no state carries from one run to the next.
+
+Protocol: calc_worker's, one request line and one response line per connection.
+
+    python3 zygote.py --socket /tmp/calc-zygote.sock [--max-children N]     serve
+    python3 zygote.py --socket /tmp/calc-zygote.sock --run pyrainy.py < input.json
+        run a script in python/ through the zygote and print its output, as python3 pyrainy.py would
+
+Optional: PythonWorker uses it when PYTHON_ZYGOTE_SOCKET names a running zygote's socket and no
+pooled worker is available.
+"""
+import argparse
+import contextlib
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+import calc_worker
+
+MAX_CHILDREN = 2*(os.cpu_count() or 1)
+
+
+def _reap(children, block=False):
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            children.clear()
+            return
+        if pid == 0:
+            return
+        children.discard(pid)
+        block = False
+
+
+def _child(conn, worker):
+    # one request on this connection, then exit without running the parent's cleanup
+    status = 0
+    try:
+        with conn, conn.makefile('rw', encoding='utf-8') as stream:
+            line = stream.readline()
+            if line.strip():
+                stream.write(json.dumps(worker.handle(line)) + '\n')
+                stream.flush()
+    except BaseException:
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def serve(path, max_children=MAX_CHILDREN):
+    worker = calc_worker.Worker()          # preloads once; every child inherits it
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    server.settimeout(1.0)                 # wake up to reap finished children
+    children = set()
+    while True:
+        _reap(children)
+        if len(children) >= max_children:
+            _reap(children, block=True)
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            continue
+        conn.settimeout(None)
+        pid = os.fork()
+        if pid == 0:
+            server.close()
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            _child(conn, worker)
+        children.add(pid)
+        conn.close()
+
+
+def request(path, message):
+    """Send one request to a zygote; returns its response dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path)
+        with conn.makefile('rw', encoding='utf-8') as stream:
+            stream.write(json.dumps(message) + '\n')
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--socket', default='/tmp/calc-zygote.sock')
+    parser.add_argument('--max-children', type=int, default=MAX_CHILDREN)
+    parser.add_argument('--run', metavar='SCRIPT', help='run a script in python/ through a serving zygote')
+    args = parser.parse_args(argv)
+    if args.run:
+        start = time.perf_counter()
+        response = request(args.socket, {'id': 1, 'file': args.run, 'stdin': sys.stdin.read()})
+        sys.stdout.write(response['output'])
+        print(f"zygote: {response['status']} in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+        sys.exit(0 if response['status'] == 'ok' else 1)
+    serve(args.socket, args.max_children)
+
+
+if __name__ == '__main__':
+    main()